@@ -98,7 +98,7 @@ const FeaturedMain = () => {
             {cars.map((car) => (
               <SwiperSlide key={car.id}>
                 <div className='item'>
-                  <div className='banner' style={{ backgroundImage: `url(${car.image})` }}>
+                  <div className='banner' style={{ backgroundImage: `url(${car.image_variants?.card.webp || car.image})` }}>
                     <div className='filter_state'>
                       <div className='status'>
                         <h4>{car.category === 'New Car' ? 'Новый' : 'В наличии'}</h4>
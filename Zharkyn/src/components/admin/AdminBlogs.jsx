@@ -45,6 +45,17 @@ const AdminBlogs = () => {
     }
   };
 
+  // List rows are summaries; the preview needs the full blog
+  const handleViewBlog = async (blogId) => {
+    try {
+      const blog = await blogService.getBlogAdmin(blogId);
+      setSelectedBlog(blog);
+    } catch (err) {
+      console.error('Failed to fetch blog:', err);
+      setError('Не удалось загрузить блог. Пожалуйста, попробуйте позже.');
+    }
+  };
+
   const HandleDeleteBlog = async (blogId) => {
     if (window.confirm('Вы уверены, что хотите удалить этот блог?')) {
       try {
@@ -125,7 +136,7 @@ const AdminBlogs = () => {
                   <td className="actions-cell">
                     <button 
                       className="view-button"
-                      onClick={() => setSelectedBlog(blog)}
+                      onClick={() => handleViewBlog(blog.id)}
                     >
                       Просмотр
                     </button>
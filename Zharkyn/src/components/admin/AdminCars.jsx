@@ -427,7 +427,7 @@ const AdminCars = () => {
               <tr key={car.id}>
                 <td>{car.id}</td>
                 <td className="car-image-cell">
-                  <img src={car.image} alt={`${car.brand} ${car.model}`} />
+                  <img src={car.image_variants?.thumb.webp || car.image} alt={`${car.brand} ${car.model}`} />
                 </td>
                 <td>{car.brand}</td>
                 <td>{car.model}</td>
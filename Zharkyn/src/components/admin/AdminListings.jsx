@@ -43,6 +43,17 @@ const AdminListings = () => {
     }
   };
 
+  // List rows are summaries; the preview needs the full listing
+  const handleViewListing = async (listingId) => {
+    try {
+      const listing = await carService.getListingById(listingId);
+      setSelectedListing(listing);
+    } catch (err) {
+      console.error('Failed to fetch listing:', err);
+      setError('Не удалось загрузить объявление. Пожалуйста, попробуйте позже.');
+    }
+  };
+
   const HandleDeleteListing = async (listingId) => {
     try {
       await carService.deleteListing(listingId);
@@ -108,7 +119,7 @@ const AdminListings = () => {
                 <tr key={listing.id}>
                   <td>{listing.id}</td>
                   <td className="listing-image-cell">
-                    <img src={listing.image} alt={`${listing.brand} ${listing.model}`} />
+                    <img src={listing.image_variants?.thumb.webp || listing.image} alt={`${listing.brand} ${listing.model}`} />
                   </td>
                   <td>
                     {listing.brand} {listing.model} ({listing.year})
@@ -124,7 +135,7 @@ const AdminListings = () => {
                   <td className="actions-cell">
                     <button 
                       className="view-button"
-                      onClick={() => setSelectedListing(listing)}
+                      onClick={() => handleViewListing(listing.id)}
                     >
                       Просмотр
                     </button>
@@ -110,7 +110,7 @@ const BlogList = ({ user, onLogout }) => {
                       <i className="icon-heart"></i> {blog.likes_count || 0}
                     </span>
                     <span className="blog-comments">
-                      <i className="icon-comment"></i> {blog.comments?.length || 0}
+                      <i className="icon-comment"></i> {blog.comments_count || 0}
                     </span>
                   </div>
                 </Link>
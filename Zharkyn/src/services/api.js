@@ -261,6 +261,11 @@ const blogService = {
   },
   
   // Admin blog moderation
+  getBlogAdmin: async (id) => {
+    const response = await apiClient.get(`/admin/blogs/${id}`);
+    return response.data;
+  },
+  
   getAllBlogsAdmin: async (status = null, skip = 0, limit = 20) => {
     const params = { skip, limit };
     if (status) params.status = status;
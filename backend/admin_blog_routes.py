@@ -1,62 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from sqlalchemy import desc
+from sqlalchemy import select
 
 import schemas
 import models
 import auth
 from database import get_db
+from loaders import BLOG_SUMMARY_OPTIONS
+import moderation as moderation_service
+from pagination import Keyset, set_next_cursor
+from blog_routes import get_blog_or_none
 
 router = APIRouter(
     prefix="/admin/blogs",
     tags=["admin", "blogs"]
 )
 
-@router.get("/", response_model=List[schemas.Blog])
+@router.get("/", response_model=List[schemas.BlogSummary])
 async def get_all_blogs_admin(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Get all blogs with optional status filter (admin only)"""
     # Build query
-    query = db.query(models.Blog)
+    query = select(models.Blog).options(*BLOG_SUMMARY_OPTIONS)
     
     # Apply status filter if provided
     if status:
-        query = query.filter(models.Blog.status == status)
+        query = query.where(models.Blog.status == status)
     
-    # Order by newest first
-    query = query.order_by(desc(models.Blog.created_at))
-    
-    # Apply pagination
-    blogs = query.offset(skip).limit(limit).all()
+    # Order by newest first and paginate (cursor if given, otherwise skip)
+    keyset = Keyset(models.Blog.created_at, models.Blog.id, descending=True)
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
+    blogs, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return blogs
 
+@router.get("/{blog_id}", response_model=schemas.Blog)
+async def get_blog_admin(
+    blog_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Get a blog with its full content in any status (admin only)"""
+    blog = await get_blog_or_none(db, blog_id)
+    
+    if not blog:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    
+    return blog
+
 @router.put("/{blog_id}/moderate", response_model=schemas.Blog)
 async def moderate_blog(
     blog_id: int,
     moderation: schemas.BlogModeration,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Moderate a blog (approve or reject)"""
-    # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    
-    if not db_blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Update status and moderator info
-    db_blog.status = moderation.status
-    db_blog.moderator_id = current_user.id
-    db_blog.moderator_comment = moderation.moderator_comment
-    
-    db.commit()
-    db.refresh(db_blog)
+    await moderation_service.moderate_blog(db, blog_id, moderation, current_user.id)
+    await db.commit()
     
-    return db_blog
\ No newline at end of file
+    return await get_blog_or_none(db, blog_id)
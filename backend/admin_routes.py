@@ -1,12 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from sqlalchemy import desc
+from sqlalchemy import select
 
 import schemas
 import models
 import auth
+from car_import import detect_format, import_cars
+from feed_sync import sync_feed
+from car_routes import car_filter_conditions
+from export import EXPORT_FORMATS, EXPORT_TABLES, available_formats, export_filename, stream_export
+from search import car_text_search
 from database import get_db
+from loaders import BLOG_OPTIONS, BLOG_SUMMARY_OPTIONS, LISTING_OPTIONS, LISTING_SUMMARY_OPTIONS
+from pagination import Keyset, set_next_cursor
+from blog_routes import get_blog_or_none
+from listing_routes import moderate_one_listing
+import moderation as moderation_service
 
 router = APIRouter(
     prefix="/admin",
@@ -16,24 +27,30 @@ router = APIRouter(
 # === USER MANAGEMENT ===
 @router.get("/users", response_model=List[schemas.User])
 async def get_all_users(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Get all users (admin only)"""
-    users = db.query(models.User).offset(skip).limit(limit).all()
+    keyset = Keyset(models.User.id, models.User.id)
+    result = await db.execute(keyset.apply(select(models.User), cursor=cursor, skip=skip, limit=limit))
+    
+    users, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return users
 
 @router.put("/users/{user_id}", response_model=schemas.User)
 async def update_user_admin(
     user_id: int,
     user_update: schemas.UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Update a user (admin only)"""
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -43,19 +60,20 @@ async def update_user_admin(
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    auth.invalidate_user(user_id)
+    await db.refresh(db_user)
     
     return db_user
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_admin(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Delete a user (admin only)"""
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -67,145 +85,183 @@ async def delete_user_admin(
             detail="Cannot delete your own admin account"
         )
     
-    db.delete(db_user)
-    db.commit()
+    await db.delete(db_user)
+    await db.commit()
+    auth.invalidate_user(user_id)
     
     return None
 
 # === BLOG MANAGEMENT ===
-@router.get("/blogs", response_model=List[schemas.Blog])
+@router.get("/blogs", response_model=List[schemas.BlogSummary])
 async def get_all_blogs_admin(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Get all blogs with optional status filter (admin only)"""
     # Build query
-    query = db.query(models.Blog)
+    query = select(models.Blog).options(*BLOG_SUMMARY_OPTIONS)
     
     # Apply status filter if provided
     if status:
-        query = query.filter(models.Blog.status == status)
-    
-    # Order by newest first
-    query = query.order_by(desc(models.Blog.created_at))
+        query = query.where(models.Blog.status == status)
     
-    # Apply pagination
-    blogs = query.offset(skip).limit(limit).all()
+    # Order by newest first and paginate (cursor if given, otherwise skip)
+    keyset = Keyset(models.Blog.created_at, models.Blog.id, descending=True)
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
+    blogs, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return blogs
 
+@router.get("/blogs/{blog_id}", response_model=schemas.Blog)
+async def get_blog_admin(
+    blog_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Get a blog with its full content in any status (admin only)"""
+    blog = await get_blog_or_none(db, blog_id)
+    
+    if not blog:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    
+    return blog
+
 @router.put("/blogs/{blog_id}/moderate", response_model=schemas.Blog)
 async def moderate_blog(
     blog_id: int,
     moderation: schemas.BlogModeration,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Moderate a blog (approve or reject)"""
-    # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    await moderation_service.moderate_blog(db, blog_id, moderation, current_user.id)
+    await db.commit()
     
-    if not db_blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Update status and moderator info
-    db_blog.status = moderation.status
-    db_blog.moderator_id = current_user.id
-    db_blog.moderator_comment = moderation.moderator_comment
-    
-    db.commit()
-    db.refresh(db_blog)
-    
-    return db_blog
+    return await get_blog_or_none(db, blog_id)
+
+@router.post("/blogs/claim", response_model=schemas.BlogClaim)
+async def claim_blogs(
+    limit: int = Query(20, ge=1, le=moderation_service.MAX_CLAIM_BATCH),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Lease a batch of pending blogs, oldest first, that no other moderator holds"""
+    ids, lease_expires_at = await moderation_service.claim_pending(db, models.Blog, current_user.id, limit)
+    result = await db.execute(
+        select(models.Blog).options(*BLOG_OPTIONS).where(models.Blog.id.in_(ids)).order_by(models.Blog.created_at, models.Blog.id)
+    )
+    return {"lease_expires_at": lease_expires_at, "items": result.scalars().all()}
+
+@router.post("/blogs/claim/heartbeat", response_model=schemas.ClaimHeartbeat)
+async def renew_blog_claims(
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Extend the lease on every pending blog the caller still holds"""
+    ids, lease_expires_at = await moderation_service.renew_claims(db, models.Blog, current_user.id)
+    return {"ids": ids, "lease_expires_at": lease_expires_at}
+
+@router.delete("/blogs/claim", status_code=status.HTTP_204_NO_CONTENT)
+async def release_blog_claims(
+    ids: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Return the caller's leased blogs (or only ids) to the queue"""
+    await moderation_service.release_claims(db, models.Blog, current_user.id, ids)
+    return None
 
 # === LISTING MANAGEMENT ===
-@router.get("/listings", response_model=List[schemas.Listing])
+@router.get("/listings", response_model=List[schemas.ListingSummary])
 async def get_all_listings_admin(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Get all listings with optional status filter (admin only)"""
     # Build query
-    query = db.query(models.Listing)
+    query = select(models.Listing).options(*LISTING_SUMMARY_OPTIONS)
     
     # Apply status filter if provided
     if status:
-        query = query.filter(models.Listing.status == status)
-    
-    # Order by newest first
-    query = query.order_by(desc(models.Listing.created_at))
+        query = query.where(models.Listing.status == status)
     
-    # Apply pagination
-    listings = query.offset(skip).limit(limit).all()
+    # Order by newest first and paginate (cursor if given, otherwise skip)
+    keyset = Keyset(models.Listing.created_at, models.Listing.id, descending=True)
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
+    listings, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return listings
 
+@router.put("/listings/moderate", response_model=List[schemas.ListingModerationResult])
+async def moderate_listings_batch(
+    batch: schemas.ListingBatchModeration,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Apply many moderation decisions in one transaction; failures are reported per item"""
+    results = await moderation_service.moderate_listings(db, batch.decisions, current_user.id)
+    await db.commit()
+    return results
+
 @router.put("/listings/{listing_id}/moderate", response_model=schemas.Listing)
 async def moderate_listing(
     listing_id: int,
     moderation: schemas.ListingModeration,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Moderate a listing (approve or reject)"""
-    # Get the listing
-    db_listing = db.query(models.Listing).filter(models.Listing.id == listing_id).first()
-    
-    if not db_listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
-    
-    # Update status and moderator info
-    db_listing.status = moderation.status
-    db_listing.moderator_id = current_user.id
-    db_listing.moderator_comment = moderation.moderator_comment
-    
-    # If listing is approved, create a car entry
-    if moderation.status == "approved":
-        # Check if car with this listing_id as external_id already exists
-        existing_car = db.query(models.Car).filter(models.Car.external_id == f"listing_{listing_id}").first()
-        
-        # Only create a new car if it doesn't exist yet
-        if not existing_car:
-            # Create a new car from the listing data
-            new_car = models.Car(
-                brand=db_listing.brand,
-                model=db_listing.model,
-                category=db_listing.category,
-                price=db_listing.price,
-                shortDescription=db_listing.short_description,
-                image=db_listing.image,
-                gallery=db_listing.gallery,
-                year=db_listing.year,
-                body_type=db_listing.body_type,
-                engine_type=db_listing.engine_type,
-                drive_unit=db_listing.drive_unit,
-                transmission=db_listing.transmission,
-                color=db_listing.color,
-                mileage=db_listing.mileage,
-                additional_features=db_listing.additional_features,
-                external_id=f"listing_{listing_id}"  # Store the reference to the original listing
-            )
-            
-            db.add(new_car)
-    
-    db.commit()
-    
-    # If we created a new car, we need to refresh the listing to reflect changes
-    db.refresh(db_listing)
-    
-    return db_listing
+    return await moderate_one_listing(db, listing_id, moderation, current_user.id)
+
+@router.post("/listings/claim", response_model=schemas.ListingClaim)
+async def claim_listings(
+    limit: int = Query(20, ge=1, le=moderation_service.MAX_CLAIM_BATCH),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Lease a batch of pending listings, oldest first, that no other moderator holds"""
+    ids, lease_expires_at = await moderation_service.claim_pending(db, models.Listing, current_user.id, limit)
+    result = await db.execute(
+        select(models.Listing).options(*LISTING_OPTIONS).where(models.Listing.id.in_(ids)).order_by(models.Listing.created_at, models.Listing.id)
+    )
+    return {"lease_expires_at": lease_expires_at, "items": result.scalars().all()}
+
+@router.post("/listings/claim/heartbeat", response_model=schemas.ClaimHeartbeat)
+async def renew_listing_claims(
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Extend the lease on every pending listing the caller still holds"""
+    ids, lease_expires_at = await moderation_service.renew_claims(db, models.Listing, current_user.id)
+    return {"ids": ids, "lease_expires_at": lease_expires_at}
+
+@router.delete("/listings/claim", status_code=status.HTTP_204_NO_CONTENT)
+async def release_listing_claims(
+    ids: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Return the caller's leased listings (or only ids) to the queue"""
+    await moderation_service.release_claims(db, models.Listing, current_user.id, ids)
+    return None
 
 # === CAR MANAGEMENT ===
 @router.post("/cars", response_model=schemas.Car)
 async def create_car_admin(
     car: schemas.CarCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Create a new car (admin only)"""
@@ -215,7 +271,7 @@ async def create_car_admin(
         model=car.model,
         category=car.category,
         price=car.price,
-        shortDescription=car.short_description,
+        shortDescription=car.shortDescription,
         image=car.image,
         gallery=car.gallery,
         year=car.year,
@@ -233,19 +289,44 @@ async def create_car_admin(
     )
     
     db.add(db_car)
-    db.commit()
-    db.refresh(db_car)
+    await db.commit()
+    await db.refresh(db_car)
     return db_car
 
+@router.post("/cars/import", response_model=schemas.CarImportResult)
+async def import_cars_admin(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|jsonl)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Bulk import cars from a CSV or JSON Lines upload (admin only); rows are merged on external_id"""
+    return await import_cars(db, file.file, detect_format(file.filename, format))
+
+@router.post("/cars/sync", response_model=schemas.FeedSyncResult)
+async def sync_feed_admin(
+    feed: str = Query(..., min_length=1),
+    mode: str = Query("full", regex="^(full|delta)$"),
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|jsonl)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Apply an uploaded feed snapshot (admin only); only changed rows are written"""
+    try:
+        return await sync_feed(db, [(file.filename, file.file, detect_format(file.filename, format))], feed, mode == "full")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.put("/cars/{car_id}", response_model=schemas.Car)
 async def update_car_admin(
     car_id: int,
     car: schemas.CarUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Update a car (admin only)"""
-    db_car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    db_car = await db.get(models.Car, car_id)
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
     
@@ -254,21 +335,75 @@ async def update_car_admin(
     for key, value in update_data.items():
         setattr(db_car, key, value)
     
-    db.commit()
-    db.refresh(db_car)
+    await db.commit()
+    await db.refresh(db_car)
     return db_car
 
 @router.delete("/cars/{car_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_car_admin(
     car_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     """Delete a car (admin only)"""
-    db_car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    db_car = await db.get(models.Car, car_id)
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
     
-    db.delete(db_car)
-    db.commit()
-    return None
\ No newline at end of file
+    await db.delete(db_car)
+    await db.commit()
+    return None
+
+# === EXPORT ===
+def export_response(db: AsyncSession, table: str, fmt: str, gzip: bool, conditions: list) -> StreamingResponse:
+    if fmt not in available_formats():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format; available: {', '.join(available_formats())}"
+        )
+    media_type = "application/gzip" if gzip else EXPORT_FORMATS[fmt][0]
+    return StreamingResponse(
+        stream_export(db, EXPORT_TABLES[table], fmt, conditions, gzip=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(table, fmt, gzip)}"'}
+    )
+
+@router.get("/export/cars")
+async def export_cars_admin(
+    format: str = "ndjson",
+    gzip: bool = False,
+    filters: schemas.CarFilter = Depends(),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Stream the cars matching the GET /cars/ filters (admin only)"""
+    conditions = car_filter_conditions(filters)
+    q = filters.q.strip() if filters.q else ""
+    if q:
+        match, _ = car_text_search(q)
+        conditions.append(match)
+    return export_response(db, "cars", format, gzip, conditions)
+
+@router.get("/export/listings")
+async def export_listings_admin(
+    format: str = "ndjson",
+    gzip: bool = False,
+    listing_status: Optional[str] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Stream listings, optionally only those with a given status (admin only)"""
+    conditions = [models.Listing.status == listing_status] if listing_status else []
+    return export_response(db, "listings", format, gzip, conditions)
+
+@router.get("/export/reviews")
+async def export_reviews_admin(
+    format: str = "ndjson",
+    gzip: bool = False,
+    car_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_admin_user)
+):
+    """Stream reviews, optionally for one car (admin only)"""
+    conditions = [models.Review.car_id == car_id] if car_id is not None else []
+    return export_response(db, "reviews", format, gzip, conditions)
@@ -1,14 +1,18 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import ValidationError
 
 import models
 import schemas
+from cache import TTLCache
 from database import get_db
 import os
 from dotenv import load_dotenv
@@ -21,9 +25,21 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days for better user experience
 
+# Snapshots of authenticated users by id, so most requests skip the users lookup.
+# Invalidated explicitly when a user is updated or deleted; the TTL bounds how long
+# another worker process can serve a stale role or is_active flag.
+USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt spends ~250 ms of CPU per hash and releases the GIL while doing it, so
+# handlers run it on a small dedicated pool instead of the event loop. The pool
+# size caps how many hashes run at once; further logins queue for a free worker.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
 # OAuth2 token URL
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
@@ -33,14 +49,52 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def get_user(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[schemas.User]:
+    """Cached snapshot of a user for authorization checks and /users/me"""
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = await db.get(models.User, user_id)
+        if db_user is None:
+            return None
+        user = schemas.User.from_orm(db_user)
+        user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: int):
+    """Drop a cached user after its row changed or was deleted"""
+    user_cache.delete(user_id)
+
+async def get_token_user(db: AsyncSession, payload: dict):
+    # Tokens carry the user id; older tokens only have the username in "sub"
+    user_id = payload.get("uid")
+    if user_id is not None:
+        return await get_user_by_id(db, user_id)
+    username = payload.get("sub")
+    if username is None:
+        return None
+    db_user = await get_user(db, username)
+    return schemas.User.from_orm(db_user) if db_user else None
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # Return the pooled connection while waiting for a hash worker; the loaded
+    # user attributes stay readable on the detached instance
+    await db.close()
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -55,7 +109,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,14 +119,12 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Se
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        token_data = schemas.TokenData(username=username)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,7 +132,7 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Se
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    user = get_user(db, username=token_data.username)
+    user = await get_token_user(db, payload)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -90,19 +142,17 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Se
     
     return user
 
-async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """Get current user if authenticated, otherwise return None"""
     if not token:
         return None
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             return None
         
-        user = get_user(db, username=username)
-        return user
+        return await get_token_user(db, payload)
     except JWTError:
         return None
 
@@ -0,0 +1,74 @@
+"""
+Bytes saved versus CPU cost of response compression, per encoding and level.
+
+Fetches real response bodies from the app in-process (no compression, so
+the bodies are exactly what CompressionMiddleware would receive), then
+compresses each one repeatedly with every available encoder at every
+profile in compression.COMPRESSION_PROFILES:
+
+    python benchmarks/compression.py
+    python benchmarks/compression.py --path "/cars/?limit=100" --path /blogs/ --repeat 50
+
+The database must hold some cars, blogs and listings for the default paths.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from compression import COMPRESSION_MIN_SIZE, COMPRESSION_PROFILES, ENCODERS
+
+DEFAULT_PATHS = ["/cars/?limit=100", "/cars/?limit=20", "/blogs/", "/listings/approved"]
+
+async def fetch_bodies(paths):
+    from main import app
+
+    bodies = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for path in paths:
+            response = await client.get(path, headers={"Accept-Encoding": "identity"})
+            response.raise_for_status()
+            bodies[path] = response.content
+    return bodies
+
+def compress(encoding: str, level: int, body: bytes) -> bytes:
+    encoder = ENCODERS[encoding](level)
+    return encoder.compress(body) + encoder.finish()
+
+def run(args):
+    bodies = asyncio.run(fetch_bodies(args.path or DEFAULT_PATHS))
+    print(f"{'path':<22} {'encoding':<8} {'profile':<8} {'bytes':>9} {'saved':>6} {'CPU/resp':>10} {'MB/s':>8}")
+    for path, body in bodies.items():
+        print(f"{path:<22} {'identity':<8} {'':<8} {len(body):>9,}")
+        if len(body) < COMPRESSION_MIN_SIZE:
+            print(f"{'':<22} below COMPRESSION_MIN_SIZE, sent uncompressed")
+            continue
+        for encoding in ENCODERS:
+            for profile, levels in COMPRESSION_PROFILES.items():
+                level = levels[encoding]
+                compressed = compress(encoding, level, body)
+                started = time.process_time()
+                for _ in range(args.repeat):
+                    compress(encoding, level, body)
+                cpu = (time.process_time() - started) / args.repeat
+                saved = 1 - len(compressed) / len(body) if body else 0
+                throughput = len(body) / cpu / 1e6 if cpu else float("inf")
+                print(
+                    f"{'':<22} {encoding:<8} {profile:<8} {len(compressed):>9,} {saved:>6.1%} "
+                    f"{cpu * 1e6:>8.0f}us {throughput:>8.1f}"
+                )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", action="append", help="GET path to measure; repeatable")
+    parser.add_argument("--repeat", type=int, default=20, help="compressions timed per body")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Catalog page serialization: response_model path versus the fast row path.
+
+Runs in-process against the configured database (DATABASE_URL) and renders
+the same /cars/ page both ways, many times:
+
+  orm   select(Car) -> Car instances -> CarCard validation (orm_mode)
+        -> jsonable_encoder -> json, exactly what FastAPI does for a
+        response_model route
+  fast  Core select of the card columns -> dicts -> FastJSONResponse
+
+Reports rows/s for the whole request path (query included) and the CPU time
+spent per page, then checks that both bodies decode to the same JSON.
+
+    python benchmarks/list_serialization.py --limit 100 --repeat 200
+
+The cars table must hold at least --limit cars.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import select
+
+import models
+import schemas
+from car_routes import car_card_query, car_cards_response, car_keyset
+from database import AsyncSessionLocal, async_engine
+from fast_json import orjson
+from loaders import CAR_CARD_OPTIONS
+
+CARD_LIST_FIELD = create_response_field(name="response", type_=List[schemas.CarCard])
+
+def not_retired(query):
+    return query.where(models.Car.retired_at.is_(None))
+
+async def orm_page(db, limit: int) -> bytes:
+    keyset = car_keyset(None, "desc")
+    query = not_retired(select(models.Car).options(*CAR_CARD_OPTIONS))
+    result = await db.execute(keyset.apply(query, limit=limit))
+    cars, _ = keyset.page(result.scalars().all(), limit)
+    content = await serialize_response(field=CARD_LIST_FIELD, response_content=cars)
+    return JSONResponse(content).body
+
+async def fast_page(db, limit: int) -> bytes:
+    keyset = car_keyset(None, "desc")
+    query, _ = car_card_query(None)
+    response = await car_cards_response(db, not_retired(query), keyset, None, 0, limit)
+    return response.body
+
+async def measure(name, render, limit: int, repeat: int):
+    async with AsyncSessionLocal() as db:
+        body = await render(db, limit)  # warm up the connection and statement caches
+        rows = len(json.loads(body))
+        wall, cpu = 0.0, 0.0
+        for _ in range(repeat):
+            # A fresh identity map each time, as every request gets its own session
+            db.expunge_all()
+            started, started_cpu = time.perf_counter(), time.process_time()
+            await render(db, limit)
+            wall += time.perf_counter() - started
+            cpu += time.process_time() - started_cpu
+    print(
+        f"{name:<5} {rows * repeat / wall:>10,.0f} rows/s  "
+        f"{wall / repeat * 1000:7.2f} ms/page  {cpu / repeat * 1000:7.2f} ms CPU/page  "
+        f"{len(body):>8,} bytes"
+    )
+    return body, wall
+
+async def run(args):
+    print(f"{args.repeat} pages of {args.limit} cars; encoder: {'orjson' if orjson else 'json'}")
+    orm_body, orm_wall = await measure("orm", orm_page, args.limit, args.repeat)
+    fast_body, fast_wall = await measure("fast", fast_page, args.limit, args.repeat)
+    print(f"speedup: {orm_wall / fast_wall:.1f}x")
+    if json.loads(orm_body) != json.loads(fast_body):
+        print("WARNING: the two paths rendered different JSON")
+    await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--limit", type=int, default=100, help="cars per page")
+    parser.add_argument("--repeat", type=int, default=200, help="pages rendered per path")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Scripted load test of browse, search, detail, login, like and moderate traffic.
+
+Virtual users pick actions from a weighted mix for --duration seconds and
+record each request under its route, e.g. "GET /cars/{id}". The run
+reports throughput and latency percentiles per endpoint and writes them,
+with the parameters and git commit, to a JSON file for later comparison.
+By default the app runs in-process (no network, no server to start);
+--base-url targets a running server instead:
+
+    python benchmarks/seed_data.py --preset small
+    python benchmarks/load_test.py --duration 30 --concurrency 32
+    python benchmarks/load_test.py --base-url http://localhost:8000 --compare benchmarks/results/before.json
+    python benchmarks/load_test.py --compare before.json after.json   # compare two runs only
+
+Credentials and id ranges come from the manifest seed_data.py writes.
+Likes and moderation write to the database (moderation approves and
+rejects pending listings), so run against a seeded database, not a real
+one, or leave them out with --mix "browse=50,search=20,detail=30".
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from seed_data import BODY_TYPES, DEFAULT_MANIFEST, FEATURES, MODELS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Relative weight of each action per virtual user iteration
+DEFAULT_MIX = {"browse": 35, "search": 20, "detail": 30, "like": 8, "login": 2, "moderate": 5}
+SEARCH_TERMS = [*MODELS, *(model for models in MODELS.values() for model in models), *FEATURES, "без ДТП", "один владелец"]
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class Recorder:
+    """Latencies and failures per endpoint; requests before the warmup ends are dropped"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client, endpoint, method, url, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            if self.recording:
+                self.errors[endpoint][type(e).__name__] += 1
+            return None
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            if response.status_code in expected:
+                self.latencies[endpoint].append(elapsed)
+            else:
+                self.errors[endpoint][str(response.status_code)] += 1
+        return response if response.status_code in expected else None
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            ms = [value * 1000 for value in self.latencies[endpoint]]
+            errors = dict(self.errors[endpoint])
+            endpoints[endpoint] = {
+                "requests": len(ms) + sum(errors.values()),
+                "errors": errors,
+                "rps": round(len(ms) / elapsed, 2),
+                "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+                **{f"p{p}_ms": round(percentile(ms, p), 2) for p in (50, 90, 95, 99)},
+                "max_ms": round(max(ms, default=0), 2),
+            }
+        total = [value * 1000 for values in self.latencies.values() for value in values]
+        failed = sum(sum(errors.values()) for errors in self.errors.values())
+        overall = {
+            "requests": len(total) + failed,
+            "errors": failed,
+            "rps": round(len(total) / elapsed, 2),
+            **{f"p{p}_ms": round(percentile(total, p), 2) for p in (50, 95, 99)},
+        }
+        return endpoints, overall
+
+class Scenario:
+    """The actions a virtual user can take, sharing ids and admin tokens"""
+
+    def __init__(self, recorder, car_ids, blog_ids, admin_tokens):
+        self.recorder = recorder
+        self.car_ids = car_ids
+        self.blog_ids = blog_ids
+        self.admin_tokens = admin_tokens
+
+    async def browse(self, client, rng, user):
+        params = {"limit": 20}
+        choice = rng.random()
+        if choice < 0.3:
+            params["brand"] = rng.choice(list(MODELS))
+        elif choice < 0.45:
+            params["body_type"] = rng.choice(BODY_TYPES)
+        elif choice < 0.6:
+            params.update(sort_by="price", sort_order=rng.choice(["asc", "desc"]))
+        elif choice < 0.75:
+            await self.recorder.request(client, "GET /blogs/", "GET", "/blogs/")
+            return
+        response = await self.recorder.request(client, "GET /cars/", "GET", "/cars/", params=params)
+        # Some visitors page on with the cursor
+        for _ in range(rng.choice([0, 0, 1, 2])):
+            cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+            if not cursor:
+                break
+            response = await self.recorder.request(client, "GET /cars/ (next page)", "GET", "/cars/",
+                                                   params={**params, "cursor": cursor})
+
+    async def search(self, client, rng, user):
+        await self.recorder.request(client, "GET /cars/?q=", "GET", "/cars/",
+                                    params={"q": rng.choice(SEARCH_TERMS), "limit": 20})
+
+    async def detail(self, client, rng, user):
+        if self.blog_ids and rng.random() < 0.3:
+            await self.recorder.request(client, "GET /blogs/{id}", "GET", f"/blogs/{rng.choice(self.blog_ids)}")
+        elif self.car_ids:
+            await self.recorder.request(client, "GET /cars/{id}", "GET", f"/cars/{rng.choice(self.car_ids)}")
+
+    async def login(self, client, rng, user):
+        username, password, _ = user
+        await self.recorder.request(client, "POST /token", "POST", "/token",
+                                    data={"username": username, "password": password})
+
+    async def like(self, client, rng, user):
+        token = user[2]
+        if token and self.blog_ids:
+            await self.recorder.request(client, "PUT /blogs/{id}/like", "PUT", f"/blogs/{rng.choice(self.blog_ids)}/like",
+                                        expected=(204,), headers={"Authorization": f"Bearer {token}"})
+
+    async def moderate(self, client, rng, user):
+        if not self.admin_tokens:
+            return
+        token, lock = rng.choice(self.admin_tokens)
+        # A moderator works through one claimed batch at a time; a claim
+        # returns the moderator's own unfinished leases again
+        async with lock:
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await self.recorder.request(client, "POST /admin/listings/claim", "POST", "/admin/listings/claim",
+                                                   params={"limit": 10}, headers=headers)
+            items = response.json()["items"] if response is not None else []
+            if not items:
+                return
+            decisions = [
+                {"listing_id": item["id"], "status": rng.choices(["approved", "rejected"], [4, 1])[0],
+                 "moderator_comment": "load test"}
+                for item in items
+            ]
+            await self.recorder.request(client, "PUT /admin/listings/moderate", "PUT", "/admin/listings/moderate",
+                                        json={"decisions": decisions}, headers=headers)
+
+async def get_token(client, username, password):
+    response = await client.post("/token", data={"username": username, "password": password})
+    if response.status_code != 200:
+        return None
+    return response.json()["access_token"]
+
+async def discover_ids(client, path, limit=100, pages=5):
+    """Ids visible to anonymous clients, from the first pages of a list endpoint"""
+    ids, cursor = [], None
+    for _ in range(pages):
+        response = await client.get(path, params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        response.raise_for_status()
+        ids.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    return ids
+
+async def setup(client, args, manifest, recorder):
+    admin_tokens = []
+    if manifest:
+        first, last = manifest["users"]
+        rng = random.Random(args.seed)
+        usernames = [f"loaduser{rng.randint(first, last)}" for _ in range(args.concurrency)]
+        password = manifest["password"]
+        admins = manifest["admins"]
+    else:
+        usernames = [args.username] * args.concurrency if args.username else []
+        password = args.password
+        admins = [args.admin_username] if args.admin_username else []
+
+    # Tokens for every virtual user; logins here are not measured
+    tokens = await asyncio.gather(*(get_token(client, username, password) for username in usernames))
+    users = [(username, password, token) for username, token in zip(usernames, tokens)]
+    for admin in admins[:4]:
+        token = await get_token(client, admin, args.admin_password or password)
+        if token:
+            admin_tokens.append((token, asyncio.Lock()))
+
+    # Uniform over the seeded range reaches rows no cache has seen; the
+    # first list pages add the rows every visitor sees
+    car_ids = await discover_ids(client, "/cars/")
+    if manifest and manifest.get("cars"):
+        rng = random.Random(args.seed)
+        car_ids += [rng.randint(*manifest["cars"]) for _ in range(5_000)]
+    blog_ids = await discover_ids(client, "/blogs/", limit=50, pages=20)
+    return users, Scenario(recorder, car_ids, blog_ids, admin_tokens)
+
+async def virtual_user(index, client, scenario, user, mix, args, stop):
+    rng = random.Random(args.seed * 1_000 + index)
+    actions, weights = zip(*mix.items())
+    while not stop.is_set():
+        action = rng.choices(actions, weights)[0]
+        await getattr(scenario, action)(client, rng, user)
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+async def run(args, manifest):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits)
+        app = None
+    else:
+        from main import app
+
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://load-test", timeout=60)
+
+    try:
+        async with client:
+            users, scenario = await setup(client, args, manifest, recorder)
+            mix = dict(args.mix)
+            if not any(token for _, _, token in users):
+                print("no user could log in; leaving out login and like")
+                users = users or [(None, None, None)]
+                mix.pop("login", None)
+                mix.pop("like", None)
+            if not scenario.admin_tokens and mix.pop("moderate", None):
+                print("no admin could log in; leaving out moderate")
+
+            stop = asyncio.Event()
+            tasks = [
+                asyncio.create_task(virtual_user(index, client, scenario, users[index % len(users)], mix, args, stop))
+                for index in range(args.concurrency)
+            ]
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+            started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            recorder.recording = False
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*tasks)
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+    return recorder.summary(elapsed), mix
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(result):
+    print(f"{'endpoint':<32} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, stats in result["endpoints"].items():
+        print(
+            f"{endpoint:<32} {stats['requests']:>7} {sum(stats['errors'].values()):>5} {stats['rps']:>8.1f} "
+            + " ".join(f"{stats[key]:>8.1f}" for key in ("p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms"))
+        )
+    total = result["total"]
+    print(f"{'total':<32} {total['requests']:>7} {total['errors']:>5} {total['rps']:>8.1f} "
+          f"{total['p50_ms']:>8.1f} {'':>8} {total['p95_ms']:>8.1f} {total['p99_ms']:>8.1f}")
+
+def _change(old, new):
+    if not old or new is None:
+        return "      n/a"
+    return f"{(new - old) / old:>+9.1%}"
+
+def compare(baseline, result):
+    """Change per endpoint between two result files; positive latency changes are regressions"""
+    print(f"baseline {baseline['meta']['started_at']} ({baseline['meta'].get('git_commit')}) -> "
+          f"{result['meta']['started_at']} ({result['meta'].get('git_commit')})")
+    print(f"{'endpoint':<32} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [(name, baseline["endpoints"].get(name), stats) for name, stats in result["endpoints"].items()]
+    rows.append(("total", baseline["total"], result["total"]))
+    for name, old, new in rows:
+        if old is None:
+            print(f"{name:<32} not in baseline")
+            continue
+        print(f"{name:<32} " + " ".join(_change(old[key], new[key]) for key in ("rps", "p50_ms", "p95_ms", "p99_ms")))
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", help="server to test; the app runs in-process when omitted")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the measurement")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's actions, seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help='action weights, e.g. "browse=3,search=1"')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="written by seed_data.py")
+    parser.add_argument("--username", help="user for every virtual user when there is no manifest")
+    parser.add_argument("--password")
+    parser.add_argument("--admin-username", help="moderator when there is no manifest")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--output", help="result file; defaults to benchmarks/results/load-<time>.json")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT",
+                        help="baseline to compare this run with, or two result files to compare without running")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        compare(load_json(args.compare[0]), load_json(args.compare[1]))
+        return
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline, or two result files")
+
+    manifest = load_json(args.manifest) if os.path.exists(args.manifest) and not args.username else None
+    started_at = datetime.utcnow().replace(microsecond=0)
+    (endpoints, total), mix = asyncio.run(run(args, manifest))
+    result = {
+        "meta": {
+            "started_at": started_at.isoformat(),
+            "git_commit": git_commit(),
+            "target": args.base_url or "in-process",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "think_time": args.think_time,
+            "mix": mix,
+            "seed": args.seed,
+            "dataset": manifest["rows"] if manifest else None,
+            "python": platform.python_version(),
+        },
+        "endpoints": endpoints,
+        "total": total,
+    }
+    print_summary(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}")
+    if args.compare:
+        compare(load_json(args.compare[0]), result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Login throughput and event-loop responsiveness under a login storm.
+
+Runs against a live server. First measures the latency of an unrelated endpoint
+on its own, then again while CONCURRENCY clients log in as fast as they can.
+If password hashing blocked the event loop, the probe p99 during the storm
+would grow by roughly the bcrypt cost times the number of queued logins.
+
+    pip install httpx
+    uvicorn main:app --port 8000   # in another shell
+    python benchmarks/login_storm.py --username admin --password admin
+
+The user must exist; every request authenticates against it.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def describe(name, latencies):
+    ms = [value * 1000 for value in latencies]
+    print(
+        f"{name:<22} n={len(ms):<6} "
+        f"p50={percentile(ms, 50):8.1f} ms  p99={percentile(ms, 99):8.1f} ms  "
+        f"max={max(ms, default=0):8.1f} ms"
+    )
+
+async def probe(client, path, interval, stop):
+    """Request an unrelated endpoint at a steady rate and record its latency"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def login_worker(client, credentials, stop, latencies, failures):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post("/token", data=credentials)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures.append(response.status_code)
+
+async def run(args):
+    credentials = {"username": args.username, "password": args.password}
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        # Warm up connections and caches
+        (await client.post("/token", data=credentials)).raise_for_status()
+        (await client.get(args.probe_path)).raise_for_status()
+
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, args.probe_path, args.probe_interval, stop))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        baseline = await task
+
+        stop = asyncio.Event()
+        login_latencies, failures = [], []
+        probe_task = asyncio.create_task(probe(client, args.probe_path, args.probe_interval, stop))
+        workers = [
+            asyncio.create_task(login_worker(client, credentials, stop, login_latencies, failures))
+            for _ in range(args.concurrency)
+        ]
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        storm = await probe_task
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.concurrency} concurrent logins for {args.duration:.0f}s against {args.base_url}")
+    print(f"logins/s: {len(login_latencies) / elapsed:.1f}  failures: {len(failures)}")
+    describe("login", login_latencies)
+    describe(f"{args.probe_path} idle", baseline)
+    describe(f"{args.probe_path} storm", storm)
+    if baseline and storm:
+        slowdown = statistics.median(storm) / statistics.median(baseline)
+        print(f"probe median slowdown during storm: {slowdown:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
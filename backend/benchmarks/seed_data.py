@@ -0,0 +1,370 @@
+"""
+Seed the database with synthetic users, cars, listings, reviews, blogs, comments, likes and favorites.
+
+Rows are generated from a fixed random seed and written with COPY in chunks,
+so the same preset always produces the same data and a million cars load in
+minutes. Popularity is long-tailed: a few blogs collect most likes, a few
+cars most reviews. Rows are appended after the existing ones, so seeding
+twice doubles the volume unless --truncate is given.
+
+    python benchmarks/seed_data.py --preset small
+    python benchmarks/seed_data.py --preset large --truncate   # 1M cars, 10M likes
+    python benchmarks/seed_data.py --preset medium --cars 500000 --likes 0
+
+Every seeded user has the password "loadtest"; the first --admins of them
+are admins. A manifest with the id ranges and credentials is written for
+benchmarks/load_test.py. PostgreSQL only: the schema relies on arrays,
+a generated tsvector column and COPY.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from pricing import parse_price
+
+PRESETS = {
+    "small": dict(users=2_000, cars=20_000, listings=5_000, reviews=40_000, blogs=1_000,
+                  comments=20_000, likes=100_000, favorites=40_000),
+    "medium": dict(users=20_000, cars=200_000, listings=50_000, reviews=400_000, blogs=10_000,
+                   comments=200_000, likes=1_000_000, favorites=400_000),
+    "large": dict(users=100_000, cars=1_000_000, listings=200_000, reviews=2_000_000, blogs=50_000,
+                  comments=1_000_000, likes=10_000_000, favorites=2_000_000),
+}
+TABLES = ["users", "cars", "listings", "reviews", "blogs", "comments", "likes", "favorites"]
+
+PASSWORD = "loadtest"
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "seed_manifest.json")
+
+# Rows per COPY; large enough to amortize the round trip, small enough to stream
+CHUNK_SIZE = 20_000
+# Rows are dated over the last two years
+HISTORY = timedelta(days=730)
+
+MODELS = {
+    "Toyota": ["Camry", "Corolla", "RAV4", "Land Cruiser", "Prado", "Highlander"],
+    "Kia": ["Rio", "K5", "Sportage", "Sorento", "Seltos"],
+    "Hyundai": ["Accent", "Elantra", "Sonata", "Tucson", "Santa Fe", "Creta"],
+    "Chevrolet": ["Cobalt", "Nexia", "Onix", "Tracker", "Captiva"],
+    "Lexus": ["ES", "RX", "LX", "NX", "GX"],
+    "BMW": ["3 Series", "5 Series", "X3", "X5", "X7"],
+    "Mercedes": ["C-Class", "E-Class", "S-Class", "GLE", "GLS"],
+    "Volkswagen": ["Polo", "Jetta", "Passat", "Tiguan", "Touareg"],
+    "Audi": ["A4", "A6", "Q5", "Q7", "Q8"],
+    "Nissan": ["Almera", "Qashqai", "X-Trail", "Patrol"],
+    "Mitsubishi": ["Outlander", "Pajero", "ASX", "L200"],
+    "Skoda": ["Rapid", "Octavia", "Kodiaq", "Superb"],
+    "Mazda": ["3", "6", "CX-5", "CX-9"],
+    "Honda": ["Civic", "Accord", "CR-V", "Pilot"],
+    "Ford": ["Focus", "Mondeo", "Explorer", "Ranger"],
+    "Jeep": ["Wrangler", "Grand Cherokee", "Compass"],
+}
+BRANDS = list(MODELS)
+# Relative share of each brand, the most common first
+BRAND_WEIGHTS = [1 / (rank + 1) ** 0.7 for rank in range(len(BRANDS))]
+CATEGORIES = ["Used Car", "New Car", "In Stock"]
+BODY_TYPES = ["Седан", "Кроссовер", "Хэтчбек", "Внедорожник", "Универсал", "Минивэн", "Купе", "Пикап", "Кабриолет"]
+ENGINE_TYPES = ["Бензиновый", "Дизельный", "Гибридный", "Электрический"]
+DRIVE_UNITS = ["Передний привод", "Полный привод", "Задний привод"]
+TRANSMISSIONS = ["Автомат", "Механика", "Вариатор", "Робот"]
+COLORS = ["Белый", "Черный", "Серый", "Серебристый", "Синий", "Красный", "Коричневый", "Зеленый"]
+FEATURES = [
+    "Климат-контроль", "Кожаный салон", "Подогрев сидений", "Камера заднего вида", "Парктроники",
+    "Круиз-контроль", "Люк", "Панорамная крыша", "Навигация", "Бесключевой доступ",
+    "Подогрев руля", "Адаптивные фары", "Apple CarPlay", "Android Auto", "Электропривод багажника",
+]
+WORDS = (
+    "машина в отличном состоянии один владелец без ДТП полный комплект ключей сервисная книжка "
+    "зимняя резина в подарок растаможен не бит не крашен торг уместен обмен не предлагать "
+    "экономичный надежный просторный салон свежее масло новые колодки гаражное хранение"
+).split()
+BLOG_TITLES = ["Как выбрать", "Обзор", "Тест-драйв", "Сравнение", "Плюсы и минусы", "Опыт владения"]
+REVIEW_COMMENTS = [
+    "Отличный автомобиль, рекомендую", "Надежный и экономичный", "Дороговато в обслуживании",
+    "Комфортный салон, мягкая подвеска", "Для города идеально", "Есть недостатки, но в целом доволен",
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    for table in TABLES:
+        parser.add_argument(f"--{table}", type=int, help=f"number of {table}, overriding the preset")
+    parser.add_argument("--admins", type=int, default=5, help="seeded users given the admin role")
+    parser.add_argument("--seed", type=int, default=1, help="random seed; the same seed gives the same rows")
+    parser.add_argument("--truncate", action="store_true", help="empty every table first")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="where to write ids and credentials")
+    args = parser.parse_args()
+    args.counts = {table: getattr(args, table) if getattr(args, table) is not None else PRESETS[args.preset][table]
+                   for table in TABLES}
+    return args
+
+def spread(rng, total, buckets, cap, skew=0.6):
+    """
+    Split total into buckets with long-tailed sizes, none above cap.
+
+    Sizes follow 1/rank**skew in a shuffled order; what rounding and the
+    cap leave over is shared evenly, so the sum is total unless every
+    bucket is full.
+    """
+    if not buckets or not total:
+        return [0] * buckets
+    weights = [1 / (rank + 1) ** skew for rank in range(buckets)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [min(cap, int(weight * scale)) for weight in weights]
+    while True:
+        short = total - sum(counts)
+        room = [index for index, count in enumerate(counts) if count < cap]
+        if short <= 0 or not room:
+            return counts
+        share, extra = divmod(short, len(room))
+        for position, index in enumerate(room):
+            counts[index] = min(cap, counts[index] + share + (1 if position < extra else 0))
+
+def unique_pairs(rng, parents, counts, children):
+    """(parent, child) pairs, counts[i] distinct children for parents[i]"""
+    for parent, count in zip(parents, counts):
+        for child in rng.sample(children, count):
+            yield parent, child
+
+def timestamp(rng, now):
+    return now - timedelta(seconds=rng.random() * HISTORY.total_seconds())
+
+def sentence(rng, words):
+    return " ".join(rng.choices(WORDS, k=words)).capitalize()
+
+def car_fields(rng):
+    """Fields a car and a listing share"""
+    brand = rng.choices(BRANDS, BRAND_WEIGHTS)[0]
+    year = rng.randint(2000, 2025)
+    mileage = 0 if year >= 2025 else rng.randint(1_000, 25_000) * (2025 - year) // 2
+    price = f"{rng.randint(15, 600) * 100_000:,} ₸".replace(",", " ")
+    amount, currency = parse_price(price)
+    features = rng.sample(FEATURES, rng.randint(0, 6))
+    return dict(
+        brand=brand, model=rng.choice(MODELS[brand]), year=year, mileage=mileage,
+        price=price, price_amount=amount, price_currency=currency,
+        category=CATEGORIES[0] if mileage else rng.choice(CATEGORIES[1:]),
+        body_type=rng.choice(BODY_TYPES), engine_type=rng.choices(ENGINE_TYPES, [10, 4, 2, 1])[0],
+        drive_unit=rng.choice(DRIVE_UNITS), transmission=rng.choices(TRANSMISSIONS, [8, 4, 2, 1])[0],
+        color=rng.choice(COLORS), additional_features=features,
+        description=sentence(rng, rng.randint(8, 30)),
+    )
+
+def user_rows(rng, first_id, count, admins, hashed_password, now):
+    for user_id in range(first_id, first_id + count):
+        created = timestamp(rng, now)
+        role = "admin" if user_id < first_id + admins else "user"
+        yield (user_id, f"loaduser{user_id}", f"loaduser{user_id}@example.com", hashed_password,
+               f"Имя{user_id % 997}", f"Фамилия{user_id % 1009}", f"+7700{user_id % 10_000_000:07d}",
+               role, True, created, created)
+
+USER_COLUMNS = ["id", "username", "email", "hashed_password", "first_name", "last_name", "phone",
+                "role", "is_active", "created_at", "updated_at"]
+
+def car_rows(rng, first_id, count, now):
+    for car_id in range(first_id, first_id + count):
+        car = car_fields(rng)
+        created = timestamp(rng, now)
+        image = f"https://cdn.example.com/cars/{car_id}.jpg"
+        gallery = [f"https://cdn.example.com/cars/{car_id}-{n}.jpg" for n in range(rng.randint(0, 4))]
+        electric = car["engine_type"] == "Электрический"
+        yield (car_id, car["brand"], car["model"], car["category"], car["price"], car["price_amount"],
+               car["price_currency"], car["description"], image, gallery, car["year"], car["body_type"],
+               car["engine_type"], car["drive_unit"], None if electric else f"{rng.choice([1.6, 2.0, 2.5, 3.5])} л",
+               None if electric else f"{rng.randint(6, 14)} л/100 км", car["color"], car["mileage"],
+               f"{rng.choice([60, 75, 100])} кВт·ч" if electric else None,
+               f"{rng.randint(350, 600)} км" if electric else None,
+               car["transmission"], car["additional_features"], created, created)
+
+CAR_COLUMNS = ["id", "brand", "model", "category", "price", "price_amount", "price_currency", "shortDescription",
+               "image", "gallery", "year", "body_type", "engine_type", "drive_unit", "engine_volume",
+               "fuel_consumption", "color", "mileage", "battery_capacity", "range", "transmission",
+               "additional_features", "created_at", "updated_at"]
+
+def listing_rows(rng, first_id, count, user_ids, admin_ids, now):
+    for listing_id in range(first_id, first_id + count):
+        car = car_fields(rng)
+        created = timestamp(rng, now)
+        # Mostly moderated, with a pending queue for the moderation scenario
+        status = rng.choices(["approved", "rejected", "pending"], [6, 1, 3])[0]
+        moderator = rng.choice(admin_ids) if status != "pending" and admin_ids else None
+        yield (listing_id, rng.choice(user_ids), car["brand"], car["model"], car["year"], car["price"],
+               car["price_amount"], car["price_currency"], car["category"], car["body_type"], car["engine_type"],
+               car["drive_unit"], car["color"], car["mileage"], car["transmission"], car["description"],
+               f"https://cdn.example.com/listings/{listing_id}.jpg", [], car["additional_features"], status,
+               moderator, "Не соответствует правилам" if status == "rejected" else None, created, created)
+
+LISTING_COLUMNS = ["id", "creator_id", "brand", "model", "year", "price", "price_amount", "price_currency",
+                   "category", "body_type", "engine_type", "drive_unit", "color", "mileage", "transmission",
+                   "short_description", "image", "gallery", "additional_features", "status", "moderator_id",
+                   "moderator_comment", "created_at", "updated_at"]
+
+def blog_rows(rng, first_id, statuses, likes, user_ids, admin_ids, now):
+    for offset, (status, likes_count) in enumerate(zip(statuses, likes)):
+        blog_id = first_id + offset
+        created = timestamp(rng, now)
+        brand = rng.choice(BRANDS)
+        paragraphs = [sentence(rng, rng.randint(40, 120)) + "." for _ in range(rng.randint(3, 12))]
+        content = "\n\n".join(paragraphs)
+        moderator = rng.choice(admin_ids) if status != "pending" and admin_ids else None
+        yield (blog_id, rng.choice(user_ids), f"{rng.choice(BLOG_TITLES)} {brand} {rng.choice(MODELS[brand])}",
+               paragraphs[0][:200], content, f"https://cdn.example.com/blogs/{blog_id}.jpg",
+               f"{max(1, len(content) // 1000)} минут чтения", likes_count * rng.randint(5, 40), likes_count,
+               status, moderator, created, created)
+
+BLOG_COLUMNS = ["id", "author_id", "title", "shortDescription", "fullContent", "image", "readTime", "views",
+                "likes_count", "status", "moderator_id", "created_at", "updated_at"]
+
+def comment_rows(rng, first_id, blog_ids, counts, user_ids, now):
+    comment_id = first_id
+    for blog_id, count in zip(blog_ids, counts):
+        for _ in range(count):
+            created = timestamp(rng, now)
+            yield comment_id, blog_id, rng.choice(user_ids), sentence(rng, rng.randint(3, 25)), created, created
+            comment_id += 1
+
+COMMENT_COLUMNS = ["id", "blog_id", "user_id", "content", "created_at", "updated_at"]
+
+def review_rows(rng, first_id, pairs, now):
+    for review_id, (car_id, user_id) in enumerate(pairs, first_id):
+        created = timestamp(rng, now)
+        rating = rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 10])[0]
+        yield review_id, car_id, user_id, rating, rng.choice(REVIEW_COMMENTS), created, created
+
+REVIEW_COLUMNS = ["id", "car_id", "user_id", "rating", "comment", "created_at", "updated_at"]
+
+async def copy_all(db, table, columns, rows, chunk_size):
+    """COPY rows in chunks, committing each; returns the number written"""
+    from car_import import copy_rows
+
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            await copy_rows(db, table, columns, chunk)
+            await db.commit()
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        await copy_rows(db, table, columns, chunk)
+        await db.commit()
+        written += len(chunk)
+    return written
+
+async def next_id(db, table):
+    return (await db.execute(text(f"SELECT coalesce(max(id), 0) + 1 FROM {table}"))).scalar_one()
+
+async def reset_sequence(db, table):
+    # Rows were written with explicit ids; move the sequence past them
+    await db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 1) FROM {table}))"
+    ))
+    await db.commit()
+
+async def seed(args):
+    import models
+    from auth import get_password_hash
+    from database import AsyncSessionLocal, async_engine
+
+    counts = args.counts
+    rng = random.Random(args.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    written = {}
+
+    async def load(name, table, columns, rows):
+        started = time.perf_counter()
+        written[name] = await copy_all(db, table, columns, rows, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        rate = written[name] / elapsed if elapsed else 0
+        print(f"{name:<10} {written[name]:>11,} rows  {elapsed:7.1f}s  {rate:>9,.0f} rows/s")
+
+    async with AsyncSessionLocal() as db:
+        if args.truncate:
+            tables = ", ".join(table.name for table in reversed(models.Base.metadata.sorted_tables))
+            await db.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+            await db.commit()
+
+        # Hashing is deliberately slow; every seeded user shares one hash
+        hashed_password = get_password_hash(PASSWORD)
+        first_user = await next_id(db, "users")
+        await load("users", "users", USER_COLUMNS,
+                   user_rows(rng, first_user, counts["users"], args.admins, hashed_password, now))
+        user_ids = range(first_user, first_user + written["users"])
+        admin_ids = list(user_ids[:args.admins])
+        if not user_ids:
+            user_ids = range(1, await next_id(db, "users"))
+        if not user_ids:
+            raise SystemExit("No users to own the seeded rows; pass --users")
+
+        first_car = await next_id(db, "cars")
+        await load("cars", "cars", CAR_COLUMNS, car_rows(rng, first_car, counts["cars"], now))
+        car_ids = range(first_car, first_car + written["cars"])
+
+        first_listing = await next_id(db, "listings")
+        await load("listings", "listings", LISTING_COLUMNS,
+                   listing_rows(rng, first_listing, counts["listings"], user_ids, admin_ids, now))
+
+        # Like counts are drawn before the blogs, so likes_count matches blog_likes
+        first_blog = await next_id(db, "blogs")
+        statuses = rng.choices(["approved", "pending", "rejected"], [8, 1, 1], k=counts["blogs"])
+        approved = [first_blog + index for index, status in enumerate(statuses) if status == "approved"]
+        approved_likes = iter(spread(rng, counts["likes"], len(approved), len(user_ids)))
+        likes = [next(approved_likes) if status == "approved" else 0 for status in statuses]
+        await load("blogs", "blogs", BLOG_COLUMNS, blog_rows(rng, first_blog, statuses, likes, user_ids, admin_ids, now))
+        blog_ids = [first_blog + index for index in range(len(statuses))]
+        await load("likes", "blog_likes", ["blog_id", "user_id"],
+                   unique_pairs(rng, blog_ids, likes, user_ids))
+
+        comment_counts = spread(rng, counts["comments"], len(approved), counts["comments"])
+        await load("comments", "comments", COMMENT_COLUMNS,
+                   comment_rows(rng, await next_id(db, "comments"), approved, comment_counts, user_ids, now))
+
+        review_pairs = unique_pairs(rng, car_ids, spread(rng, counts["reviews"], len(car_ids), len(user_ids)), user_ids)
+        await load("reviews", "reviews", REVIEW_COLUMNS, review_rows(rng, await next_id(db, "reviews"), review_pairs, now))
+
+        # Favorites pair every user with a few cars, a few users with many
+        favorite_counts = spread(rng, counts["favorites"], len(user_ids), len(car_ids))
+        await load("favorites", "favorites", ["user_id", "car_id"],
+                   unique_pairs(rng, list(user_ids), favorite_counts, car_ids))
+
+        for table in ("users", "cars", "listings", "blogs", "comments", "reviews"):
+            await reset_sequence(db, table)
+
+    # Fresh statistics, so the planner sees the new volumes right away
+    async with async_engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+    await async_engine.dispose()
+
+    manifest = {
+        "seed": args.seed,
+        "preset": args.preset,
+        "created_at": now.isoformat(),
+        "rows": written,
+        "password": PASSWORD,
+        "users": [user_ids.start, user_ids.stop - 1],
+        "admins": [f"loaduser{user_id}" for user_id in admin_ids],
+        "cars": [car_ids.start, car_ids.stop - 1] if car_ids else None,
+        "blogs": [first_blog, first_blog + len(statuses) - 1] if statuses else None,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.manifest)), exist_ok=True)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"manifest written to {args.manifest}")
+
+def main():
+    asyncio.run(seed(parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Optional
-from sqlalchemy import and_, desc, func
+from datetime import datetime
+from sqlalchemy import and_, delete, desc, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 
 import schemas
 import models
 import auth
 from database import get_db
+from loaders import BLOG_OPTIONS, BLOG_SUMMARY_OPTIONS, COMMENT_OPTIONS
+from pagination import Keyset, set_next_cursor
+from singleflight import group
+from view_counter import view_counter
 
 router = APIRouter(
     prefix="/blogs",
     tags=["blogs"]
 )
 
-@router.get("/", response_model=List[schemas.Blog])
+# Concurrent identical reads share one in-flight fetch
+get_blog_flights = group("get_blog")
+featured_blogs_flights = group("get_featured_blogs")
+
+async def get_blog_or_none(db: AsyncSession, blog_id: int):
+    """Load a blog with every relationship needed for the response"""
+    result = await db.execute(
+        select(models.Blog)
+        .options(*BLOG_OPTIONS)
+        .where(models.Blog.id == blog_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+@router.get("/", response_model=List[schemas.BlogSummary])
 async def get_all_blogs(
+    response: Response,
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all approved blogs with pagination"""
+    keyset = Keyset(models.Blog.created_at, models.Blog.id, descending=True)
+    
     # Only return approved blogs to the public
-    blogs = db.query(models.Blog).filter(
+    query = select(models.Blog).options(*BLOG_SUMMARY_OPTIONS).where(
         models.Blog.status == "approved"
-    ).order_by(desc(models.Blog.created_at)).offset(skip).limit(limit).all()
+    )
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
+    blogs, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return blogs
 
-@router.get("/featured", response_model=List[schemas.Blog])
+@router.get("/featured", response_model=List[schemas.BlogSummary])
 async def get_featured_blogs(
     limit: int = 3,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get featured blogs (most viewed, approved blogs)"""
-    blogs = db.query(models.Blog).filter(
-        models.Blog.status == "approved"
-    ).order_by(desc(models.Blog.views)).limit(limit).all()
+    async def fetch():
+        result = await db.execute(
+            select(models.Blog).options(*BLOG_SUMMARY_OPTIONS).where(
+                models.Blog.status == "approved"
+            ).order_by(desc(models.Blog.views)).limit(limit)
+        )
+        return [schemas.BlogSummary.from_orm(blog) for blog in result.scalars().all()]
     
-    return blogs
+    return await featured_blogs_flights.do(limit, fetch)
 
-@router.get("/user", response_model=List[schemas.Blog])
+@router.get("/user", response_model=List[schemas.BlogSummary])
 async def get_user_blogs(
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Get blogs created by the current user, optionally filtered by status"""
-    query = db.query(models.Blog).filter(models.Blog.author_id == current_user.id)
+    query = select(models.Blog).options(*BLOG_SUMMARY_OPTIONS).where(models.Blog.author_id == current_user.id)
     
     if status:
-        query = query.filter(models.Blog.status == status)
+        query = query.where(models.Blog.status == status)
     
     # Order by newest first
     query = query.order_by(desc(models.Blog.created_at))
     
-    return query.all()
+    result = await db.execute(query)
+    return result.scalars().all()
 
 @router.get("/{blog_id}", response_model=schemas.Blog)
 async def get_blog(
     blog_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[schemas.User] = None
 ):
     """Get a specific blog by ID"""
-    blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    
-    if not blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # For non-approved blogs, check if the user is the author or an admin
-    if blog.status != "approved":
-        if not current_user:
+    async def fetch():
+        blog = await get_blog_or_none(db, blog_id)
+        
+        if not blog:
             raise HTTPException(status_code=404, detail="Blog not found")
+        
+        # For non-approved blogs, check if the user is the author or an admin
+        if blog.status != "approved":
+            if not current_user:
+                raise HTTPException(status_code=404, detail="Blog not found")
+                
+            if current_user.id != blog.author_id and current_user.role != "admin":
+                raise HTTPException(status_code=404, detail="Blog not found")
+        
+        # Include blog comments, newest first
+        set_committed_value(
+            blog, "comments",
+            sorted(blog.comments, key=lambda comment: comment.created_at, reverse=True)
+        )
+        
+        # Check if current user has liked this blog
+        if current_user:
+            result = await db.execute(select(models.blog_likes).where(
+                models.blog_likes.c.user_id == current_user.id,
+                models.blog_likes.c.blog_id == blog_id
+            ))
+            like_exists = result.first()
             
-        if current_user.id != blog.author_id and current_user.role != "admin":
-            raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Include blog comments
-    blog.comments = db.query(models.Comment).filter(
-        models.Comment.blog_id == blog_id
-    ).order_by(desc(models.Comment.created_at)).all()
-    
-    # Check if current user has liked this blog
-    if current_user:
-        like_exists = db.query(models.blog_likes).filter(
-            models.blog_likes.c.user_id == current_user.id,
-            models.blog_likes.c.blog_id == blog_id
-        ).first()
+            blog.user_has_liked = bool(like_exists)
+        else:
+            blog.user_has_liked = False
         
-        blog.user_has_liked = bool(like_exists)
-    else:
-        blog.user_has_liked = False
+        return schemas.Blog.from_orm(blog)
     
-    return blog
+    # The result depends on the viewer, so the key includes the user
+    return await get_blog_flights.do((blog_id, current_user.id if current_user else None), fetch)
 
 @router.post("/", response_model=schemas.Blog)
 async def create_blog(
     blog: schemas.BlogCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Create a new blog post"""
@@ -113,21 +154,20 @@ async def create_blog(
     )
     
     db.add(db_blog)
-    db.commit()
-    db.refresh(db_blog)
+    await db.commit()
     
-    return db_blog
+    return await get_blog_or_none(db, db_blog.id)
 
 @router.put("/{blog_id}", response_model=schemas.Blog)
 async def update_blog(
     blog_id: int,
     blog_update: schemas.BlogUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Update a blog post"""
     # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    db_blog = await db.get(models.Blog, blog_id)
     
     if not db_blog:
         raise HTTPException(status_code=404, detail="Blog not found")
@@ -156,20 +196,19 @@ async def update_blog(
     for key, value in update_data.items():
         setattr(db_blog, key, value)
     
-    db.commit()
-    db.refresh(db_blog)
+    await db.commit()
     
-    return db_blog
+    return await get_blog_or_none(db, blog_id)
 
 @router.delete("/{blog_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_blog(
     blog_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Delete a blog post"""
     # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    db_blog = await db.get(models.Blog, blog_id)
     
     if not db_blog:
         raise HTTPException(status_code=404, detail="Blog not found")
@@ -182,107 +221,131 @@ async def delete_blog(
         )
     
     # Delete the blog and all associated comments
-    db.delete(db_blog)
-    db.commit()
+    await db.delete(db_blog)
+    await db.commit()
     
     return None
 
 @router.post("/{blog_id}/view", status_code=status.HTTP_204_NO_CONTENT)
 async def increment_blog_views(
     blog_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """Increment the view count for a blog post"""
-    # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    
-    if not db_blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Increment views
-    db_blog.views = db_blog.views + 1
+    # Check the blog exists, once per blog rather than once per view
+    if not view_counter.known_blogs.get(blog_id):
+        result = await db.execute(select(models.Blog.id).where(models.Blog.id == blog_id))
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail="Blog not found")
+        view_counter.known_blogs.set(blog_id, True)
     
-    db.commit()
+    # Buffer the view; it is written to the database in the next periodic flush
+    client_key = view_counter.client_key(
+        request.client.host if request.client else None,
+        request.headers.get("user-agent")
+    )
+    view_counter.record(blog_id, client_key)
     
     return None
 
+async def add_like(db: AsyncSession, blog_id: int, user_id: int) -> bool:
+    """
+    Insert the like and bump likes_count in one statement.
+    Returns False if the user had already liked the blog.
+    """
+    inserted = (
+        pg_insert(models.blog_likes)
+        .values(user_id=user_id, blog_id=blog_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "blog_id"])
+        .returning(models.blog_likes.c.blog_id)
+        .cte("inserted_like")
+    )
+    stmt = (
+        update(models.Blog)
+        .where(models.Blog.id.in_(select(inserted.c.blog_id)))
+        # updated_at is explicit: with the INSERT CTE attached, SQLAlchemy 2.0
+        # binds the Blog.updated_at onupdate parameter as NULL
+        .values(likes_count=models.Blog.likes_count + 1, updated_at=datetime.utcnow())
+        .returning(models.Blog.id)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        result = await db.execute(stmt)
+        changed = result.first() is not None
+        await db.commit()
+    except IntegrityError:
+        # blog_likes.blog_id references a blog that does not exist
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Blog not found")
+    return changed
+
+async def remove_like(db: AsyncSession, blog_id: int, user_id: int) -> bool:
+    """
+    Delete the like and decrement likes_count in one statement.
+    Returns False if there was no like to remove.
+    """
+    deleted = (
+        delete(models.blog_likes)
+        .where(
+            models.blog_likes.c.user_id == user_id,
+            models.blog_likes.c.blog_id == blog_id
+        )
+        .returning(models.blog_likes.c.blog_id)
+        .cte("deleted_like")
+    )
+    stmt = (
+        update(models.Blog)
+        .where(models.Blog.id.in_(select(deleted.c.blog_id)))
+        .values(likes_count=func.greatest(models.Blog.likes_count - 1, 0), updated_at=datetime.utcnow())
+        .returning(models.Blog.id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    changed = result.first() is not None
+    await db.commit()
+    
+    if not changed:
+        # Only the miss path pays for telling "no such blog" apart from "not liked"
+        exists = await db.execute(select(models.Blog.id).where(models.Blog.id == blog_id))
+        if exists.first() is None:
+            raise HTTPException(status_code=404, detail="Blog not found")
+    return changed
+
 @router.post("/{blog_id}/like", status_code=status.HTTP_204_NO_CONTENT)
 async def like_blog(
     blog_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Like a blog post"""
-    # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    
-    if not db_blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Check if user already liked this blog
-    like_exists = db.query(models.blog_likes).filter(
-        models.blog_likes.c.user_id == current_user.id,
-        models.blog_likes.c.blog_id == blog_id
-    ).first()
-    
-    if like_exists:
+    if not await add_like(db, blog_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You have already liked this blog"
         )
     
-    # Add like
-    stmt = models.blog_likes.insert().values(
-        user_id=current_user.id,
-        blog_id=blog_id
-    )
-    
-    db.execute(stmt)
-    
-    # Increment likes count
-    db_blog.likes_count = db_blog.likes_count + 1
-    
-    db.commit()
+    return None
+
+@router.put("/{blog_id}/like", status_code=status.HTTP_204_NO_CONTENT)
+async def put_blog_like(
+    blog_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """Like a blog post; liking it again is a no-op"""
+    await add_like(db, blog_id, current_user.id)
     
     return None
 
 @router.delete("/{blog_id}/like", status_code=status.HTTP_204_NO_CONTENT)
 async def unlike_blog(
     blog_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    """Unlike a blog post"""
-    # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    
-    if not db_blog:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    
-    # Check if user has liked this blog
-    like_exists = db.query(models.blog_likes).filter(
-        models.blog_likes.c.user_id == current_user.id,
-        models.blog_likes.c.blog_id == blog_id
-    ).first()
-    
-    if not like_exists:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You have not liked this blog"
-        )
-    
-    # Remove like
-    stmt = models.blog_likes.delete().where(
-        models.blog_likes.c.user_id == current_user.id,
-        models.blog_likes.c.blog_id == blog_id
-    )
-    
-    db.execute(stmt)
-    
-    # Decrement likes count
-    db_blog.likes_count = max(0, db_blog.likes_count - 1)
-    
-    db.commit()
+    """Unlike a blog post; unliking one that is not liked is a no-op, like PUT"""
+    await remove_like(db, blog_id, current_user.id)
     
     return None
 
@@ -290,12 +353,12 @@ async def unlike_blog(
 async def add_comment(
     blog_id: int,
     comment: schemas.CommentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Add a comment to a blog post"""
     # Get the blog
-    db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    db_blog = await db.get(models.Blog, blog_id)
     
     if not db_blog:
         raise HTTPException(status_code=404, detail="Blog not found")
@@ -308,24 +371,31 @@ async def add_comment(
     )
     
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await db.commit()
     
-    return db_comment
+    result = await db.execute(
+        select(models.Comment)
+        .options(*COMMENT_OPTIONS)
+        .where(models.Comment.id == db_comment.id)
+    )
+    return result.scalars().first()
 
 @router.delete("/{blog_id}/comments/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_comment(
     blog_id: int,
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Delete a comment from a blog post"""
     # Get the comment
-    db_comment = db.query(models.Comment).filter(
-        models.Comment.id == comment_id,
-        models.Comment.blog_id == blog_id
-    ).first()
+    result = await db.execute(
+        select(models.Comment).options(joinedload(models.Comment.blog)).where(
+            models.Comment.id == comment_id,
+            models.Comment.blog_id == blog_id
+        )
+    )
+    db_comment = result.scalars().first()
     
     if not db_comment:
         raise HTTPException(status_code=404, detail="Comment not found")
@@ -340,7 +410,7 @@ async def delete_comment(
         )
     
     # Delete the comment
-    db.delete(db_comment)
-    db.commit()
+    await db.delete(db_comment)
+    await db.commit()
     
     return None
\ No newline at end of file
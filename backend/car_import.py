@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+from typing import IO, Iterator, List, Optional, Tuple
+
+from asyncpg import PostgresError
+from asyncpg.exceptions import DataError
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from changes import mark_changed
+from pricing import parse_price
+
+# Rows validated, copied and merged per transaction
+IMPORT_CHUNK_SIZE = 5000
+# Row errors kept in the report; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+# Failures of a chunk's statements; COPY goes through asyncpg directly, so its
+# errors are not wrapped in DBAPIError
+LOAD_ERRORS = (DBAPIError, PostgresError, DataError)
+
+# CarCreate fields in staging/cars column order, plus the derived price columns
+IMPORT_COLUMNS = [
+    "brand", "model", "category", "price", "shortDescription", "image", "gallery", "year",
+    "body_type", "engine_type", "drive_unit", "engine_volume", "fuel_consumption", "color",
+    "mileage", "battery_capacity", "range", "transmission", "additional_features", "external_id",
+    "price_amount", "price_currency",
+]
+LIST_FIELDS = {"gallery", "additional_features"}
+# Ranges of the integer and bigint columns, checked before COPY so one
+# out-of-range value is reported on its line instead of failing the chunk
+INTEGER_RANGES = {
+    "year": (-2**31, 2**31 - 1),
+    "mileage": (-2**31, 2**31 - 1),
+    "price_amount": (-2**63, 2**63 - 1),
+}
+
+def quoted_columns(columns) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+# Staging column types for IMPORT_COLUMNS, shared with feed_sync
+STAGING_COLUMNS_SQL = """
+    "brand" varchar, "model" varchar, "category" varchar, "price" varchar,
+    "shortDescription" varchar, "image" varchar, "gallery" varchar[], "year" integer,
+    "body_type" varchar, "engine_type" varchar, "drive_unit" varchar, "engine_volume" varchar,
+    "fuel_consumption" varchar, "color" varchar, "mileage" integer, "battery_capacity" varchar,
+    "range" varchar, "transmission" varchar, "additional_features" varchar[], "external_id" varchar,
+    "price_amount" bigint, "price_currency" varchar(3)
+"""
+
+STAGING_TABLE_SQL = f"""
+CREATE TEMP TABLE car_import_staging (
+    line_no integer NOT NULL,
+    {STAGING_COLUMNS_SQL}
+) ON COMMIT DROP
+"""
+
+# Set-based merge: rows with a known external_id update the existing car, the
+# rest are inserted. Within one chunk the last row for an external_id wins.
+# An imported row is published again even if a feed sync retired it, and its
+# content_hash is cleared so the owning feed's next sync rewrites it.
+MERGE_SQL = f"""
+WITH merged AS (
+    INSERT INTO cars ({quoted_columns(IMPORT_COLUMNS)}, created_at, updated_at)
+    SELECT DISTINCT ON (coalesce(external_id, 'line:' || line_no))
+        {quoted_columns(IMPORT_COLUMNS)}, timezone('utc', now()), timezone('utc', now())
+    FROM car_import_staging
+    ORDER BY coalesce(external_id, 'line:' || line_no), line_no DESC
+    ON CONFLICT (external_id) DO UPDATE SET
+        {", ".join(f'"{column}" = EXCLUDED."{column}"' for column in IMPORT_COLUMNS if column != "external_id")},
+        content_hash = NULL,
+        retired_at = NULL,
+        updated_at = EXCLUDED.updated_at
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+"""
+
+def _csv_value(field: str, value: Optional[str]):
+    if value is None or value.strip() == "":
+        return None
+    if field in LIST_FIELDS:
+        # JSON arrays or "a.jpg|b.jpg"
+        value = value.strip()
+        if value.startswith("["):
+            return json.loads(value)
+        return [item.strip() for item in value.split("|") if item.strip()]
+    return value
+
+def iter_records(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, raw record) one at a time from a CSV or JSON Lines byte stream"""
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            try:
+                yield reader.line_num, {key: _csv_value(key, value) for key, value in record.items() if key}
+            except ValueError as e:
+                yield reader.line_num, e
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt.lower()
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+def validate_record(record) -> Tuple[Optional[tuple], List[str]]:
+    """Convert a raw record into a staging row, or return its validation errors"""
+    if isinstance(record, Exception):
+        return None, [f"malformed row: {record}"]
+    if not isinstance(record, dict):
+        return None, ["row must be an object"]
+    try:
+        car = schemas.CarCreate(**record)
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+    values = car.dict()
+    values["additional_features"] = values["additional_features"] or []
+    values["price_amount"], values["price_currency"] = parse_price(car.price)
+    errors = [
+        f"{column}: value {values[column]} is out of range"
+        for column, (low, high) in INTEGER_RANGES.items()
+        if values[column] is not None and not low <= values[column] <= high
+    ]
+    if errors:
+        return None, errors
+    return tuple(values[column] for column in IMPORT_COLUMNS), []
+
+class ImportReport:
+    def __init__(self):
+        self.total_rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[schemas.CarImportError] = []
+
+    def add_error(self, line: int, messages: List[str], file: Optional[str] = None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.CarImportError(line=line, errors=messages, file=file))
+
+    def result(self) -> schemas.CarImportResult:
+        return schemas.CarImportResult(
+            total_rows=self.total_rows,
+            inserted=self.inserted,
+            updated=self.updated,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+        )
+
+async def copy_rows(db: AsyncSession, table: str, columns: List[str], rows: List[tuple]):
+    """COPY rows into a table on the session's connection, inside its transaction"""
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(table, records=rows, columns=columns)
+
+async def _load_chunk(db: AsyncSession, rows: List[tuple], report: ImportReport):
+    """
+    COPY one chunk into a transaction-scoped staging table and merge it into cars.
+
+    If the database rejects the chunk, it is split in half and each half is
+    retried, down to single rows, so only the offending lines are reported.
+    """
+    try:
+        await db.execute(text(STAGING_TABLE_SQL))
+        await copy_rows(db, "car_import_staging", ["line_no", *IMPORT_COLUMNS], rows)
+        inserted, updated = (await db.execute(text(MERGE_SQL))).one()
+        # COPY and text() bypass the ORM events that invalidate car caches
+        mark_changed(db.sync_session, models.Car)
+        await db.commit()
+    except LOAD_ERRORS as e:
+        await db.rollback()
+        if len(rows) == 1:
+            report.add_error(rows[0][0], [f"database error: {getattr(e, 'orig', e)}"])
+            return
+        middle = len(rows) // 2
+        await _load_chunk(db, rows[:middle], report)
+        await _load_chunk(db, rows[middle:], report)
+        return
+    report.inserted += inserted
+    report.updated += updated
+
+def _read_chunk(records: Iterator[Tuple[int, object]], report: ImportReport, chunk_size: int) -> List[tuple]:
+    """Validate records until chunk_size rows are valid or the input ends; errors go to report"""
+    chunk: List[tuple] = []
+    for line_no, record in records:
+        report.total_rows += 1
+        row, errors = validate_record(record)
+        if errors:
+            report.add_error(line_no, errors)
+            continue
+        chunk.append((line_no, *row))
+        if len(chunk) >= chunk_size:
+            break
+    return chunk
+
+async def import_cars(db: AsyncSession, stream: IO[bytes], fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> schemas.CarImportResult:
+    """
+    Stream-import cars from CSV or JSON Lines.
+
+    Rows are validated against schemas.CarCreate; valid ones are loaded in
+    chunks with COPY and merged on external_id, invalid ones are reported by
+    line number. Memory use depends on the chunk size, not the file size.
+    """
+    report = ImportReport()
+    records = iter_records(stream, fmt)
+    while True:
+        # Parsing and validation are CPU-bound; run them off the event loop
+        chunk = await asyncio.get_running_loop().run_in_executor(None, _read_chunk, records, report, chunk_size)
+        if not chunk:
+            break
+        await _load_chunk(db, chunk, report)
+    return report.result()
+
+async def _main(args):
+    from database import AsyncSessionLocal, async_engine
+    # Imported before anything commits so its change callbacks see the writes
+    from response_cache import response_cache
+
+    with open(args.path, "rb") as stream:
+        async with AsyncSessionLocal() as db:
+            result = await import_cars(db, stream, detect_format(args.path, args.format), args.chunk_size)
+    # API workers sharing the cache see the new rows now instead of after its TTL
+    await response_cache.flush_invalidations()
+    await async_engine.dispose()
+
+    print(f"rows: {result.total_rows}  inserted: {result.inserted}  updated: {result.updated}  failed: {result.failed}")
+    for error in result.errors:
+        print(f"  line {error.line}: {'; '.join(error.errors)}")
+    if result.errors_truncated:
+        print(f"  ... {result.failed - len(result.errors)} more errors not shown")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import cars from a CSV or JSON Lines file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    asyncio.run(_main(parser.parse_args()))
@@ -1,68 +1,149 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 from typing import Dict, Any
 
 import schemas
 import models
 import auth
 from database import get_db
+from fast_json import FastJSONResponse, row_dicts
+from images import variants_for_url
+from loaders import CAR_CARD_COLUMNS
+from pagination import Keyset, keyset_from_params, set_next_cursor
+from search import car_text_search
+from singleflight import group
+import facets
 
 router = APIRouter(
     prefix="/cars",
     tags=["cars"]
 )
 
-@router.get("/", response_model=List[schemas.Car])
+# Concurrent identical reads share one in-flight query
+read_car_flights = group("read_car")
+
+# Sortable catalog fields; "price" sorts by the normalized numeric amount
+CAR_SORT_COLUMNS = {
+    "price": models.Car.price_amount,
+    "year": models.Car.year,
+    "mileage": models.Car.mileage,
+    "created_at": models.Car.created_at,
+}
+
+def car_keyset(sort_by: Optional[str], sort_order: Optional[str], rank=None) -> Keyset:
+    """Relevance ordering is available (and the default) only for free-text queries"""
+    if sort_by is None:
+        sort_by = "relevance" if rank is not None else "created_at"
+    if sort_by == "relevance":
+        if rank is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Sorting by relevance requires a search query"
+            )
+        return Keyset(rank.label("search_rank"), models.Car.id, descending=sort_order == "desc")
+    return keyset_from_params(CAR_SORT_COLUMNS, models.Car.id, sort_by, sort_order)
+
+def car_card_query(q: Optional[str]):
+    """Core select of the CarCard columns; a free-text query adds its relevance as search_rank"""
+    q = str(q).strip() if q else ""
+    if not q:
+        return select(*CAR_CARD_COLUMNS), None
+    match, rank = car_text_search(q)
+    return select(*CAR_CARD_COLUMNS, rank.label("search_rank")).where(match), rank
+
+# JSON keys of a card row; zip() with these drops the trailing search_rank
+CAR_CARD_KEYS = tuple(column.key for column in CAR_CARD_COLUMNS)
+
+async def car_cards_response(db: AsyncSession, query, keyset: Keyset, cursor, skip: int, limit: int) -> FastJSONResponse:
+    """
+    Render a catalog page straight from plain rows.
+
+    Skips ORM instances, response_model validation and jsonable_encoder,
+    which cost more CPU per row than the query itself; the dicts match
+    schemas.CarCard field for field.
+    """
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
+    rows, next_cursor = keyset.page(result.all(), limit)
+    cards = row_dicts(rows, CAR_CARD_KEYS)
+    for card in cards:
+        card["image_variants"] = variants_for_url(card["image"])
+    response = FastJSONResponse(cards)
+    set_next_cursor(response, next_cursor)
+    return response
+
+def car_filter_conditions(filters: schemas.CarFilter) -> list:
+    """WHERE conditions for the structured catalog filters (q is handled separately)"""
+    # Cars retired by a feed sync stay reachable by id but leave the catalog
+    conditions = [models.Car.retired_at.is_(None)]
+    if filters.brand:
+        conditions.append(models.Car.brand.ilike(f"%{filters.brand}%"))
+    if filters.model:
+        conditions.append(models.Car.model.ilike(f"%{filters.model}%"))
+    if filters.category:
+        conditions.append(models.Car.category == filters.category)
+    if filters.year_from:
+        conditions.append(models.Car.year >= filters.year_from)
+    if filters.year_to:
+        conditions.append(models.Car.year <= filters.year_to)
+    if filters.mileage_from:
+        conditions.append(models.Car.mileage >= filters.mileage_from)
+    if filters.mileage_to:
+        conditions.append(models.Car.mileage <= filters.mileage_to)
+    if filters.engine_type:
+        conditions.append(models.Car.engine_type == filters.engine_type)
+    if filters.transmission:
+        conditions.append(models.Car.transmission == filters.transmission)
+    if filters.body_type:
+        conditions.append(models.Car.body_type == filters.body_type)
+    if filters.color:
+        conditions.append(models.Car.color.ilike(f"%{filters.color}%"))
+    if filters.price_from is not None:
+        conditions.append(models.Car.price_amount >= filters.price_from)
+    if filters.price_to is not None:
+        conditions.append(models.Car.price_amount <= filters.price_to)
+    return conditions
+
+@router.get("/", response_model=List[schemas.CarCard])
 async def read_cars(
     skip: int = 0, 
     limit: int = 100,
-    brand: Optional[str] = None,
-    model: Optional[str] = None,
-    category: Optional[str] = None,
-    year_from: Optional[int] = None,
-    year_to: Optional[int] = None,
-    mileage_from: Optional[int] = None,
-    mileage_to: Optional[int] = None,
-    engine_type: Optional[str] = None,
-    transmission: Optional[str] = None,
-    body_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    filters: schemas.CarFilter = Depends(),
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    db: AsyncSession = Depends(get_db)
 ):
-    # Start with base query
-    query = db.query(models.Car)
+    # Start with base query, narrowed by the free-text query if any
+    query, rank = car_card_query(filters.q)
+    keyset = car_keyset(sort_by, sort_order, rank)
     
     # Apply filters if provided
-    if brand:
-        query = query.filter(models.Car.brand.ilike(f"%{brand}%"))
-    if model:
-        query = query.filter(models.Car.model.ilike(f"%{model}%"))
-    if category:
-        query = query.filter(models.Car.category == category)
-    if year_from:
-        query = query.filter(models.Car.year >= year_from)
-    if year_to:
-        query = query.filter(models.Car.year <= year_to)
-    if mileage_from:
-        query = query.filter(models.Car.mileage >= mileage_from)
-    if mileage_to:
-        query = query.filter(models.Car.mileage <= mileage_to)
-    if engine_type:
-        query = query.filter(models.Car.engine_type == engine_type)
-    if transmission:
-        query = query.filter(models.Car.transmission == transmission)
-    if body_type:
-        query = query.filter(models.Car.body_type == body_type)
+    conditions = car_filter_conditions(filters)
+    if conditions:
+        query = query.where(and_(*conditions))
     
-    # Apply pagination
-    cars = query.offset(skip).limit(limit).all()
-    return cars
+    # Apply ordering and pagination (cursor if given, otherwise skip)
+    return await car_cards_response(db, query, keyset, cursor, skip, limit)
+
+@router.get("/facets", response_model=schemas.CarFacets)
+async def read_car_facets(
+    filters: schemas.CarFilter = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    """Per-facet counts of cars matching the same filters as GET /cars/"""
+    conditions = car_filter_conditions(filters)
+    q = filters.q.strip() if filters.q else ""
+    if q:
+        match, _ = car_text_search(q)
+        conditions.append(match)
+    return await facets.get_car_facets(db, filters, conditions)
 
 @router.post("/", response_model=schemas.Car, status_code=status.HTTP_201_CREATED)
 async def create_car(
     car: schemas.CarCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     # Convert schema to model
@@ -71,7 +152,7 @@ async def create_car(
         model=car.model,
         category=car.category,
         price=car.price,
-        short_description=car.shortDescription,
+        shortDescription=car.shortDescription,
         image=car.image,
         gallery=car.gallery,
         year=car.year,
@@ -89,25 +170,28 @@ async def create_car(
     )
     
     db.add(db_car)
-    db.commit()
-    db.refresh(db_car)
+    await db.commit()
+    await db.refresh(db_car)
     return db_car
 
 @router.get("/{car_id}", response_model=schemas.Car)
-async def read_car(car_id: int, db: Session = Depends(get_db)):
-    db_car = db.query(models.Car).filter(models.Car.id == car_id).first()
-    if db_car is None:
-        raise HTTPException(status_code=404, detail="Car not found")
-    return db_car
+async def read_car(car_id: int, db: AsyncSession = Depends(get_db)):
+    async def fetch():
+        db_car = await db.get(models.Car, car_id)
+        if db_car is None:
+            raise HTTPException(status_code=404, detail="Car not found")
+        return schemas.Car.from_orm(db_car)
+    
+    return await read_car_flights.do(car_id, fetch)
 
 @router.put("/{car_id}", response_model=schemas.Car)
 async def update_car(
     car_id: int, 
     car: schemas.CarUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
-    db_car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    db_car = await db.get(models.Car, car_id)
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
     
@@ -115,34 +199,41 @@ async def update_car(
     update_data = car.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_car, key, value)
+    if update_data:
+        # The row no longer matches its last synced feed row, so the next feed
+        # sync must rewrite it rather than skip it as unchanged
+        db_car.content_hash = None
     
-    db.commit()
-    db.refresh(db_car)
+    await db.commit()
+    await db.refresh(db_car)
     return db_car
 
 @router.delete("/{car_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_car(
     car_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
-    db_car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    db_car = await db.get(models.Car, car_id)
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
     
-    db.delete(db_car)
-    db.commit()
+    await db.delete(db_car)
+    await db.commit()
     return None
 
-@router.post("/search", response_model=List[schemas.Car])
+@router.post("/search", response_model=List[schemas.CarCard])
 async def search_cars(
     filter_data: Dict[str, Any],
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = "desc",
+    db: AsyncSession = Depends(get_db)
 ):
-    # Build filters list
-    filters = []
+    # Build filters list; retired feed cars are never listed
+    filters = [models.Car.retired_at.is_(None)]
     
     # Only add filters for fields that have values
     if filter_data.get('brand'):
@@ -172,24 +263,18 @@ async def search_cars(
     if filter_data.get('color'):
         filters.append(models.Car.color.ilike(f"%{filter_data['color']}%"))
     
-    # Handle price filters - these often need special handling with string price format
-    # For price filtering, we need to parse the string format if your database stores them as strings
-    # This is a simplified example - adjust according to your db schema
+    # Price filters compare the normalized numeric amount, not the display string
     if filter_data.get('price_from') and str(filter_data['price_from']).isdigit():
-        # If prices are stored as formatted strings, you might need a different approach
-        # This assumes there's a way to compare numeric values in your price strings
-        price_from = str(filter_data['price_from'])
-        filters.append(models.Car.price.contains(price_from))
-    
+        filters.append(models.Car.price_amount >= int(filter_data['price_from']))
     if filter_data.get('price_to') and str(filter_data['price_to']).isdigit():
-        price_to = str(filter_data['price_to'])
-        filters.append(models.Car.price.contains(price_to))
+        filters.append(models.Car.price_amount <= int(filter_data['price_to']))
     
     # Apply all filters with AND logic
-    query = db.query(models.Car)
+    query, rank = car_card_query(filter_data.get('q'))
     if filters:
-        query = query.filter(and_(*filters))
+        query = query.where(and_(*filters))
+    
+    keyset = car_keyset(sort_by, sort_order, rank)
     
-    # Apply pagination
-    cars = query.offset(skip).limit(limit).all()
-    return cars
\ No newline at end of file
+    # Apply ordering and pagination (cursor if given, otherwise skip)
+    return await car_cards_response(db, query, keyset, cursor, skip, limit)
\ No newline at end of file
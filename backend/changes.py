@@ -0,0 +1,46 @@
+from collections import defaultdict
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Callbacks fired after a commit that wrote rows of a given model class.
+# Caches register here instead of every write endpoint clearing them by hand.
+_callbacks = defaultdict(list)
+
+def on_change(model, callback: Callable[[], None]):
+    """Call callback() after every commit that inserted, updated or deleted model rows"""
+    _callbacks[model].append(callback)
+
+def _changed_models(session) -> set:
+    return session.info.setdefault("changed_models", set())
+
+def mark_changed(session, model):
+    """Record a write the ORM cannot see (COPY, text() statements) for the next commit"""
+    _changed_models(session).add(model)
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    # new/dirty/deleted still describe the flushed objects at this point
+    changed = _changed_models(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        changed.add(type(obj))
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statement(orm_execute_state):
+    # ORM-enabled insert()/update()/delete() statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _changed_models(orm_execute_state.session).add(mapper.class_)
+
+@event.listens_for(Session, "after_commit")
+def _notify(session):
+    changed = session.info.pop("changed_models", None)
+    for model in changed or ():
+        for callback in _callbacks.get(model, ()):
+            callback()
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("changed_models", None)
@@ -0,0 +1,193 @@
+import os
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from static_files import is_compressible, rank_codings
+
+# brotli and zstandard are optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Below about 1 KB the saved bytes do not pay for the headers and the CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Levels per content coding; each scale is different (gzip 1-9, br 0-11, zstd 1-22)
+COMPRESSION_PROFILES = {
+    "fast": {"zstd": 1, "br": 1, "gzip": 1},
+    "default": {"zstd": 3, "br": 4, "gzip": 6},
+    # zstd above 9 spends tens of milliseconds per response just setting up its tables
+    "max": {"zstd": 9, "br": 9, "gzip": 9},
+}
+DEFAULT_PROFILE = os.getenv("COMPRESSION_PROFILE", "default")
+
+# Profile per path prefix, longest prefix first wins; None disables compression
+ROUTE_COMPRESSION = {
+    # Multi-megabyte streams: bytes per CPU second matters more than the ratio
+    "/admin/export": "fast",
+    # Images are already compressed; text uploads are served from .br/.gz sidecars
+    "/uploads": None,
+}
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+# Available encoders in server preference order: zstd and brotli beat gzip on
+# both ratio and speed at these levels
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdEncoder
+if brotli is not None:
+    ENCODERS["br"] = _BrotliEncoder
+ENCODERS["gzip"] = _GzipEncoder
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred available coding the client accepts, by q-value then server order"""
+    ranked = rank_codings(accept_encoding, ENCODERS)
+    return ranked[0] if ranked else None
+
+def route_profile(path: str, routes: Dict[str, Optional[str]] = ROUTE_COMPRESSION) -> Optional[str]:
+    for prefix in sorted(routes, key=len, reverse=True):
+        if path.startswith(prefix):
+            return routes[prefix]
+    return DEFAULT_PROFILE
+
+def should_compress(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 206, 304) or "content-encoding" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", ""):
+        return False
+    return is_compressible(headers.get("content-type", ""))
+
+class CompressionMiddleware:
+    """
+    Negotiated zstd/br/gzip compression of text responses.
+
+    A response sent in one piece is compressed only if it reaches
+    minimum_size; a streamed one is compressed chunk by chunk and flushed
+    after each, so it keeps streaming with bounded memory.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE, routes=ROUTE_COMPRESSION):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        profile = route_profile(scope["path"], self.routes)
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        # Without a usable coding the response still needs Vary: Accept-Encoding
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        level = COMPRESSION_PROFILES[profile][encoding] if encoding else None
+        await self.app(scope, receive, _CompressingSend(send, encoding, level, self.minimum_size))
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: Optional[str], level: Optional[int], minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.passthrough:
+            await self.send(message)
+        elif self.encoder is not None:
+            data = self.encoder.compress(body) + (self.encoder.flush() if more_body else self.encoder.finish())
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+        else:
+            await self._first_body(body, more_body)
+
+    async def _flush_start(self):
+        if self.start is not None:
+            self.passthrough = True
+            await self.send(self.start)
+            self.start = None
+
+    async def _first_body(self, body: bytes, more_body: bool):
+        headers = MutableHeaders(raw=self.start["headers"])
+        compressible = should_compress(self.start["status"], headers) and (more_body or len(body) >= self.minimum_size)
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if not compressible or self.encoding is None:
+            await self._flush_start()
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        self.encoder = ENCODERS[self.encoding](self.level)
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The compressed bytes differ from the ones the strong ETag names
+            headers["ETag"] = "W/" + etag
+        if more_body:
+            del headers["Content-Length"]
+            data = self.encoder.compress(body) + self.encoder.flush()
+        else:
+            data = self.encoder.compress(body) + self.encoder.finish()
+            headers["Content-Length"] = str(len(data))
+        await self.send(self.start)
+        self.start = None
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List
+
+from sqlalchemy import ARRAY, BigInteger, Boolean, DateTime, Float, Integer, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+# Parquet is optional; without pyarrow only NDJSON and CSV are offered
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_TABLES = {
+    "cars": models.Car,
+    "listings": models.Listing,
+    "reviews": models.Review,
+}
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pyarrow is not None]
+
+def export_columns(model) -> list:
+    # The generated search document is an internal index column
+    return [column for column in model.__table__.columns if column.name != "search_vector"]
+
+def export_query(model, conditions=()):
+    """Plain column rows ordered by id; no ORM objects are built"""
+    query = select(*export_columns(model)).order_by(model.id)
+    if conditions:
+        query = query.where(*conditions)
+    return query
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class NdjsonEncoder:
+    def __init__(self, columns):
+        self.names = [column.name for column in columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.names, row)), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+class CsvEncoder:
+    """Lists are written as JSON arrays, the form the bulk import reads back"""
+
+    def __init__(self, columns):
+        self.names = [column.name for column in columns]
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def _drain(self) -> bytes:
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self.writer.writerow(self.names)
+        return self._drain()
+
+    def encode(self, rows) -> bytes:
+        for row in rows:
+            self.writer.writerow([
+                json.dumps(value, ensure_ascii=False) if isinstance(value, list)
+                else value.isoformat() if isinstance(value, datetime)
+                else value
+                for value in row
+            ])
+        return self._drain()
+
+    def footer(self) -> bytes:
+        return b""
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only file that hands out what the Parquet writer produced so far"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _arrow_type(column):
+    column_type = column.type
+    if isinstance(column_type, ARRAY):
+        return pyarrow.list_(pyarrow.string())
+    if isinstance(column_type, (Integer, BigInteger)):
+        return pyarrow.int64()
+    if isinstance(column_type, Float):
+        return pyarrow.float64()
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+class ParquetEncoder:
+    """One row group per fetched batch; only the current batch is held in memory"""
+
+    def __init__(self, columns):
+        self.schema = pyarrow.schema([(column.name, _arrow_type(column)) for column in columns])
+        self.sink = _ParquetSink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def header(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        return self.sink.drain()
+
+    def footer(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+ENCODERS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder, "parquet": ParquetEncoder}
+
+async def stream_export(
+    db: AsyncSession,
+    model,
+    fmt: str,
+    conditions=(),
+    gzip: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Yield an export of model rows in fmt, optionally gzip-compressed.
+
+    Rows come from a server-side cursor in batches of batch_size and are
+    encoded as they arrive, so memory use does not grow with the table.
+    """
+    columns = export_columns(model)
+    encoder = ENCODERS[fmt](columns)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    def output(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    yield output(encoder.header())
+    result = await db.stream(export_query(model, conditions).execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        data = output(encoder.encode(rows))
+        if data:
+            yield data
+    tail = output(encoder.footer())
+    if compressor:
+        tail += compressor.flush()
+    yield tail
+
+def export_filename(table: str, fmt: str, gzip: bool) -> str:
+    return f"{table}.{EXPORT_FORMATS[fmt][1]}" + (".gz" if gzip else "")
+
+async def _main(args):
+    from database import AsyncSessionLocal, async_engine
+
+    model = EXPORT_TABLES[args.table]
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async with AsyncSessionLocal() as db:
+            async for chunk in stream_export(db, model, args.format, gzip=args.gzip, batch_size=args.batch_size):
+                output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a catalog table")
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=available_formats(), default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", help="defaults to stdout")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,90 @@
+import json
+from typing import List
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from cache import TTLCache
+from changes import on_change
+
+# Width of the year facet buckets (2015-2019, 2020-2024, ...)
+YEAR_BUCKET_SIZE = 5
+
+# Columns counted by the facet query, in GROUPING SETS order
+FACET_COLUMNS = ("brand", "body_type", "engine_type", "transmission", "category")
+
+# Filters compared case-insensitively (ILIKE / full-text) share a cache entry across letter case
+CASE_INSENSITIVE_FILTERS = {"q", "brand", "model", "color"}
+
+facet_cache = TTLCache(maxsize=512, ttl=300)
+
+# Any committed write to cars can change counts, so the whole cache is dropped
+on_change(models.Car, facet_cache.clear)
+
+def facet_cache_key(filters: schemas.CarFilter) -> str:
+    """Normalized filter set: empty values dropped, keys sorted, ILIKE filters lowercased"""
+    normalized = {}
+    for key, value in filters.dict().items():
+        if key == "q" and value:
+            value = value.strip()
+        if isinstance(value, str) and key in CASE_INSENSITIVE_FILTERS:
+            value = value.lower()
+        if value is None or value == "":
+            continue
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+async def compute_car_facets(db: AsyncSession, conditions: List) -> dict:
+    """Count every facet with a single GROUPING SETS query instead of one query per facet"""
+    columns = [getattr(models.Car, name) for name in FACET_COLUMNS]
+    year_bucket = (models.Car.year // YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE).label("year_bucket")
+    grouped = [*columns, year_bucket]
+
+    query = select(
+        *grouped,
+        *[func.grouping(column).label(f"g_{index}") for index, column in enumerate(grouped)],
+        func.count().label("count")
+    ).group_by(func.grouping_sets(*grouped))
+    if conditions:
+        query = query.where(and_(*conditions))
+
+    result = await db.execute(query)
+
+    facets = {name: [] for name in FACET_COLUMNS}
+    facets["year"] = []
+    total = 0
+    for row in result:
+        # grouping(col) = 0 marks the column this row was grouped by
+        index = next(i for i in range(len(grouped)) if row[len(grouped) + i] == 0)
+        value = row[index]
+        if index == 0:
+            # Every matching car falls into exactly one brand group (NULL included)
+            total += row.count
+        if value is None:
+            continue
+        if index < len(FACET_COLUMNS):
+            facets[FACET_COLUMNS[index]].append({"value": value, "count": row.count})
+        else:
+            facets["year"].append({
+                "year_from": value,
+                "year_to": value + YEAR_BUCKET_SIZE - 1,
+                "count": row.count
+            })
+
+    for name in FACET_COLUMNS:
+        facets[name].sort(key=lambda item: (-item["count"], item["value"]))
+    facets["year"].sort(key=lambda item: item["year_from"], reverse=True)
+    facets["total"] = total
+    return facets
+
+async def get_car_facets(db: AsyncSession, filters: schemas.CarFilter, conditions: List) -> dict:
+    key = facet_cache_key(filters)
+    cached = facet_cache.get(key)
+    if cached is not None:
+        return cached
+
+    facets = await compute_car_facets(db, conditions)
+    facet_cache.set(key, facets)
+    return facets
@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+from typing import Any, List
+
+from fastapi.responses import JSONResponse
+
+# orjson is optional; without it the fast path falls back to the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode()
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content that is already plain dicts and lists.
+
+    Returned directly from a route, it bypasses response_model validation and
+    jsonable_encoder, so the route must produce exactly the documented shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def row_dicts(rows, keys) -> List[dict]:
+    """Core result rows as dicts keyed by column name, without building ORM objects"""
+    keys = tuple(keys)
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from car_import import (
+    IMPORT_CHUNK_SIZE, IMPORT_COLUMNS, STAGING_COLUMNS_SQL, ImportReport,
+    copy_rows, detect_format, iter_records, quoted_columns, validate_record,
+)
+from changes import mark_changed
+
+# Marks a delta row as removed from the feed ("true"/"1" in CSV)
+DELETED_FIELD = "_deleted"
+FEED_EXTENSIONS = (".csv", ".jsonl", ".ndjson")
+
+# Staged row actions: upsert, delete (delta feeds) and keep (invalid row whose
+# car must not be retired just because this version of it failed validation)
+UPSERT, DELETE, KEEP = "u", "d", "k"
+
+STAGING_COLUMNS = ["seq", "action", "content_hash", *IMPORT_COLUMNS]
+
+STAGING_TABLE_SQL = f"""
+CREATE TEMP TABLE feed_sync_staging (
+    seq integer NOT NULL,
+    action char(1) NOT NULL,
+    content_hash varchar(32),
+    {STAGING_COLUMNS_SQL}
+) ON COMMIT DROP
+"""
+
+# Last staged row per external_id. Indexed and analyzed because the retire
+# step probes it once per feed car, and the cars statistics are usually stale
+# right after the merge.
+LATEST_TABLE_SQL = [
+    """
+    CREATE TEMP TABLE feed_sync_latest ON COMMIT DROP AS
+    SELECT DISTINCT ON (external_id) * FROM feed_sync_staging ORDER BY external_id, seq DESC
+    """,
+    "CREATE UNIQUE INDEX ON feed_sync_latest (external_id)",
+    "ANALYZE feed_sync_latest",
+]
+
+# Only rows that are new, changed, retired or owned by another feed reach the
+# INSERT, so an unchanged row costs a hash comparison instead of a write
+MERGE_SQL = f"""
+WITH merged AS (
+    INSERT INTO cars ({quoted_columns(IMPORT_COLUMNS)}, content_hash, feed_source, retired_at, created_at, updated_at)
+    SELECT {", ".join(f's."{column}"' for column in IMPORT_COLUMNS)}, s.content_hash, CAST(:feed AS varchar), NULL,
+        timezone('utc', now()), timezone('utc', now())
+    FROM feed_sync_latest s
+    LEFT JOIN cars c ON c.external_id = s.external_id
+    WHERE s.action = '{UPSERT}' AND (
+        c.id IS NULL
+        OR c.content_hash IS DISTINCT FROM s.content_hash
+        OR c.retired_at IS NOT NULL
+        OR c.feed_source IS DISTINCT FROM CAST(:feed AS varchar)
+    )
+    ON CONFLICT (external_id) DO UPDATE SET
+        {", ".join(f'"{column}" = EXCLUDED."{column}"' for column in IMPORT_COLUMNS if column != "external_id")},
+        content_hash = EXCLUDED.content_hash,
+        feed_source = EXCLUDED.feed_source,
+        retired_at = NULL,
+        updated_at = EXCLUDED.updated_at
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+"""
+
+UPSERT_COUNT_SQL = f"SELECT count(*) FROM feed_sync_latest WHERE action = '{UPSERT}'"
+
+# Full snapshot: every active car of the feed missing from it (or deleted in it) is retired
+RETIRE_MISSING_SQL = f"""
+UPDATE cars SET retired_at = timezone('utc', now()), updated_at = timezone('utc', now())
+WHERE feed_source = :feed AND retired_at IS NULL AND NOT EXISTS (
+    SELECT 1 FROM feed_sync_latest s WHERE s.external_id = cars.external_id AND s.action <> '{DELETE}'
+)
+"""
+
+# Delta snapshot: only rows explicitly marked as deleted are retired
+RETIRE_DELETED_SQL = f"""
+UPDATE cars SET retired_at = timezone('utc', now()), updated_at = timezone('utc', now())
+FROM feed_sync_latest s
+WHERE s.external_id = cars.external_id AND s.action = '{DELETE}'
+    AND cars.feed_source = :feed AND cars.retired_at IS NULL
+"""
+
+def content_hash(row: tuple) -> str:
+    """Stable hash of a validated staging row"""
+    data = json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+def _is_deleted(record: dict) -> bool:
+    value = record.get(DELETED_FIELD)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+def stage_record(record) -> Tuple[Optional[tuple], List[str]]:
+    """Staging row (action, hash, columns...) for a raw feed record, and its errors"""
+    external_id = record.get("external_id") if isinstance(record, dict) else None
+    if isinstance(record, dict) and _is_deleted(record):
+        if not external_id:
+            return None, ["external_id: required for deleted rows"]
+        return (DELETE, None, *(str(external_id) if column == "external_id" else None for column in IMPORT_COLUMNS)), []
+
+    if isinstance(record, dict):
+        record = {key: value for key, value in record.items() if key != DELETED_FIELD}
+    row, errors = validate_record(record)
+    if not errors and not external_id:
+        errors = ["external_id: required for feed rows"]
+    if errors:
+        if external_id:
+            return (KEEP, None, *(str(external_id) if column == "external_id" else None for column in IMPORT_COLUMNS)), errors
+        return None, errors
+    return (UPSERT, content_hash(row), *row), []
+
+class FeedSyncReport(ImportReport):
+    def __init__(self):
+        super().__init__()
+        self.unchanged = 0
+        self.retired = 0
+
+    def result(self) -> schemas.FeedSyncResult:
+        return schemas.FeedSyncResult(
+            **super().result().dict(),
+            unchanged=self.unchanged,
+            retired=self.retired,
+        )
+
+def _feed_records(files: Iterable[Tuple[str, IO[bytes], str]]) -> Iterator[Tuple[str, int, object]]:
+    for name, stream, fmt in files:
+        for line_no, record in iter_records(stream, fmt):
+            yield name, line_no, record
+
+def _stage_chunk(records: Iterator[Tuple[str, int, object]], report: FeedSyncReport, seq: int, chunk_size: int) -> List[tuple]:
+    """Stage records until chunk_size rows are usable or the feed ends; errors go to report"""
+    chunk: List[tuple] = []
+    for name, line_no, record in records:
+        report.total_rows += 1
+        row, errors = stage_record(record)
+        if errors:
+            report.add_error(line_no, errors, file=name)
+        if row is None:
+            continue
+        chunk.append((seq + len(chunk) + 1, *row))
+        if len(chunk) >= chunk_size:
+            break
+    return chunk
+
+async def sync_feed(
+    db: AsyncSession,
+    files: Iterable[Tuple[str, IO[bytes], str]],
+    feed: str,
+    full: bool = True,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> schemas.FeedSyncResult:
+    """
+    Apply a feed snapshot to cars in one transaction.
+
+    files yields (name, byte stream, format) for the snapshot's parts. Rows
+    are keyed on external_id and carry a content hash; rows whose hash
+    matches the stored one are skipped, so a re-sync writes only what
+    changed. A full snapshot retires the feed's cars that are missing from
+    it; a delta snapshot retires rows flagged with DELETED_FIELD. Retired
+    cars come back when they reappear in the feed.
+    """
+    report = FeedSyncReport()
+    seq = 0
+    await db.execute(text(STAGING_TABLE_SQL))
+    records = _feed_records(files)
+    while True:
+        # Parsing, validation and hashing are CPU-bound; run them off the event loop
+        chunk = await asyncio.get_running_loop().run_in_executor(None, _stage_chunk, records, report, seq, chunk_size)
+        if not chunk:
+            break
+        seq += len(chunk)
+        await copy_rows(db, "feed_sync_staging", STAGING_COLUMNS, chunk)
+    if full and seq == 0:
+        # An empty or unreadable snapshot must not retire the whole feed
+        await db.rollback()
+        raise ValueError(f"Feed '{feed}' snapshot has no usable rows")
+
+    for statement in LATEST_TABLE_SQL:
+        await db.execute(text(statement))
+    upserts = (await db.execute(text(UPSERT_COUNT_SQL))).scalar_one()
+    report.inserted, report.updated = (await db.execute(text(MERGE_SQL), {"feed": feed})).one()
+    report.unchanged = upserts - report.inserted - report.updated
+    retire_sql = RETIRE_MISSING_SQL if full else RETIRE_DELETED_SQL
+    report.retired = (await db.execute(text(retire_sql), {"feed": feed})).rowcount
+
+    if report.inserted or report.updated or report.retired:
+        mark_changed(db.sync_session, models.Car)
+    await db.commit()
+    return report.result()
+
+def feed_files(path: str, fmt: Optional[str] = None) -> Iterable[Tuple[str, IO[bytes], str]]:
+    """A feed file, or every feed file of a directory in name order, opened lazily"""
+    root = Path(path)
+    paths = sorted(p for p in root.iterdir() if p.suffix.lower() in FEED_EXTENSIONS) if root.is_dir() else [root]
+    for file_path in paths:
+        with open(file_path, "rb") as stream:
+            yield file_path.name, stream, detect_format(file_path.name, fmt)
+
+async def _main(args):
+    from database import AsyncSessionLocal, async_engine
+    # Imported before anything commits so its change callbacks see the writes
+    from response_cache import response_cache
+
+    async with AsyncSessionLocal() as db:
+        result = await sync_feed(db, feed_files(args.path, args.format), args.feed, not args.delta, args.chunk_size)
+    # API workers sharing the cache see the new rows now instead of after its TTL
+    await response_cache.flush_invalidations()
+    await async_engine.dispose()
+
+    print(
+        f"rows: {result.total_rows}  inserted: {result.inserted}  updated: {result.updated}  "
+        f"unchanged: {result.unchanged}  retired: {result.retired}  failed: {result.failed}"
+    )
+    for error in result.errors:
+        print(f"  {error.file or ''} line {error.line}: {'; '.join(error.errors)}")
+    if result.errors_truncated:
+        print(f"  ... {result.failed - len(result.errors)} more errors not shown")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync cars from an external feed file or directory")
+    parser.add_argument("path", help="feed file, or a directory of .csv/.jsonl parts")
+    parser.add_argument("--feed", required=True, help="feed name; only this feed's cars are retired")
+    parser.add_argument("--delta", action="store_true", help="apply changes only; retire rows marked _deleted")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to each file's extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+
+import schemas
+import auth
+import images
+
+router = APIRouter(
+    prefix="/images",
+    tags=["images"]
+)
+
+def request_origin(request: Request) -> str:
+    return str(request.base_url).rstrip("/")
+
+@router.post("/", response_model=schemas.ImageUpload, status_code=status.HTTP_201_CREATED)
+async def upload_image(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """Store an image for car, listing or blog fields; variants are generated in the background"""
+    try:
+        return await images.store_upload(file.file, request_origin(request))
+    except images.InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/{image_id}", response_model=schemas.ImageUpload)
+async def get_image(image_id: str, request: Request):
+    """Processing status and variant URLs of an uploaded image"""
+    if not images.is_digest(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    info = images.image_info(image_id, request_origin(request))
+    if info is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if info["status"] == "processing":
+        # Restarts generation that was lost with a previous worker process
+        images.schedule_variants(image_id)
+    return info
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, IO, Optional
+
+from PIL import Image, ImageOps, features
+
+from cache import TTLCache
+
+# Root of the /uploads static mount
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+IMAGE_DIR = os.path.join(UPLOAD_DIR, "images")
+UPLOAD_URL_PREFIX = "/uploads/images"
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))
+# Refuse decompression bombs before any pixel data is decoded
+MAX_IMAGE_PIXELS = 50_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Original formats accepted, with the extension the original is stored under
+IMAGE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+# Variant name -> maximum width; images are never upscaled
+VARIANT_WIDTHS = {"thumb": 320, "card": 640, "large": 1280}
+# AVIF only when Pillow was built with libavif
+VARIANT_FORMATS = ("webp", "avif") if features.check("avif") else ("webp",)
+# Every format schemas.ImageVariant has a field for; missing ones are null
+SCHEMA_VARIANT_FORMATS = ("webp", "avif")
+SAVE_OPTIONS = {
+    "webp": {"quality": 80, "method": 4},
+    "avif": {"quality": 55, "speed": 6},
+}
+
+# Written last by generate_variants; its presence means every variant exists
+READY_MARKER = "variants.json"
+
+# Variant generation is CPU-bound; processes keep it off the event loop and the GIL
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(2, os.cpu_count() or 1))))
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Uploaded image URLs, absolute or not: [origin]/uploads/images/ab/<sha256>/original.<ext>
+UPLOADED_URL = re.compile(
+    r"^(?P<origin>https?://[^/]+)?/uploads/images/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})/original\.[a-z]+$"
+)
+
+# Digest -> whether its variants exist. Variants are never removed, so a
+# positive answer is kept long; a negative one is rechecked after
+# NOT_READY_TTL seconds, so list rendering stats each pending or failed
+# image at most that often instead of once per serialization
+_ready = TTLCache(maxsize=50_000, ttl=24 * 3600)
+NOT_READY_TTL = 30.0
+# Digests with variant generation in progress in this process
+_pending: Dict[str, asyncio.Future] = {}
+
+class InvalidImage(ValueError):
+    pass
+
+def is_digest(value: str) -> bool:
+    return re.fullmatch(r"[0-9a-f]{64}", value) is not None
+
+def image_dir(digest: str) -> str:
+    return os.path.join(IMAGE_DIR, digest[:2], digest)
+
+def image_url(digest: str, name: str, origin: str = "") -> str:
+    return f"{origin}{UPLOAD_URL_PREFIX}/{digest[:2]}/{digest}/{name}"
+
+def _original_name(directory: str) -> Optional[str]:
+    try:
+        return next((name for name in os.listdir(directory) if name.startswith("original.")), None)
+    except FileNotFoundError:
+        return None
+
+def generate_variants(directory: str, original: str) -> dict:
+    """Write every size/format variant of an original; runs in a worker process"""
+    with Image.open(os.path.join(directory, original)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "transparency" in source.info or source.mode in ("LA", "PA") else "RGB")
+        width, height = source.size
+        for name, max_width in VARIANT_WIDTHS.items():
+            variant = source.copy()
+            variant.thumbnail((max_width, max_width * height // width or 1), Image.LANCZOS)
+            for fmt in VARIANT_FORMATS:
+                path = os.path.join(directory, f"{name}.{fmt}")
+                # Write then rename so a half-written variant is never served
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=f".{fmt}.tmp")
+                with os.fdopen(fd, "wb") as out:
+                    variant.save(out, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+    meta = {"width": width, "height": height, "formats": list(VARIANT_FORMATS), "widths": VARIANT_WIDTHS}
+    with open(os.path.join(directory, READY_MARKER), "w") as out:
+        json.dump(meta, out)
+    return meta
+
+def _executor_instance() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+def variants_ready(digest: str) -> bool:
+    ready = _ready.get(digest)
+    if ready is None:
+        ready = os.path.exists(os.path.join(image_dir(digest), READY_MARKER))
+        _ready.set(digest, ready, ttl=None if ready else NOT_READY_TTL)
+    return ready
+
+def schedule_variants(digest: str) -> Optional[asyncio.Future]:
+    """Start variant generation in the process pool unless done or already running"""
+    if digest in _pending or variants_ready(digest):
+        return _pending.get(digest)
+    directory = image_dir(digest)
+    original = _original_name(directory)
+    if original is None:
+        return None
+    future = asyncio.get_running_loop().run_in_executor(_executor_instance(), generate_variants, directory, original)
+    _pending[digest] = future
+
+    def done(f: asyncio.Future):
+        del _pending[digest]
+        if f.cancelled():
+            return
+        if f.exception() is not None:
+            print(f"Image variant generation failed for {digest}: {f.exception()}")
+        else:
+            # Replaces a cached "not ready" so the variants show up at once
+            _ready.set(digest, True)
+
+    future.add_done_callback(done)
+    return future
+
+def _inspect(path: str) -> str:
+    """Image format of an upload, or InvalidImage"""
+    try:
+        with Image.open(path) as image:
+            image.verify()
+            fmt = image.format
+    except Image.DecompressionBombError:
+        raise InvalidImage(f"Image has more than {MAX_IMAGE_PIXELS} pixels")
+    except (OSError, SyntaxError):
+        raise InvalidImage("Not a valid image file")
+    if fmt not in IMAGE_FORMATS:
+        raise InvalidImage(f"Unsupported image format {fmt}; use {', '.join(IMAGE_FORMATS)}")
+    return fmt
+
+def _save_upload(stream: IO[bytes]):
+    """Copy and hash an upload into place; returns (digest, original name, created)"""
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=IMAGE_DIR, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(1024 * 1024):
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise InvalidImage(f"Image is larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+        hex_digest = digest.hexdigest()
+        directory = image_dir(hex_digest)
+        original = _original_name(directory)
+        created = original is None
+        if created:
+            original = f"original.{IMAGE_FORMATS[_inspect(tmp_path)]}"
+            os.makedirs(directory, exist_ok=True)
+            # mkstemp creates owner-only files; originals are served publicly
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(directory, original))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return hex_digest, original, created
+
+async def store_upload(stream: IO[bytes], origin: str = "") -> dict:
+    """
+    Store an uploaded image under its SHA-256 and queue its variants.
+
+    Identical files share one directory, so re-uploading an image costs
+    only the hashing. Copying, hashing and verifying run in a thread, off
+    the event loop; the request does not wait for the variants.
+    """
+    hex_digest, original, created = await asyncio.get_running_loop().run_in_executor(None, _save_upload, stream)
+    schedule_variants(hex_digest)
+    return image_info(hex_digest, origin, original, created=created)
+
+def image_info(digest: str, origin: str = "", original: Optional[str] = None, created: bool = False) -> Optional[dict]:
+    """Upload status; origin makes the URLs absolute (the frontend runs on another host)"""
+    original = original or _original_name(image_dir(digest))
+    if original is None:
+        return None
+    ready = variants_ready(digest)
+    return {
+        "id": digest,
+        "url": image_url(digest, original, origin),
+        "created": created,
+        "status": "ready" if ready else "processing",
+        "variants": variant_urls(digest, origin) if ready else None,
+    }
+
+def variant_urls(digest: str, origin: str = "") -> dict:
+    return {
+        name: {
+            "width": width,
+            **{
+                fmt: image_url(digest, f"{name}.{fmt}", origin) if fmt in VARIANT_FORMATS else None
+                for fmt in SCHEMA_VARIANT_FORMATS
+            },
+        }
+        for name, width in VARIANT_WIDTHS.items()
+    }
+
+def variants_for_url(url: Optional[str]) -> Optional[dict]:
+    """Responsive variants of an image URL that points at a processed upload"""
+    match = UPLOADED_URL.match(url) if url else None
+    if match is None or not variants_ready(match.group("digest")):
+        return None
+    return variant_urls(match.group("digest"), match.group("origin") or "")
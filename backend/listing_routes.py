@@ -1,22 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, desc, select
 
 import schemas
 import models
 import auth
 from database import get_db
+from loaders import LISTING_OPTIONS, LISTING_SUMMARY_OPTIONS
+from moderation import CLAIMED_ERROR, listing_external_id, moderate_listings
+from pagination import keyset_from_params, set_next_cursor
 
 router = APIRouter(
     prefix="/listings",
     tags=["listings"]
 )
 
+# Sortable listing fields; "price" sorts by the normalized numeric amount
+LISTING_SORT_COLUMNS = {
+    "created_at": models.Listing.created_at,
+    "updated_at": models.Listing.updated_at,
+    "price": models.Listing.price_amount,
+    "year": models.Listing.year,
+    "mileage": models.Listing.mileage,
+}
+
+async def get_listing_or_none(db: AsyncSession, listing_id: int):
+    """Load a listing with every relationship needed for the response"""
+    result = await db.execute(
+        select(models.Listing)
+        .options(*LISTING_OPTIONS)
+        .where(models.Listing.id == listing_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 @router.post("/", response_model=schemas.Listing)
 async def create_listing(
     listing: schemas.ListingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Create a new listing with pending status
@@ -41,95 +63,95 @@ async def create_listing(
     )
     
     db.add(db_listing)
-    db.commit()
-    db.refresh(db_listing)
+    await db.commit()
     
-    return db_listing
+    return await get_listing_or_none(db, db_listing.id)
 
-@router.get("/", response_model=List[schemas.Listing])
+@router.get("/", response_model=List[schemas.ListingSummary])
 async def get_all_listings(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     category: Optional[str] = None,
     sort_by: Optional[str] = "created_at",
     sort_order: Optional[str] = "desc",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
     # Query base
-    query = db.query(models.Listing)
+    query = select(models.Listing).options(*LISTING_SUMMARY_OPTIONS)
     
     # Apply status filter if provided
     if status:
-        query = query.filter(models.Listing.status == status)
+        query = query.where(models.Listing.status == status)
     
     # Apply category filter if provided
     if category:
-        query = query.filter(models.Listing.category == category)
+        query = query.where(models.Listing.category == category)
     
-    # Apply sorting
-    if sort_order == "desc":
-        query = query.order_by(desc(getattr(models.Listing, sort_by)))
-    else:
-        query = query.order_by(getattr(models.Listing, sort_by))
+    # Apply sorting and pagination (cursor if given, otherwise skip)
+    keyset = keyset_from_params(LISTING_SORT_COLUMNS, models.Listing.id, sort_by, sort_order)
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
-    # Apply pagination
-    listings = query.offset(skip).limit(limit).all()
+    listings, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return listings
 
-@router.get("/user", response_model=List[schemas.Listing])
+@router.get("/user", response_model=List[schemas.ListingSummary])
 async def get_user_listings(
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Get user's listings
-    query = db.query(models.Listing).filter(models.Listing.creator_id == current_user.id)
+    query = select(models.Listing).options(*LISTING_SUMMARY_OPTIONS).where(models.Listing.creator_id == current_user.id)
     
     # Apply status filter if provided
     if status:
-        query = query.filter(models.Listing.status == status)
+        query = query.where(models.Listing.status == status)
     
     # Order by newest first
     query = query.order_by(desc(models.Listing.created_at))
     
-    return query.all()
+    result = await db.execute(query)
+    return result.scalars().all()
 
-@router.get("/approved", response_model=List[schemas.Listing])
+@router.get("/approved", response_model=List[schemas.ListingSummary])
 async def get_approved_listings(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     sort_by: Optional[str] = "created_at",
     sort_order: Optional[str] = "desc",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Query base - only approved listings
-    query = db.query(models.Listing).filter(models.Listing.status == "approved")
+    query = select(models.Listing).options(*LISTING_SUMMARY_OPTIONS).where(models.Listing.status == "approved")
     
     # Apply category filter if provided
     if category:
-        query = query.filter(models.Listing.category == category)
+        query = query.where(models.Listing.category == category)
     
-    # Apply sorting
-    if sort_order == "desc":
-        query = query.order_by(desc(getattr(models.Listing, sort_by)))
-    else:
-        query = query.order_by(getattr(models.Listing, sort_by))
+    # Apply sorting and pagination (cursor if given, otherwise skip)
+    keyset = keyset_from_params(LISTING_SORT_COLUMNS, models.Listing.id, sort_by, sort_order)
+    result = await db.execute(keyset.apply(query, cursor=cursor, skip=skip, limit=limit))
     
-    # Apply pagination
-    listings = query.offset(skip).limit(limit).all()
+    listings, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return listings
 
 @router.get("/{listing_id}", response_model=schemas.Listing)
 async def get_listing(
     listing_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[schemas.User] = Depends(auth.get_current_user_optional)
 ):
     # Get the listing
-    listing = db.query(models.Listing).filter(models.Listing.id == listing_id).first()
+    listing = await get_listing_or_none(db, listing_id)
     
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
@@ -148,11 +170,11 @@ async def get_listing(
 async def update_listing(
     listing_id: int,
     listing_update: schemas.ListingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Get the listing
-    db_listing = db.query(models.Listing).filter(models.Listing.id == listing_id).first()
+    db_listing = await db.get(models.Listing, listing_id)
     
     if not db_listing:
         raise HTTPException(status_code=404, detail="Listing not found")
@@ -184,11 +206,11 @@ async def update_listing(
     # If status changes to rejected, we need to remove the car_id reference
     if db_listing.status == "rejected" and db_listing.car_id is not None:
         # Check if there's a car created from this listing
-        car = db.query(models.Car).filter(models.Car.id == db_listing.car_id).first()
+        car = await db.get(models.Car, db_listing.car_id)
         if car:
             # Remove the car (option 1) or just remove the reference (option 2)
             # Option 1: Remove the car
-            db.delete(car)
+            await db.delete(car)
             
             # Option 2: Just remove the reference
             # db_listing.car_id = None
@@ -196,19 +218,18 @@ async def update_listing(
         # Clear the car_id field
         db_listing.car_id = None
     
-    db.commit()
-    db.refresh(db_listing)
+    await db.commit()
     
-    return db_listing
+    return await get_listing_or_none(db, listing_id)
 
 @router.delete("/{listing_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_listing(
     listing_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Get the listing
-    db_listing = db.query(models.Listing).filter(models.Listing.id == listing_id).first()
+    db_listing = await db.get(models.Listing, listing_id)
     
     if not db_listing:
         raise HTTPException(status_code=404, detail="Listing not found")
@@ -223,95 +244,34 @@ async def delete_listing(
     # If there's a car created from this listing, we need to handle it
     if db_listing.car_id is not None:
         # Option 1: Delete the car as well (if the car was created from this listing)
-        car = db.query(models.Car).filter(models.Car.id == db_listing.car_id).first()
-        if car and car.external_id and car.external_id == f"listing_{listing_id}":
-            db.delete(car)
+        car = await db.get(models.Car, db_listing.car_id)
+        if car and car.external_id and car.external_id == listing_external_id(listing_id):
+            await db.delete(car)
     
     # Delete the listing
-    db.delete(db_listing)
-    db.commit()
+    await db.delete(db_listing)
+    await db.commit()
     
     return None
 
+async def moderate_one_listing(db: AsyncSession, listing_id: int, moderation: schemas.ListingModeration, moderator_id: int):
+    """Single-listing moderation through the shared batch service"""
+    decision = schemas.ListingModerationItem(listing_id=listing_id, **moderation.dict())
+    [result] = await moderate_listings(db, [decision], moderator_id)
+    if not result.ok:
+        if result.error == "Listing not found":
+            raise HTTPException(status_code=404, detail="Listing not found")
+        if result.error == CLAIMED_ERROR:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=result.error)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.error)
+    await db.commit()
+    return await get_listing_or_none(db, listing_id)
+
 @router.put("/{listing_id}/moderate", response_model=schemas.Listing)
 async def moderate_listing(
     listing_id: int,
     moderation: schemas.ListingModeration,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
-    # Get the listing
-    db_listing = db.query(models.Listing).filter(models.Listing.id == listing_id).first()
-    
-    if not db_listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
-    
-    # Update status and moderator info
-    db_listing.status = moderation.status
-    db_listing.moderator_id = current_user.id
-    db_listing.moderator_comment = moderation.moderator_comment
-    
-    # If listing is approved, create a car entry or update existing one
-    if moderation.status == "approved":
-        # Check if car with this listing_id as external_id already exists
-        existing_car = db.query(models.Car).filter(models.Car.external_id == f"listing_{listing_id}").first()
-        
-        if existing_car:
-            # Update existing car
-            existing_car.brand = db_listing.brand
-            existing_car.model = db_listing.model
-            existing_car.category = db_listing.category
-            existing_car.price = db_listing.price
-            existing_car.shortDescription = db_listing.short_description
-            existing_car.image = db_listing.image
-            existing_car.gallery = db_listing.gallery
-            existing_car.year = db_listing.year
-            existing_car.body_type = db_listing.body_type
-            existing_car.engine_type = db_listing.engine_type
-            existing_car.drive_unit = db_listing.drive_unit
-            existing_car.transmission = db_listing.transmission
-            existing_car.color = db_listing.color
-            existing_car.mileage = db_listing.mileage
-            existing_car.additional_features = db_listing.additional_features
-            
-            # Link car to listing if not already linked
-            db_listing.car_id = existing_car.id
-        else:
-            # Create a new car from the listing data
-            new_car = models.Car(
-                brand=db_listing.brand,
-                model=db_listing.model,
-                category=db_listing.category,
-                price=db_listing.price,
-                shortDescription=db_listing.short_description,
-                image=db_listing.image,
-                gallery=db_listing.gallery,
-                year=db_listing.year,
-                body_type=db_listing.body_type,
-                engine_type=db_listing.engine_type,
-                drive_unit=db_listing.drive_unit,
-                transmission=db_listing.transmission,
-                color=db_listing.color,
-                mileage=db_listing.mileage,
-                additional_features=db_listing.additional_features,
-                external_id=f"listing_{listing_id}"  # Store the reference to the original listing
-            )
-            
-            db.add(new_car)
-            db.flush()  # Flush to get the ID of the new car
-            
-            # Link the car to the listing
-            db_listing.car_id = new_car.id
-    elif moderation.status == "rejected" and db_listing.car_id is not None:
-        # If listing is rejected but a car was created, remove the car
-        car = db.query(models.Car).filter(models.Car.id == db_listing.car_id).first()
-        if car:
-            db.delete(car)
-        
-        # Clear the car_id field
-        db_listing.car_id = None
-    
-    db.commit()
-    db.refresh(db_listing)
-    
-    return db_listing
\ No newline at end of file
+    return await moderate_one_listing(db, listing_id, moderation, current_user.id)
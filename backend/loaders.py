@@ -0,0 +1,85 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import immediateload, joinedload, load_only, selectinload, with_expression
+
+import models
+
+# Loader options for every response model. AsyncSession cannot lazy-load, so each
+# query whose rows are serialized must load exactly what its schema reads, in a
+# fixed number of queries regardless of page size: many-to-one relations are
+# joined into the main query, collections cost one extra SELECT ... IN each.
+
+# schemas.Blog: author, likers and comments with their authors (3 queries)
+BLOG_OPTIONS = (
+    joinedload(models.Blog.author),
+    selectinload(models.Blog.liked_by),
+    selectinload(models.Blog.comments).joinedload(models.Comment.user),
+)
+
+# schemas.BlogSummary: card columns only, the comment count computed in SQL (1 query)
+BLOG_SUMMARY_OPTIONS = (
+    load_only(
+        models.Blog.id, models.Blog.title, models.Blog.shortDescription, models.Blog.image,
+        models.Blog.readTime, models.Blog.author_id, models.Blog.views, models.Blog.likes_count,
+        models.Blog.status, models.Blog.moderator_comment, models.Blog.created_at, models.Blog.updated_at
+    ),
+    joinedload(models.Blog.author).load_only(models.User.id, models.User.username),
+    with_expression(
+        models.Blog.comments_count,
+        select(func.count(models.Comment.id))
+        .where(models.Comment.blog_id == models.Blog.id)
+        .correlate(models.Blog)
+        .scalar_subquery()
+    ),
+)
+
+# schemas.Comment (1 query)
+COMMENT_OPTIONS = (
+    joinedload(models.Comment.user),
+)
+
+# schemas.Listing: creator, moderator and linked car (1 query)
+LISTING_OPTIONS = (
+    joinedload(models.Listing.creator),
+    joinedload(models.Listing.moderator),
+    joinedload(models.Listing.car),
+)
+
+# schemas.ListingSummary: no gallery, features or linked car (1 query)
+LISTING_SUMMARY_OPTIONS = (
+    load_only(
+        models.Listing.id, models.Listing.creator_id, models.Listing.brand, models.Listing.model,
+        models.Listing.year, models.Listing.price, models.Listing.price_amount,
+        models.Listing.price_currency, models.Listing.category, models.Listing.mileage,
+        models.Listing.short_description, models.Listing.image, models.Listing.status,
+        models.Listing.moderator_comment, models.Listing.created_at, models.Listing.updated_at,
+        models.Listing.car_id
+    ),
+    joinedload(models.Listing.creator).load_only(models.User.id, models.User.username),
+)
+
+# schemas.CarCard columns, in the schema's field order so the fast list path
+# (plain rows, no ORM objects) renders the same JSON as the response model
+CAR_CARD_COLUMNS = (
+    models.Car.brand, models.Car.model, models.Car.category, models.Car.price,
+    models.Car.shortDescription, models.Car.image, models.Car.id, models.Car.year,
+    models.Car.body_type, models.Car.engine_type, models.Car.engine_volume, models.Car.mileage,
+    models.Car.transmission, models.Car.price_amount, models.Car.price_currency, models.Car.created_at,
+)
+
+# schemas.CarCard: grid columns only (1 query)
+CAR_CARD_OPTIONS = (
+    load_only(*CAR_CARD_COLUMNS),
+)
+
+# schemas.Review: author and reviewed car (1 query)
+REVIEW_OPTIONS = (
+    joinedload(models.Review.user),
+    joinedload(models.Review.car),
+)
+
+# schemas.Review for one car's reviews: the car is already in the session from the
+# existence check, and immediateload takes many-to-one targets from the identity map
+CAR_REVIEW_OPTIONS = (
+    joinedload(models.Review.user),
+    immediateload(models.Review.car),
+)
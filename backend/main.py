@@ -1,10 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 
 import models
-from database import engine, Base
+from database import engine, async_engine, Base
+from migrations import run_migrations
+from pagination import NEXT_CURSOR_HEADER
+from response_cache import ResponseCacheMiddleware, response_cache
+from compression import CompressionMiddleware
+import metrics
+import sql_profiler
+import search
+from view_counter import view_counter
 import auth_routes
 import user_routes
 import car_routes
@@ -12,9 +20,14 @@ import review_routes
 import listing_routes
 import blog_routes
 import admin_routes
+import image_routes
+import images
+from static_files import UploadStaticFiles
 
 # Create database tables if they don't exist
 Base.metadata.create_all(bind=engine)
+run_migrations()
+search.detect_trigram()
 
 app = FastAPI(
     title="Car Marketplace API",
@@ -22,6 +35,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Serve public read endpoints from the response cache (added before CORS so
+# cached responses still get CORS headers)
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
+# Compress outside the response cache, so cached bodies are stored once and
+# encoded for whatever each client accepts
+app.add_middleware(CompressionMiddleware)
+
 # Configure CORS
 origins = [
     "http://localhost:3000",
@@ -37,8 +58,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "X-Cache"],
 )
 
+# Slow-query log always; per-request SQL profiles with Server-Timing only with SQL_DEBUG
+sql_profiler.instrument_engine(async_engine)
+if sql_profiler.SQL_DEBUG:
+    app.add_middleware(sql_profiler.SqlProfilerMiddleware)
+
+# Outermost, so latency covers every middleware and cache hits are counted
+app.add_middleware(metrics.MetricsMiddleware, router=app.router)
+metrics.instrument_engine(async_engine)
+
 # Include routers
 app.include_router(auth_routes.router)
 app.include_router(user_routes.router)
@@ -47,10 +78,24 @@ app.include_router(review_routes.router)
 app.include_router(listing_routes.router)
 app.include_router(blog_routes.router)
 app.include_router(admin_routes.router)
+app.include_router(image_routes.router)
 
-# Serve static files if uploads directory exists
-if os.path.exists("uploads"):
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Serve uploaded files; the directory is created for the image upload API
+os.makedirs(images.IMAGE_DIR, exist_ok=True)
+# Content-hashed uploads are served immutable, with ranges and precompressed sidecars
+app.mount("/uploads", UploadStaticFiles(directory=images.UPLOAD_DIR), name="uploads")
+
+@app.on_event("startup")
+async def startup():
+    # Periodically write buffered blog views
+    view_counter.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Write views still in the buffer, then close pooled asyncpg connections
+    await view_counter.stop()
+    images.shutdown()
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -60,6 +105,11 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
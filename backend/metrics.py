@@ -0,0 +1,245 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import TTLCache
+
+# Prometheus text exposition format, served by GET /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# Label for requests that matched no route, so scanners cannot blow up the series count
+UNMATCHED_ROUTE = "<unmatched>"
+# Route templates of requests answered before routing, per (method, path);
+# routes never change at runtime, so entries only fall out by LRU
+ROUTE_TEMPLATE_CACHE_SIZE = 4096
+
+class Histogram:
+    """Cumulative-on-export histogram over fixed buckets; observe() allocates nothing"""
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str):
+        """(metric name, label string, value) lines of the histogram"""
+        cumulative = 0
+        separator = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", f'{labels}{separator}le="{bound}"', cumulative
+        cumulative += self.counts[-1]
+        yield f"{name}_bucket", f'{labels}{separator}le="+Inf"', cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, cumulative
+
+class RouteSeries:
+    """Every metric of one (method, route, status); created once per label set"""
+
+    __slots__ = ("labels", "latency", "db_queries", "db_seconds")
+
+    def __init__(self, method: str, route: str, status: int):
+        self.labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Registry:
+    def __init__(self):
+        self.series: Dict[Tuple[str, str, int], RouteSeries] = {}
+        self.in_flight = 0
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.pools: List = []
+
+    def route_series(self, method: str, route: str, status: int) -> RouteSeries:
+        key = (method, route, status)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = RouteSeries(method, route, status)
+        return series
+
+registry = Registry()
+
+class RequestState:
+    """Status and SQL totals of the request being served; one per request"""
+
+    __slots__ = ("send", "status", "db_queries", "db_seconds")
+
+    def __init__(self, send: Send):
+        self.send = send
+        self.status = 500
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    async def send_wrapper(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        await self.send(message)
+
+# State of the request being served; SQL hooks add to its totals
+_request_db: ContextVar[Optional[RequestState]] = ContextVar("request_db", default=None)
+
+# The start time lives on the statement's execution context rather than on the
+# connection, so a statement that raises leaves nothing behind to mis-pair
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = perf_counter() - started
+    state = _request_db.get()
+    if state is not None:
+        state.db_queries += 1
+        state.db_seconds += elapsed
+
+def instrument_engine(engine):
+    """Count and time the engine's statements per request and export its pool state"""
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    registry.pools.append(engine.pool)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long each checkout waited for a connection"""
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            registry.pool_wait.observe(perf_counter() - started)
+
+def _match_template(router, method: str, path: str) -> str:
+    original = {"type": "http", "method": method, "path": path}
+    for route in router.routes:
+        match, _ = route.matches(original)
+        if match != Match.NONE:
+            return route.path_format
+    return UNMATCHED_ROUTE
+
+def route_template(scope: Scope, router, path: str, templates: Optional[TTLCache] = None) -> str:
+    """Path template of the route that served (or would serve) a request to path"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path_format
+    # Requests answered before routing (response cache hits) or by a mount,
+    # which rewrites scope["path"]; match the original path again, once per path
+    if templates is None:
+        return _match_template(router, scope["method"], path)
+    key = (scope["method"], path)
+    template = templates.get(key)
+    if template is None:
+        template = _match_template(router, scope["method"], path)
+        templates.set(key, template)
+    return template
+
+class MetricsMiddleware:
+    """
+    Request count, latency, in-flight and DB time per route template and status.
+
+    Per request this allocates one RequestState and its bound send method;
+    series and histograms are created once per label set.
+    """
+
+    def __init__(self, app: ASGIApp, router, registry: Registry = registry):
+        self.app = app
+        self.router = router
+        self.registry = registry
+        self.templates = TTLCache(maxsize=ROUTE_TEMPLATE_CACHE_SIZE, ttl=float("inf"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        state = RequestState(send)
+        token = _request_db.set(state)
+        self.registry.in_flight += 1
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, state.send_wrapper)
+        finally:
+            elapsed = perf_counter() - started
+            self.registry.in_flight -= 1
+            _request_db.reset(token)
+            template = route_template(scope, self.router, path, self.templates)
+            series = self.registry.route_series(scope["method"], template, state.status)
+            series.latency.observe(elapsed)
+            series.db_queries += state.db_queries
+            series.db_seconds += state.db_seconds
+
+def _format(name: str, labels: str, value) -> str:
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+def render(registry: Registry = registry) -> str:
+    """All metrics in the Prometheus text format"""
+    from response_cache import response_cache
+    from singleflight import groups
+
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(_format(*sample) for sample in samples)
+
+    series = list(registry.series.values())
+    metric("http_requests_total", "counter", "Requests by method, route template and status",
+           (("http_requests_total", s.labels, sum(s.latency.counts)) for s in series))
+    metric("http_request_duration_seconds", "histogram", "Request latency including middleware",
+           (sample for s in series for sample in s.latency.samples("http_request_duration_seconds", s.labels)))
+    metric("http_requests_in_progress", "gauge", "Requests being served",
+           [("http_requests_in_progress", "", registry.in_flight)])
+    metric("db_queries_total", "counter", "SQL statements executed by requests",
+           (("db_queries_total", s.labels, s.db_queries) for s in series))
+    metric("db_query_duration_seconds_total", "counter", "Time requests spent in SQL statements",
+           (("db_query_duration_seconds_total", s.labels, s.db_seconds) for s in series))
+
+    pools = [(f'pool="{index}"', pool) for index, pool in enumerate(registry.pools)]
+    metric("db_pool_size", "gauge", "Configured pool size",
+           (("db_pool_size", labels, pool.size()) for labels, pool in pools))
+    metric("db_pool_checked_out", "gauge", "Connections in use",
+           (("db_pool_checked_out", labels, pool.checkedout()) for labels, pool in pools))
+    metric("db_pool_checked_in", "gauge", "Idle connections in the pool",
+           (("db_pool_checked_in", labels, pool.checkedin()) for labels, pool in pools))
+    metric("db_pool_overflow", "gauge", "Connections opened beyond the pool size (negative: not yet filled)",
+           (("db_pool_overflow", labels, pool.overflow()) for labels, pool in pools))
+    metric("db_pool_wait_seconds", "histogram", "Time spent waiting for a pool connection",
+           registry.pool_wait.samples("db_pool_wait_seconds", ""))
+
+    metric("response_cache_requests_total", "counter", "Cacheable requests by result",
+           [("response_cache_requests_total", 'result="hit"', response_cache.hits),
+            ("response_cache_requests_total", 'result="miss"', response_cache.misses)])
+    flights = [(f'group="{_escape(name)}"', flight.stats()) for name, flight in groups.items()]
+    for stat, kind, help_text in (
+        ("leaders", "counter", "Fetches run by the first caller for a key"),
+        ("coalesced", "counter", "Callers that shared an in-flight fetch"),
+        ("timeouts", "counter", "Followers that gave up waiting and fetched themselves"),
+        ("in_flight", "gauge", "Fetches running now"),
+    ):
+        name = f"singleflight_{stat}" + ("_total" if kind == "counter" else "")
+        metric(name, kind, help_text, ((name, labels, stats[stat]) for labels, stats in flights))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from database import engine
+from models import CAR_FEATURES_FUNCTION_SQL, CAR_SEARCH_VECTOR_SQL
+
+# Idempotent schema changes for databases created before a column/index existed.
+# Base.metadata.create_all only creates missing tables, so new columns on existing
+# tables are added here. Index names match the ones SQLAlchemy generates in models.py.
+MIGRATIONS = [
+    ("price_amount", [
+        "ALTER TABLE cars ADD COLUMN IF NOT EXISTS price_amount BIGINT",
+        "ALTER TABLE cars ADD COLUMN IF NOT EXISTS price_currency VARCHAR(3)",
+        "ALTER TABLE listings ADD COLUMN IF NOT EXISTS price_amount BIGINT",
+        "ALTER TABLE listings ADD COLUMN IF NOT EXISTS price_currency VARCHAR(3)",
+        "CREATE INDEX IF NOT EXISTS ix_cars_price_amount ON cars (price_amount)",
+        "CREATE INDEX IF NOT EXISTS idx_cars_price_amount_id ON cars (price_amount, id)",
+        "CREATE INDEX IF NOT EXISTS idx_cars_category_price ON cars (category, price_amount)",
+        "CREATE INDEX IF NOT EXISTS idx_cars_brand_price ON cars (brand, price_amount)",
+        "CREATE INDEX IF NOT EXISTS ix_listings_price_amount ON listings (price_amount)",
+        "CREATE INDEX IF NOT EXISTS idx_listings_status_price ON listings (status, price_amount)",
+    ]),
+    ("keyset_pagination", [
+        "CREATE INDEX IF NOT EXISTS idx_cars_created_id ON cars (created_at, id)",
+    ]),
+    ("car_full_text_search", [
+        CAR_FEATURES_FUNCTION_SQL,
+        f"ALTER TABLE cars ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({CAR_SEARCH_VECTOR_SQL}) STORED",
+        "CREATE INDEX IF NOT EXISTS idx_cars_search_vector ON cars USING gin (search_vector)",
+    ]),
+    ("feed_sync", [
+        "ALTER TABLE cars ADD COLUMN IF NOT EXISTS feed_source VARCHAR",
+        "ALTER TABLE cars ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32)",
+        "ALTER TABLE cars ADD COLUMN IF NOT EXISTS retired_at TIMESTAMP WITHOUT TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_cars_feed_source ON cars (feed_source)",
+    ]),
+    ("moderation_claims", [
+        "ALTER TABLE listings ADD COLUMN IF NOT EXISTS claimed_by INTEGER REFERENCES users (id) ON DELETE SET NULL",
+        "ALTER TABLE listings ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP WITHOUT TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_listings_claimed_by ON listings (claimed_by)",
+        "ALTER TABLE blogs ADD COLUMN IF NOT EXISTS claimed_by INTEGER REFERENCES users (id) ON DELETE SET NULL",
+        "ALTER TABLE blogs ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP WITHOUT TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_blogs_claimed_by ON blogs (claimed_by)",
+    ]),
+]
+
+# Migrations that depend on optional extensions. A failure (extension not installed
+# on the server, or no privilege to create it) is reported and the feature stays off.
+OPTIONAL_MIGRATIONS = [
+    ("car_trigram_search", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS idx_cars_brand_trgm ON cars USING gin (brand gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_cars_model_trgm ON cars USING gin (model gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_cars_color_trgm ON cars USING gin (color gin_trgm_ops)",
+    ]),
+]
+
+def run_migrations(bind=None):
+    """Apply every migration; each statement is safe to re-run"""
+    bind = bind or engine
+    with bind.begin() as conn:
+        for name, statements in MIGRATIONS:
+            for statement in statements:
+                conn.execute(text(statement))
+
+        for name, statements in OPTIONAL_MIGRATIONS:
+            savepoint = conn.begin_nested()
+            try:
+                for statement in statements:
+                    conn.execute(text(statement))
+                savepoint.commit()
+            except DBAPIError as e:
+                savepoint.rollback()
+                print(f"Optional migration '{name}' skipped: {e.orig}")
+
+if __name__ == "__main__":
+    run_migrations()
+    print(f"Applied {len(MIGRATIONS)} migrations")
@@ -1,7 +1,10 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, JSON, ARRAY, DateTime, Table, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, BigInteger, String, Float, Text, JSON, ARRAY, DateTime, Table, Index, Computed, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, validates, deferred, query_expression
 from datetime import datetime
 
+from pricing import parse_price
+
 # Import Base from database.py instead of creating a new one
 from database import Base
 
@@ -51,6 +54,23 @@ class User(Base):
         Index('idx_users_name', 'first_name', 'last_name'),
     )
 
+# Text search configuration used for the catalog; "simple" does no stemming, which
+# suits brand/model names and mixed Russian/English descriptions
+SEARCH_CONFIG = "simple"
+
+# array_to_string is only STABLE, so generated columns need an IMMUTABLE wrapper
+CAR_FEATURES_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION car_features_text(features text[]) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT coalesce(array_to_string(features, ' '), '') $$
+"""
+
+CAR_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(brand, '') || ' ' || coalesce(model, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', car_features_text(additional_features)), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(\"shortDescription\", '')), 'C')"
+)
+
 class Car(Base):
     __tablename__ = "cars"
 
@@ -58,7 +78,9 @@ class Car(Base):
     brand = Column(String, index=True)
     model = Column(String, index=True)
     category = Column(String, index=True)
-    price = Column(String, index=True)  # Indexed for price filtering and sorting
+    price = Column(String, index=True)  # Display price as entered, e.g. "16 000 000 ₸"
+    price_amount = Column(BigInteger, index=True)  # Normalized numeric price for range filters and sorting
+    price_currency = Column(String(3))
     shortDescription = Column(String)
     image = Column(String)
     gallery = Column(ARRAY(String))
@@ -77,6 +99,13 @@ class Car(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Indexed for sorting by newest
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     external_id = Column(String, unique=True, index=True, nullable=True)  # Reference to original listing or external system
+    feed_source = Column(String, index=True, nullable=True)  # Feed that owns the row, set by feed_sync
+    content_hash = Column(String(32), nullable=True)  # Hash of the last synced feed row, to skip unchanged rows
+    retired_at = Column(DateTime, nullable=True)  # Set when the row vanished from its feed; hidden from the catalog
+    # Full-text document maintained by PostgreSQL; never loaded into Python
+    search_vector = deferred(Column(TSVECTOR, Computed(CAR_SEARCH_VECTOR_SQL, persisted=True)))
+    # Relevance of the current free-text query, populated with with_expression()
+    search_rank = query_expression()
 
     # Relationships
     favorited_by = relationship("User", secondary=favorites, back_populates="favorites")
@@ -87,8 +116,20 @@ class Car(Base):
         Index('idx_cars_brand_model', 'brand', 'model'),  # Brand + model searches
         Index('idx_cars_year_mileage', 'year', 'mileage'),  # Age + mileage searches
         Index('idx_cars_category_body_engine', 'category', 'body_type', 'engine_type'),  # Common filter combination
+        Index('idx_cars_price_amount_id', 'price_amount', 'id'),  # Price sorting with a stable tie-breaker
+        Index('idx_cars_category_price', 'category', 'price_amount'),  # Category + price range
+        Index('idx_cars_brand_price', 'brand', 'price_amount'),  # Brand + price range
+        Index('idx_cars_created_id', 'created_at', 'id'),  # Default catalog order / keyset pagination
+        Index('idx_cars_search_vector', 'search_vector', postgresql_using='gin'),  # Free-text search
     )
 
+    @validates('price')
+    def _sync_price_amount(self, key, value):
+        self.price_amount, self.price_currency = parse_price(value)
+        return value
+
+event.listen(Car.__table__, "before_create", DDL(CAR_FEATURES_FUNCTION_SQL))
+
 class Review(Base):
     __tablename__ = "reviews"
 
@@ -118,6 +159,8 @@ class Listing(Base):
     model = Column(String, index=True)
     year = Column(Integer, index=True)
     price = Column(String, index=True)
+    price_amount = Column(BigInteger, index=True)
+    price_currency = Column(String(3))
     category = Column(String, index=True)
     body_type = Column(String, index=True)
     engine_type = Column(String, index=True)
@@ -135,6 +178,9 @@ class Listing(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     car_id = Column(Integer, ForeignKey("cars.id"), nullable=True)  # Reference to approved car in cars table
+    # Moderation lease: the moderator working on a pending listing and until when
+    claimed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    claim_expires_at = Column(DateTime, nullable=True)
 
     # Relationships
     creator = relationship("User", foreign_keys=[creator_id], back_populates="listings")
@@ -144,8 +190,14 @@ class Listing(Base):
     # Index for status + creation date to quickly find pending listings, sorted by newest
     __table_args__ = (
         Index('idx_listings_status_created', 'status', 'created_at'),
+        Index('idx_listings_status_price', 'status', 'price_amount'),
     )
 
+    @validates('price')
+    def _sync_price_amount(self, key, value):
+        self.price_amount, self.price_currency = parse_price(value)
+        return value
+
 class Blog(Base):
     __tablename__ = "blogs"
 
@@ -163,6 +215,11 @@ class Blog(Base):
     moderator_comment = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Moderation lease: the moderator working on a pending blog and until when
+    claimed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+    # Number of comments, populated with with_expression() by the list endpoints
+    comments_count = query_expression()
 
     # Relationships
     author = relationship("User", foreign_keys=[author_id], back_populates="blogs")
@@ -0,0 +1,223 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+
+LISTING_STATUSES = ("pending", "approved", "rejected")
+
+# Seconds a claimed item stays reserved for its moderator without a heartbeat
+CLAIM_LEASE_SECONDS = int(os.getenv("MODERATION_CLAIM_LEASE", "300"))
+MAX_CLAIM_BATCH = 100
+
+def listing_external_id(listing_id: int) -> str:
+    """Car.external_id of the car materialized from a listing"""
+    return f"listing_{listing_id}"
+
+def car_values(listing: models.Listing) -> dict:
+    """Catalog fields copied from a listing to its car on approval"""
+    return dict(
+        brand=listing.brand,
+        model=listing.model,
+        category=listing.category,
+        price=listing.price,
+        shortDescription=listing.short_description,
+        image=listing.image,
+        gallery=listing.gallery,
+        year=listing.year,
+        body_type=listing.body_type,
+        engine_type=listing.engine_type,
+        drive_unit=listing.drive_unit,
+        transmission=listing.transmission,
+        color=listing.color,
+        mileage=listing.mileage,
+        additional_features=listing.additional_features,
+    )
+
+CLAIMED_ERROR = "Claimed by another moderator"
+
+def claimed_by_other(item, moderator_id: int) -> bool:
+    """Whether another moderator holds an unexpired lease on a listing or blog"""
+    return (
+        item.claimed_by is not None
+        and item.claimed_by != moderator_id
+        and item.claim_expires_at is not None
+        and item.claim_expires_at > datetime.utcnow()
+    )
+
+def release_claim(item):
+    item.claimed_by = None
+    item.claim_expires_at = None
+
+async def moderate_listings(
+    db: AsyncSession,
+    decisions: Sequence[schemas.ListingModerationItem],
+    moderator_id: int,
+) -> List[schemas.ListingModerationResult]:
+    """
+    Apply moderation decisions without committing.
+
+    Approval creates the listing's car, or refreshes it if one was already
+    materialized, and links it; rejection deletes it. Listings, existing
+    cars and cars to delete are each loaded with one query, and new cars
+    are inserted in a single flush, however many decisions there are.
+    """
+    # One result per decision, in request order
+    results: List[schemas.ListingModerationResult] = []
+    by_listing: Dict[int, schemas.ListingModerationResult] = {}
+    valid = []
+    for decision in decisions:
+        result = schemas.ListingModerationResult(listing_id=decision.listing_id, ok=False)
+        if decision.listing_id in by_listing:
+            result.error = "Duplicate decision for this listing"
+        elif decision.status not in LISTING_STATUSES:
+            result.error = f"Invalid status '{decision.status}'"
+        else:
+            result.ok = True
+            result.status = decision.status
+            by_listing[decision.listing_id] = result
+            valid.append(decision)
+        results.append(result)
+
+    listings = {}
+    if valid:
+        result = await db.execute(
+            select(models.Listing).where(models.Listing.id.in_([decision.listing_id for decision in valid]))
+        )
+        listings = {listing.id: listing for listing in result.scalars()}
+
+    approved = [d for d in valid if d.listing_id in listings and d.status == "approved"]
+    rejected = [d for d in valid if d.listing_id in listings and d.status == "rejected"]
+
+    existing_cars = {}
+    if approved:
+        result = await db.execute(select(models.Car).where(
+            models.Car.external_id.in_([listing_external_id(d.listing_id) for d in approved])
+        ))
+        existing_cars = {car.external_id: car for car in result.scalars()}
+
+    cars_to_delete = {}
+    car_ids = [listings[d.listing_id].car_id for d in rejected if listings[d.listing_id].car_id is not None]
+    if car_ids:
+        result = await db.execute(select(models.Car).where(models.Car.id.in_(car_ids)))
+        cars_to_delete = {car.id: car for car in result.scalars()}
+
+    new_cars = {}
+    for decision in valid:
+        listing = listings.get(decision.listing_id)
+        if listing is None:
+            by_listing[decision.listing_id].ok = False
+            by_listing[decision.listing_id].status = None
+            by_listing[decision.listing_id].error = "Listing not found"
+            continue
+        if claimed_by_other(listing, moderator_id):
+            by_listing[decision.listing_id].ok = False
+            by_listing[decision.listing_id].status = None
+            by_listing[decision.listing_id].error = CLAIMED_ERROR
+            continue
+        listing.status = decision.status
+        listing.moderator_id = moderator_id
+        listing.moderator_comment = decision.moderator_comment
+        release_claim(listing)
+
+        if decision.status == "approved":
+            car = existing_cars.get(listing_external_id(listing.id))
+            if car is not None:
+                for key, value in car_values(listing).items():
+                    setattr(car, key, value)
+                listing.car_id = car.id
+            else:
+                car = models.Car(**car_values(listing), external_id=listing_external_id(listing.id))
+                db.add(car)
+                new_cars[listing.id] = car
+        elif decision.status == "rejected" and listing.car_id is not None:
+            car = cars_to_delete.get(listing.car_id)
+            if car is not None:
+                await db.delete(car)
+            listing.car_id = None
+
+    if new_cars:
+        # One batched INSERT ... RETURNING for every new car
+        await db.flush()
+        for listing_id, car in new_cars.items():
+            listings[listing_id].car_id = car.id
+
+    for listing_id, listing in listings.items():
+        if by_listing[listing_id].ok:
+            by_listing[listing_id].car_id = listing.car_id
+    return results
+
+async def moderate_blog(db: AsyncSession, blog_id: int, moderation: schemas.BlogModeration, moderator_id: int):
+    """Set a blog's moderation status and release its lease, without committing"""
+    blog = await db.get(models.Blog, blog_id)
+    if blog is None:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    if claimed_by_other(blog, moderator_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=CLAIMED_ERROR)
+    blog.status = moderation.status
+    blog.moderator_id = moderator_id
+    blog.moderator_comment = moderation.moderator_comment
+    release_claim(blog)
+
+# Claims are written through the tables, not the mapped classes: a lease is
+# bookkeeping for moderators and must not invalidate the public caches.
+def _lease_expiry():
+    return func.timezone("utc", func.now()) + text(f"interval '{CLAIM_LEASE_SECONDS} seconds'")
+
+async def claim_pending(db: AsyncSession, model, moderator_id: int, limit: int) -> Tuple[List[int], Optional[datetime]]:
+    """
+    Lease up to limit pending items, oldest first, to a moderator.
+
+    Items already leased to the moderator are renewed and count towards the
+    limit. FOR UPDATE SKIP LOCKED makes concurrent claims skip each other's
+    candidate rows instead of waiting on them, so every moderator gets a
+    disjoint batch; the lease columns keep it reserved after the commit.
+    """
+    table = model.__table__
+    now = func.timezone("utc", func.now())
+    candidates = (
+        select(table.c.id)
+        .where(
+            table.c.status == "pending",
+            or_(table.c.claimed_by.is_(None), table.c.claim_expires_at < now, table.c.claimed_by == moderator_id),
+        )
+        .order_by(table.c.created_at, table.c.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        table.update()
+        .where(table.c.id.in_(candidates.scalar_subquery()))
+        .values(claimed_by=moderator_id, claim_expires_at=_lease_expiry())
+        .returning(table.c.id, table.c.claim_expires_at)
+    )
+    rows = result.all()
+    await db.commit()
+    return [row.id for row in rows], max((row.claim_expires_at for row in rows), default=None)
+
+async def renew_claims(db: AsyncSession, model, moderator_id: int) -> Tuple[List[int], Optional[datetime]]:
+    """Heartbeat: extend every pending lease the moderator still holds"""
+    table = model.__table__
+    result = await db.execute(
+        table.update()
+        .where(table.c.claimed_by == moderator_id, table.c.status == "pending")
+        .values(claim_expires_at=_lease_expiry())
+        .returning(table.c.id, table.c.claim_expires_at)
+    )
+    rows = result.all()
+    await db.commit()
+    return sorted(row.id for row in rows), max((row.claim_expires_at for row in rows), default=None)
+
+async def release_claims(db: AsyncSession, model, moderator_id: int, ids: Optional[List[int]] = None):
+    """Give leased items back to the queue, all of the moderator's or only ids"""
+    table = model.__table__
+    query = table.update().where(table.c.claimed_by == moderator_id)
+    if ids:
+        query = query.where(table.c.id.in_(ids))
+    await db.execute(query.values(claimed_by=None, claim_expires_at=None))
+    await db.commit()
@@ -0,0 +1,111 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, asc, desc, or_, tuple_
+
+# Response header carrying the cursor of the next page; list bodies stay plain arrays
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_key: str, value: Any, last_id: int) -> str:
+    """Pack the sort key of the last row into an opaque URL-safe token"""
+    if isinstance(value, datetime):
+        payload = {"s": sort_key, "v": value.isoformat(), "t": "dt", "id": last_id}
+    else:
+        payload = {"s": sort_key, "v": value, "id": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_key: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload.get("t") == "dt":
+            value = datetime.fromisoformat(value)
+        last_id = int(payload["id"])
+        cursor_sort_key = payload["s"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    if cursor_sort_key != sort_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested sort order"
+        )
+    return value, last_id
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+class Keyset:
+    """
+    Deterministic ordering by (column, id) with cursor-based paging.
+
+    With a cursor the page starts right after the last seen row, so the
+    database seeks through the index instead of scanning skipped rows.
+    Without one, the legacy skip offset is used.
+    """
+
+    def __init__(self, column, id_column, descending: bool = False):
+        self.column = column
+        self.id_column = id_column
+        self.descending = descending
+
+    @property
+    def sort_key(self) -> str:
+        return f"{self.column.key}:{'desc' if self.descending else 'asc'}"
+
+    def _after(self, value, last_id):
+        column, id_column = self.column, self.id_column
+        if column is id_column:
+            return id_column < last_id if self.descending else id_column > last_id
+
+        # PostgreSQL puts NULLs last in ascending and first in descending order
+        if self.descending:
+            if value is None:
+                return or_(column.isnot(None), and_(column.is_(None), id_column < last_id))
+            return tuple_(column, id_column) < tuple_(value, last_id)
+        if value is None:
+            return and_(column.is_(None), id_column > last_id)
+        return or_(tuple_(column, id_column) > tuple_(value, last_id), column.is_(None))
+
+    def apply(self, query, cursor: Optional[str] = None, skip: int = 0, limit: int = 20):
+        direction = desc if self.descending else asc
+        if self.column is self.id_column:
+            query = query.order_by(direction(self.id_column))
+        else:
+            query = query.order_by(direction(self.column), direction(self.id_column))
+
+        if cursor:
+            value, last_id = decode_cursor(cursor, self.sort_key)
+            query = query.where(self._after(value, last_id))
+        elif skip:
+            query = query.offset(skip)
+
+        # One extra row tells whether there is a next page
+        return query.limit(limit + 1)
+
+    def page(self, items: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+        """Trim the extra row and build the cursor for the following page"""
+        if len(items) <= limit:
+            return list(items), None
+        items = list(items[:limit])
+        last = items[-1]
+        return items, encode_cursor(self.sort_key, getattr(last, self.column.key), last.id)
+
+def keyset_from_params(sort_columns: dict, id_column, sort_by: Optional[str], sort_order: Optional[str]) -> Keyset:
+    """Build a Keyset from user-supplied sort_by/sort_order, rejecting unknown fields"""
+    column = sort_columns.get(sort_by)
+    if column is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot sort by '{sort_by}'"
+        )
+    return Keyset(column, id_column, descending=sort_order == "desc")
@@ -0,0 +1,178 @@
+import re
+from typing import Optional, Tuple
+
+DEFAULT_CURRENCY = "KZT"
+
+# Currency markers as they appear in free-form price strings ("16 000 000 ₸", "$30,000")
+CURRENCY_MARKERS = (
+    ("₸", "KZT"),
+    ("kzt", "KZT"),
+    ("тг", "KZT"),
+    ("тенге", "KZT"),
+    ("$", "USD"),
+    ("usd", "USD"),
+    ("€", "EUR"),
+    ("eur", "EUR"),
+    ("₽", "RUB"),
+    ("rub", "RUB"),
+    ("руб", "RUB"),
+)
+
+# Number groups: thousands separated by spaces, commas or dots ("16 000 000",
+# "30,000", "1.500.000"), an optional fraction and an optional scale word
+_NUMBER_RE = re.compile(
+    r"(?<![\d.,])(?P<integer>\d{1,3}(?:[ \u00a0\u202f]\d{3})+|\d{1,3}(?:,\d{3})+|\d{1,3}(?:\.\d{3})+|\d+)"
+    r"(?:[.,](?P<fraction>\d+))?"
+    r"(?:\s*(?P<scale>млрд|млн|миллион\w*|mln|тыс\w*|k|к|m)(?![a-zа-яё]))?",
+    re.IGNORECASE,
+)
+SCALES = {"млрд": 10**9, "млн": 10**6, "миллион": 10**6, "mln": 10**6, "m": 10**6, "тыс": 10**3, "k": 10**3, "к": 10**3}
+# "2020 год", "2020 г." next to a price is the model year, not an amount
+_YEAR_SUFFIX_RE = re.compile(r"\s*(?:год|г\.|г\b|year)", re.IGNORECASE)
+_YEARS = range(1900, 2101)
+# What separates the two ends of a range ("2 000 000 - 2 500 000 ₸",
+# "от 2 млн до 2,5 млн"), allowing a currency marker after the first end
+_RANGE_GAP_RE = re.compile(
+    r"\s*(?:[₸$€₽]|тг|тенге|kzt|usd|eur|rub|руб)?\.?\s*(?:-|–|—|до|to)\s*[₸$€₽]?\s*",
+    re.IGNORECASE,
+)
+
+def _scale(word: Optional[str]) -> int:
+    if not word:
+        return 1
+    word = word.lower()
+    for prefix, multiplier in SCALES.items():
+        if word.startswith(prefix):
+            return multiplier
+    return 1
+
+def _currency_near(text: str, start: int, end: int) -> Optional[str]:
+    """Currency whose marker directly follows or precedes the number at text[start:end]"""
+    after = text[end:].lstrip().lower()
+    before = text[:start].rstrip().lower()
+    for marker, code in CURRENCY_MARKERS:
+        if after.startswith(marker) or before.endswith(marker):
+            return code
+    return None
+
+def parse_price(price: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Normalize a display price ("от 20 000 000 ₸", "1.5 млн ₸") into (amount, currency).
+
+    The amount is the one number written next to a currency marker, or the
+    only number besides a model year. Anything else, including ranges
+    ("5 000 000 или 4 500 000", "от 2 000 000 до 2 500 000 ₸"), is ambiguous
+    and gives (None, None) rather than a wrong amount.
+    """
+    if not price:
+        return None, None
+
+    candidates = []
+    spans = []
+    for match in _NUMBER_RE.finditer(price):
+        integer = re.sub(r"\D", "", match.group("integer"))
+        fraction = match.group("fraction") or ""
+        multiplier = _scale(match.group("scale"))
+        if multiplier > 1:
+            amount = int(round(float(f"{integer}.{fraction or 0}") * multiplier))
+        else:
+            # Kopecks/cents are dropped, so "12 500,50" becomes 12500
+            amount = int(integer)
+        year = (
+            multiplier == 1 and not fraction and int(integer) in _YEARS and integer == match.group("integer")
+        ) or bool(_YEAR_SUFFIX_RE.match(price, match.end()))
+        candidates.append((amount, _currency_near(price, match.start(), match.end()), year))
+        spans.append((match.start(), match.end()))
+
+    for (_, _, first_year), (_, _, second_year), (_, first_end), (second_start, _) in zip(
+        candidates, candidates[1:], spans, spans[1:]
+    ):
+        # Either end of a range would sort and filter the listing wrongly
+        if not first_year and not second_year and _RANGE_GAP_RE.fullmatch(price, first_end, second_start):
+            return None, None
+
+    with_currency = [candidate for candidate in candidates if candidate[1]]
+    if with_currency:
+        amounts = {(amount, currency) for amount, currency, _ in with_currency}
+        if len(amounts) != 1:
+            return None, None
+        return amounts.pop()
+
+    amounts = [amount for amount, _, year in candidates if not year]
+    if not amounts and len(candidates) == 1:
+        # A lone four-digit number is a price after all ("1990 ₸" is caught above)
+        amounts = [candidates[0][0]]
+    if len(amounts) != 1:
+        return None, None
+
+    lowered = price.lower()
+    currency = DEFAULT_CURRENCY
+    for marker, code in CURRENCY_MARKERS:
+        if marker in lowered:
+            currency = code
+            break
+
+    return amounts[0], currency
+
+def backfill_prices(batch_size: int = 1000, recompute: bool = False):
+    """
+    Fill price_amount/price_currency for rows written before the columns existed.
+    Walks each table by primary key so every batch is an index range scan.
+    With recompute, every row is parsed again and corrected where the stored
+    amount differs, e.g. after a fix to parse_price.
+    """
+    from sqlalchemy import select, update
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        for model in (models.Car, models.Listing):
+            updated = 0
+            last_id = 0
+            while True:
+                conditions = [model.id > last_id, model.price.isnot(None)]
+                if not recompute:
+                    conditions.append(model.price_amount.is_(None))
+                rows = db.execute(
+                    select(model.id, model.price, model.price_amount, model.price_currency)
+                    .where(*conditions)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+
+                values = []
+                for row in rows:
+                    amount, currency = parse_price(row.price)
+                    if (amount, currency) == (row.price_amount, row.price_currency):
+                        continue
+                    # Without recompute only new amounts are written; with it an
+                    # ambiguous price also clears a previously guessed amount
+                    if amount is not None or recompute:
+                        values.append({"id": row.id, "price_amount": amount, "price_currency": currency})
+
+                if values:
+                    # ORM bulk UPDATE by primary key, executed as a single executemany
+                    db.execute(update(model), values)
+                    db.commit()
+                    updated += len(values)
+
+                last_id = rows[-1].id
+
+            print(f"{model.__tablename__}: updated {updated} rows")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Fill normalized price columns from display prices")
+    parser.add_argument("--recompute", action="store_true", help="re-parse rows that already have an amount")
+    args = parser.parse_args()
+
+    run_migrations()
+    backfill_prices(recompute=args.recompute)
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import models
+from cache import TTLCache
+from changes import on_change
+from pagination import NEXT_CURSOR_HEADER
+
+# Seconds a cached response is served before it is rebuilt even without writes
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Empty for the in-process LRU, or redis://host:port/db for a shared Redis-protocol server
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+# Seconds a Redis connect or command may take before the request goes uncached
+RESPONSE_CACHE_TIMEOUT = float(os.getenv("RESPONSE_CACHE_TIMEOUT", "0.5"))
+# Redis connections per worker
+RESPONSE_CACHE_POOL_SIZE = int(os.getenv("RESPONSE_CACHE_POOL_SIZE", "8"))
+
+# Public GET routes whose body does not depend on the caller, grouped by the
+# namespace that is invalidated when the listed models change
+CACHED_ROUTES = {
+    "cars": [re.compile(r"^/cars/?$"), re.compile(r"^/cars/\d+$")],
+    "blogs": [re.compile(r"^/blogs/?$"), re.compile(r"^/blogs/featured$")],
+    "listings": [re.compile(r"^/listings/approved$")],
+}
+INVALIDATED_BY = {
+    "cars": [models.Car],
+    "blogs": [models.Blog, models.Comment, models.User],
+    "listings": [models.Listing, models.User],
+}
+# Response headers replayed from the cache
+STORED_HEADERS = ("content-type", NEXT_CURSOR_HEADER.lower())
+# Backend failures degrade to uncached responses instead of failing requests
+BACKEND_ERRORS = (ConnectionError, OSError, RuntimeError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+class MemoryBackend:
+    """Per-process LRU; invalidation only reaches the current worker"""
+
+    def __init__(self, maxsize: int = 2048):
+        self.entries = TTLCache(maxsize=maxsize, ttl=RESPONSE_CACHE_TTL)
+        self.counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries.set(key, value, ttl=ttl)
+
+    async def get_int(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+class RedisConnection:
+    """One RESP connection; used by a single command at a time"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def roundtrip(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.writer.write(b"".join(parts))
+        await self.writer.drain()
+        return await self.read_reply()
+
+    async def read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            return [await self.read_reply() for _ in range(int(rest))]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    def close(self):
+        self.writer.close()
+
+class RedisBackend:
+    """
+    Minimal RESP client for GET/SET/INCR, so any Redis-protocol server (Redis,
+    Valkey, KeyDB or a local stand-in) can share the cache across workers
+    without an extra dependency.
+
+    Commands run on a small pool of connections and each one is bounded by
+    RESPONSE_CACHE_TIMEOUT, so a stalled server degrades requests to uncached
+    instead of hanging them.
+    """
+
+    def __init__(self, url: str, pool_size: int = RESPONSE_CACHE_POOL_SIZE, timeout: float = RESPONSE_CACHE_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[RedisConnection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _connect(self) -> RedisConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = RedisConnection(reader, writer)
+        try:
+            if self.password:
+                await connection.roundtrip("AUTH", self.password)
+            if self.db:
+                await connection.roundtrip("SELECT", str(self.db))
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def command(self, *args):
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reply = await asyncio.wait_for(connection.roundtrip(*args), self.timeout)
+            except BaseException:
+                # Timeouts and cancellations can leave a reply unread on the
+                # socket, which the next command would take as its own
+                if connection is not None:
+                    connection.close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.command("SET", key, value, "PX", str(int(ttl * 1000)))
+
+    async def get_int(self, key: str) -> int:
+        value = await self.command("GET", key)
+        return int(value) if value is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.command("INCR", key)
+
+def create_backend(url: str = RESPONSE_CACHE_URL):
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+def normalized_query(query_string: bytes) -> str:
+    """Order-independent query string without empty parameters"""
+    params = [(k, v) for k, v in parse_qsl(query_string.decode("latin-1")) if v != ""]
+    return urlencode(sorted(params))
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison: compression turns the ETag into W/"..." on the way out
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+class ResponseCache:
+    """
+    Cache of whole responses for CACHED_ROUTES.
+
+    Keys contain a version per namespace; a write to one of the namespace's
+    models bumps the version, so every older entry becomes unreachable at once
+    and simply ages out of the backend.
+    """
+
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend or create_backend()
+        self.ttl = ttl
+        self._dirty = set()
+        # Lookups by outcome, for /metrics
+        self.hits = 0
+        self.misses = 0
+        for namespace, changed_models in INVALIDATED_BY.items():
+            for model in changed_models:
+                on_change(model, lambda namespace=namespace: self._dirty.add(namespace))
+
+    def namespace_for(self, path: str) -> Optional[str]:
+        for namespace, patterns in CACHED_ROUTES.items():
+            if any(pattern.match(path) for pattern in patterns):
+                return namespace
+        return None
+
+    async def flush_invalidations(self):
+        """Bump versions of namespaces written since the last call"""
+        while self._dirty:
+            namespace = self._dirty.pop()
+            try:
+                await self.backend.incr(f"response:version:{namespace}")
+            except BACKEND_ERRORS as e:
+                # Retry on the next request; entries still expire after the TTL
+                self._dirty.add(namespace)
+                print(f"Response cache invalidation failed: {e}")
+                return
+
+    async def key_for(self, namespace: str, path: str, query_string: bytes) -> str:
+        version = await self.backend.get_int(f"response:version:{namespace}")
+        return f"response:{namespace}:{version}:{path.rstrip('/')}?{normalized_query(query_string)}"
+
+    async def load(self, key: str) -> Optional[Tuple[str, List[Tuple[str, str]], bytes]]:
+        raw = await self.backend.get(key)
+        if raw is None:
+            return None
+        meta, body = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+        return meta["etag"], meta["headers"], body
+
+    async def store(self, key: str, etag: str, headers: List[Tuple[str, str]], body: bytes):
+        meta = json.dumps({"etag": etag, "headers": headers}).encode()
+        await self.backend.set(key, meta + b"\n" + body, self.ttl)
+
+class ResponseCacheMiddleware:
+    """Serve CACHED_ROUTES from the cache with ETag / If-None-Match revalidation"""
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        await self.cache.flush_invalidations()
+        namespace = self.cache.namespace_for(scope["path"]) if scope["method"] == "GET" else None
+        if namespace is None:
+            async def send_invalidated(message: Message):
+                # Writes committed by the handler are invalidated before the
+                # client sees the response, so its next read cannot be stale
+                if message["type"] == "http.response.start":
+                    await self.cache.flush_invalidations()
+                await send(message)
+
+            await self.app(scope, receive, send_invalidated)
+            # Writes committed after the response started (background tasks)
+            await self.cache.flush_invalidations()
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        try:
+            key = await self.cache.key_for(namespace, scope["path"], scope["query_string"])
+            entry = await self.cache.load(key)
+        except BACKEND_ERRORS as e:
+            print(f"Response cache unavailable: {e}")
+            await self.app(scope, receive, send)
+            return
+        if entry is not None:
+            self.cache.hits += 1
+            etag, headers, body = entry
+            await self.respond(send, etag, headers, body, if_none_match, "HIT")
+            return
+
+        # Miss: capture the downstream response, then store and replay it
+        self.cache.misses += 1
+        start: Optional[Message] = None
+        chunks = []
+
+        async def capture(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        response_headers = Headers(raw=start["headers"])
+        headers = [(name, response_headers[name]) for name in STORED_HEADERS if name in response_headers]
+        etag = make_etag(body)
+        try:
+            await self.cache.store(key, etag, headers, body)
+        except BACKEND_ERRORS as e:
+            print(f"Response cache unavailable: {e}")
+        await self.respond(send, etag, headers, body, if_none_match, "MISS")
+
+    async def respond(self, send: Send, etag: str, stored_headers, body: bytes, if_none_match, cache_status: str):
+        headers = MutableHeaders()
+        headers["ETag"] = etag
+        # Clients may keep the body but must revalidate it on every use
+        headers["Cache-Control"] = "no-cache"
+        headers["X-Cache"] = cache_status
+        if etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        for name, value in stored_headers:
+            headers[name] = value
+        headers["Content-Length"] = str(len(body))
+        await send({"type": "http.response.start", "status": 200, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
+
+response_cache = ResponseCache()
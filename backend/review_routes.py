@@ -1,42 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select
 
 import schemas
 import models
 import auth
 from database import get_db
+from loaders import CAR_REVIEW_OPTIONS, REVIEW_OPTIONS
 
 router = APIRouter(
     prefix="/reviews",
     tags=["reviews"]
 )
 
+async def get_review_or_none(db: AsyncSession, review_id: int):
+    """Load a review with every relationship needed for the response"""
+    result = await db.execute(
+        select(models.Review)
+        .options(*REVIEW_OPTIONS)
+        .where(models.Review.id == review_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 @router.get("/car/{car_id}", response_model=List[schemas.Review])
-async def read_car_reviews(car_id: int, db: Session = Depends(get_db)):
+async def read_car_reviews(car_id: int, db: AsyncSession = Depends(get_db)):
     # Check if car exists
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    car = await db.get(models.Car, car_id)
     if not car:
         raise HTTPException(status_code=404, detail="Car not found")
     
     # Get reviews for this car
-    reviews = db.query(models.Review).filter(models.Review.car_id == car_id).all()
-    return reviews
+    result = await db.execute(
+        select(models.Review).options(*CAR_REVIEW_OPTIONS).where(models.Review.car_id == car_id)
+    )
+    return result.scalars().all()
 
 @router.get("/user", response_model=List[schemas.Review])
 async def read_user_reviews(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     """Get reviews from the current user with car information"""
     try:
         # Query reviews with joined car data
-        reviews = db.query(models.Review).filter(
+        result = await db.execute(select(models.Review).where(
             models.Review.user_id == current_user.id
         ).options(
-            joinedload(models.Review.car)  # Eager load car relationship
-        ).all()
+            *REVIEW_OPTIONS  # Eager load user and car relationships
+        ))
+        reviews = result.scalars().all()
         
         # Проверка на отсутствие машины в отзыве
         for review in reviews:
@@ -53,19 +67,20 @@ async def read_user_reviews(
 @router.post("/", response_model=schemas.Review, status_code=status.HTTP_201_CREATED)
 async def create_review(
     review: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Check if car exists
-    car = db.query(models.Car).filter(models.Car.id == review.car_id).first()
+    car = await db.get(models.Car, review.car_id)
     if not car:
         raise HTTPException(status_code=404, detail="Car not found")
     
     # Check if user already reviewed this car
-    existing_review = db.query(models.Review).filter(
+    result = await db.execute(select(models.Review.id).where(
         models.Review.car_id == review.car_id,
         models.Review.user_id == current_user.id
-    ).first()
+    ))
+    existing_review = result.first()
     
     if existing_review:
         raise HTTPException(
@@ -82,20 +97,19 @@ async def create_review(
     )
     
     db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
+    await db.commit()
     
-    return db_review
+    return await get_review_or_none(db, db_review.id)
 
 @router.put("/{review_id}", response_model=schemas.Review)
 async def update_review(
     review_id: int,
     review_update: schemas.ReviewUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Get the review
-    db_review = db.query(models.Review).filter(models.Review.id == review_id).first()
+    db_review = await db.get(models.Review, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     
@@ -111,19 +125,18 @@ async def update_review(
     for key, value in update_data.items():
         setattr(db_review, key, value)
     
-    db.commit()
-    db.refresh(db_review)
+    await db.commit()
     
-    return db_review
+    return await get_review_or_none(db, review_id)
 
 @router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_review(
     review_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Get the review
-    db_review = db.query(models.Review).filter(models.Review.id == review_id).first()
+    db_review = await db.get(models.Review, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     
@@ -134,7 +147,7 @@ async def delete_review(
             detail="Not enough permissions to delete this review"
         )
     
-    db.delete(db_review)
-    db.commit()
+    await db.delete(db_review)
+    await db.commit()
     
     return None
\ No newline at end of file
@@ -2,6 +2,8 @@ from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from images import variants_for_url
+
 # User schemas
 class UserBase(BaseModel):
     username: str
@@ -38,6 +40,39 @@ class UserInDB(UserBase):
 class User(UserInDB):
     pass
 
+# Author/creator shown next to items in list views
+class UserSummary(BaseModel):
+    id: int
+    username: str
+
+    class Config:
+        orm_mode = True
+
+# Image schemas
+class ImageVariant(BaseModel):
+    width: int
+    webp: str
+    avif: Optional[str] = None
+
+class ImageVariants(BaseModel):
+    thumb: ImageVariant
+    card: ImageVariant
+    large: ImageVariant
+
+class ImageUpload(BaseModel):
+    id: str
+    url: str
+    created: bool
+    status: str  # "processing" or "ready"
+    variants: Optional[ImageVariants] = None
+
+# Responsive variants derived from image/gallery URLs that point at processed uploads
+def _image_variants(cls, value, values):
+    return variants_for_url(values.get("image"))
+
+def _gallery_variants(cls, value, values):
+    return [variants_for_url(url) for url in values.get("gallery") or []]
+
 # Car schemas
 class CarBase(BaseModel):
     brand: str
@@ -100,9 +135,17 @@ class CarInDB(CarBase):
     range: Optional[str] = None
     transmission: Optional[str] = None
     additional_features: List[str] = []
+    price_amount: Optional[int] = None
+    price_currency: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     external_id: Optional[str] = None
+    retired_at: Optional[datetime] = None
+    image_variants: Optional[ImageVariants] = None
+    gallery_variants: List[Optional[ImageVariants]] = []
+
+    _image_variants = validator("image_variants", always=True, allow_reuse=True)(_image_variants)
+    _gallery_variants = validator("gallery_variants", always=True, allow_reuse=True)(_gallery_variants)
     
     class Config:
         orm_mode = True
@@ -111,7 +154,45 @@ class CarInDB(CarBase):
 class Car(CarInDB):
     pass
 
+# Catalog grid card; the full record comes from GET /cars/{id}
+class CarCard(CarBase):
+    id: int
+    year: int
+    body_type: str
+    engine_type: str
+    engine_volume: Optional[str] = None
+    mileage: Optional[int] = None
+    transmission: Optional[str] = None
+    price_amount: Optional[int] = None
+    price_currency: Optional[str] = None
+    created_at: datetime
+    image_variants: Optional[ImageVariants] = None
+
+    _image_variants = validator("image_variants", always=True, allow_reuse=True)(_image_variants)
+
+    class Config:
+        orm_mode = True
+
+# Bulk import report
+class CarImportError(BaseModel):
+    line: int
+    errors: List[str]
+    file: Optional[str] = None  # Part of a multi-file feed snapshot
+
+class CarImportResult(BaseModel):
+    total_rows: int
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[CarImportError]
+    errors_truncated: bool = False
+
+class FeedSyncResult(CarImportResult):
+    unchanged: int
+    retired: int
+
 class CarFilter(BaseModel):
+    q: Optional[str] = None
     brand: Optional[str] = None
     model: Optional[str] = None
     category: Optional[str] = None
@@ -126,6 +207,25 @@ class CarFilter(BaseModel):
     body_type: Optional[str] = None
     color: Optional[str] = None
 
+# Facet counts for the catalog filter sidebar
+class FacetValue(BaseModel):
+    value: str
+    count: int
+
+class YearBucket(BaseModel):
+    year_from: int
+    year_to: int
+    count: int
+
+class CarFacets(BaseModel):
+    total: int
+    brand: List[FacetValue] = []
+    body_type: List[FacetValue] = []
+    engine_type: List[FacetValue] = []
+    transmission: List[FacetValue] = []
+    category: List[FacetValue] = []
+    year: List[YearBucket] = []
+
 # Review schemas
 class ReviewBase(BaseModel):
     car_id: Optional[int] = None  # Делаем car_id опциональным
@@ -253,6 +353,26 @@ class Blog(BlogInDB):
     class Config:
         orm_mode = True
 
+# Blog card for list views: no fullContent, comments or likers
+class BlogSummary(BaseModel):
+    id: int
+    title: str
+    shortDescription: str
+    image: str
+    readTime: str
+    author_id: int
+    views: int
+    likes_count: int
+    comments_count: int = 0
+    status: str
+    moderator_comment: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    author: UserSummary
+
+    class Config:
+        orm_mode = True
+
 # Listing schemas
 class ListingBase(BaseModel):
     brand: str
@@ -295,17 +415,37 @@ class ListingModeration(BaseModel):
     status: str  # "approved" or "rejected"
     moderator_comment: Optional[str] = None
 
+class ListingModerationItem(ListingModeration):
+    listing_id: int
+
+class ListingBatchModeration(BaseModel):
+    decisions: List[ListingModerationItem] = Field(..., min_items=1, max_items=500)
+
+class ListingModerationResult(BaseModel):
+    listing_id: int
+    ok: bool
+    status: Optional[str] = None
+    car_id: Optional[int] = None
+    error: Optional[str] = None
+
 class ListingInDB(ListingBase):
     id: int
     creator_id: int
     gallery: List[str]
     additional_features: List[str]
+    price_amount: Optional[int] = None
+    price_currency: Optional[str] = None
     status: str
     moderator_id: Optional[int] = None
     moderator_comment: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     car_id: Optional[int] = None
+    image_variants: Optional[ImageVariants] = None
+    gallery_variants: List[Optional[ImageVariants]] = []
+
+    _image_variants = validator("image_variants", always=True, allow_reuse=True)(_image_variants)
+    _gallery_variants = validator("gallery_variants", always=True, allow_reuse=True)(_gallery_variants)
     
     class Config:
         orm_mode = True
@@ -316,4 +456,44 @@ class Listing(ListingInDB):
     car: Optional[Car] = None
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# Listing row for list views; gallery, features and the linked car stay on the detail route
+class ListingSummary(BaseModel):
+    id: int
+    creator_id: int
+    brand: str
+    model: str
+    year: int
+    price: str
+    price_amount: Optional[int] = None
+    price_currency: Optional[str] = None
+    category: str
+    mileage: Optional[int] = None
+    short_description: str
+    image: str
+    status: str
+    moderator_comment: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    car_id: Optional[int] = None
+    creator: UserSummary
+    image_variants: Optional[ImageVariants] = None
+
+    _image_variants = validator("image_variants", always=True, allow_reuse=True)(_image_variants)
+
+    class Config:
+        orm_mode = True
+
+# Moderation work queue: items leased to the calling moderator
+class ListingClaim(BaseModel):
+    lease_expires_at: Optional[datetime] = None
+    items: List[Listing]
+
+class BlogClaim(BaseModel):
+    lease_expires_at: Optional[datetime] = None
+    items: List[Blog]
+
+class ClaimHeartbeat(BaseModel):
+    ids: List[int]
+    lease_expires_at: Optional[datetime] = None
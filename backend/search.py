@@ -0,0 +1,42 @@
+from sqlalchemy import Float, func, or_, text
+
+import models
+from database import engine
+
+# Set at startup when the pg_trgm extension is installed in the database
+trigram_enabled = False
+
+def detect_trigram(bind=None):
+    """Enable typo-tolerant brand/model matching if pg_trgm is available"""
+    global trigram_enabled
+    bind = bind or engine
+    with bind.connect() as conn:
+        installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+    trigram_enabled = installed is not None
+    return trigram_enabled
+
+def car_text_search(q: str):
+    """
+    Build the match condition and relevance expression for a free-text query.
+
+    Full-text matching runs on the generated cars.search_vector column (GIN).
+    With pg_trgm, brand and model also match by trigram similarity so
+    misspellings like "toyta" still find Toyota.
+    """
+    ts_query = func.websearch_to_tsquery(models.SEARCH_CONFIG, q)
+    match = models.Car.search_vector.op("@@")(ts_query)
+    rank = func.ts_rank_cd(models.Car.search_vector, ts_query, type_=Float)
+
+    if trigram_enabled:
+        match = or_(
+            match,
+            models.Car.brand.op("%")(q),
+            models.Car.model.op("%")(q)
+        )
+        rank = func.greatest(
+            rank,
+            func.similarity(models.Car.brand, q),
+            func.similarity(models.Car.model, q)
+        )
+
+    return match, rank
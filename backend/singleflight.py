@@ -0,0 +1,76 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Seconds a request waits for an identical in-flight fetch before running its own
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "5"))
+
+class SingleFlight:
+    """
+    Share one in-flight fetch between concurrent callers with the same key.
+
+    The first caller for a key (the leader) runs the fetch; callers arriving
+    while it runs wait for the leader's result or exception instead of
+    repeating the query. Nothing is kept once the fetch finishes; this only
+    collapses concurrent work, caching is left to the layers above.
+    """
+
+    def __init__(self, name: str, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            try:
+                # shield() so a follower giving up does not cancel the leader's fetch
+                return await asyncio.wait_for(asyncio.shield(call), self.timeout if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                # The leader is stuck; fetch independently rather than fail the request
+                self.timeouts += 1
+                return await fetch()
+            except asyncio.CancelledError:
+                # Only the leader was cancelled (e.g. its client went away), not this request
+                if not call.cancelled():
+                    raise
+                return await fetch()
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        self.leaders += 1
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            # Mark the exception retrieved when no follower was waiting
+            call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._calls),
+        }
+
+# Every group, by name, for metrics
+groups: Dict[str, SingleFlight] = {}
+
+def group(name: str, timeout: float = SINGLEFLIGHT_TIMEOUT) -> SingleFlight:
+    if name not in groups:
+        groups[name] = SingleFlight(name, timeout)
+    return groups[name]
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import re
+import sys
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, Optional
+
+from greenlet import getcurrent
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import TTLCache
+
+# Per-request profiling: Server-Timing headers and N+1 warnings (development only)
+SQL_DEBUG = os.getenv("SQL_DEBUG", "").lower() in ("1", "true", "yes")
+# A statement shape repeated this often within one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Statements slower than this are logged; 0 disables the slow-query log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# Also log EXPLAIN (ANALYZE, BUFFERS) of slow SELECTs. ANALYZE runs the query
+# again, on another connection, at most once per shape per interval.
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "").lower() in ("1", "true", "yes")
+EXPLAIN_INTERVAL = 600
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class RequestProfile:
+    """Statements run on behalf of one request"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.statements = 0
+        self.seconds = 0.0
+        self.fingerprints: Counter = Counter()
+        # fingerprint -> where the repeated statement was issued from
+        self.repeated: Dict[str, Optional[str]] = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.statements += 1
+        self.seconds += elapsed
+        shape = fingerprint(statement)
+        self.fingerprints[shape] += 1
+        if self.fingerprints[shape] == N_PLUS_ONE_THRESHOLD:
+            self.repeated[shape] = caller_location()
+
+    def server_timing(self, app_seconds: float) -> str:
+        timings = [
+            f'db;dur={self.seconds * 1000:.1f};desc="{self.statements} queries"',
+            f"app;dur={app_seconds * 1000:.1f}",
+        ]
+        for shape in self.repeated:
+            timings.append(f'n-plus-one;desc="{self.fingerprints[shape]}x {_quote(shape[:80])}"')
+        return ", ".join(timings)
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_SPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """Statement with literals, parameters and IN lists collapsed, to spot repeats"""
+    shape = _STRING.sub("?", statement)
+    shape = _PARAMETER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _POSTCOMPILE.sub("(...)", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+def _backend_frame(frame) -> Optional[str]:
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND_DIR) and "site-packages" not in filename and filename != __file__:
+            return f"{os.path.relpath(filename, BACKEND_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+def caller_location() -> Optional[str]:
+    """
+    Innermost frame of this codebase that issued the current statement.
+
+    With the async engine the hooks run in a greenlet spawned under the
+    request's coroutines, whose frames are in the parent greenlet's stack.
+    """
+    location = _backend_frame(sys._getframe(1))
+    current = getcurrent()
+    if location is None and current.parent is not None:
+        location = _backend_frame(current.parent.gr_frame)
+    return location
+
+# Shapes recently explained, so a hot slow query is not re-run on every call
+_explained = TTLCache(maxsize=512, ttl=EXPLAIN_INTERVAL)
+
+# EXPLAIN ANALYZE executes the statement, so only reads are explained: anything
+# that writes or locks rows, including data-modifying CTEs (WITH ... INSERT),
+# would run a second time on another connection and wait on the first's locks
+_READ_HEAD = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(KEY\s+)?SHARE)\b", re.IGNORECASE)
+
+def _is_explainable(statement: str) -> bool:
+    return bool(_READ_HEAD.match(statement)) and not _WRITES.search(statement)
+
+async def _explain(engine, statement: str, parameters):
+    try:
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in result)
+            # EXPLAIN ANALYZE executed the statement; leave nothing behind
+            await conn.rollback()
+        print(f"EXPLAIN of slow query:\n{plan}")
+    except Exception as e:
+        print(f"EXPLAIN of slow query failed: {e}")
+
+def _log_slow(engine, statement: str, parameters, elapsed: float):
+    profile = _profile.get()
+    where = f" {profile.method} {profile.path}" if profile else ""
+    print(f"Slow query ({elapsed * 1000:.0f} ms){where}: {_SPACE.sub(' ', statement)[:1000]}")
+    if not SLOW_QUERY_EXPLAIN or engine is None or not _is_explainable(statement):
+        return
+    shape = fingerprint(statement)
+    if _explained.get(shape):
+        return
+    _explained.set(shape, True)
+    try:
+        asyncio.get_running_loop().create_task(_explain(engine, statement, parameters))
+    except RuntimeError:
+        # Not on an event loop (scripts on the sync engine): nothing to explain with
+        pass
+
+def instrument_engine(engine):
+    """
+    Attribute every statement of engine to the current request and log slow ones.
+
+    Slow SELECTs are explained on engine itself, so pass the AsyncEngine the
+    API uses rather than its sync_engine.
+    """
+    async_engine = engine if hasattr(engine, "sync_engine") else None
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # Start times live on the execution context, so a statement that raises
+    # cannot leave a stale entry behind for the next one to pick up
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profiler_started = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiler_started", None)
+        if started is None:
+            return
+        elapsed = perf_counter() - started
+        profile = _profile.get()
+        if profile is not None:
+            profile.record(statement, elapsed)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS and not statement.startswith("EXPLAIN"):
+            _log_slow(async_engine, statement, parameters, elapsed)
+
+class SqlProfilerMiddleware:
+    """
+    Profile the SQL of every request (enabled with SQL_DEBUG).
+
+    Adds a Server-Timing header with the query count, DB time and repeated
+    statement shapes, visible in the browser's network panel, and logs
+    requests whose statements look like N+1 loads.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _profile.set(profile)
+        started = perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", profile.server_timing(perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _profile.reset(token)
+            for shape, location in profile.repeated.items():
+                print(
+                    f"Possible N+1 in {profile.method} {profile.path}: {profile.fingerprints[shape]}x "
+                    f"{shape[:300]}" + (f" (from {location})" if location else "")
+                )
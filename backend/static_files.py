@@ -0,0 +1,269 @@
+import argparse
+import gzip
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate
+from mimetypes import guess_type
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# brotli is optional; without it only .gz sidecars are generated and served
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Paths under the mount that embed a SHA-256 (see images.py); their bytes never change
+CONTENT_HASHED_PATH = re.compile(r"(^|/)images/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})/[^/]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Everything else may be replaced in place, so clients revalidate with the ETag
+DEFAULT_CACHE_CONTROL = "public, no-cache"
+
+# Media types worth compressing; images and video are already compressed
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml", "image/svg+xml",
+)
+# Sidecar suffix per content coding, in order of preference
+SIDECARS = (("br", ".br"), ("gzip", ".gz"))
+PRECOMPRESS_MIN_SIZE = 1024
+
+# With nginx in front, hand the body to it (sendfile) by redirecting to this
+# internal location, e.g. "/_uploads/" aliased to the uploads directory
+ACCEL_REDIRECT_PREFIX = os.getenv("UPLOADS_ACCEL_REDIRECT", "")
+
+CHUNK_SIZE = 256 * 1024
+
+def is_compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+def accepted_codings(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q-value}; malformed q-values drop the entry"""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def rank_codings(accept_encoding: str, available: Iterable[str]) -> List[str]:
+    """Available codings the client accepts (q > 0), best q-value first, ties in server order"""
+    accepted = accepted_codings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    ranked = [(accepted.get(coding, wildcard), coding) for coding in available]
+    # sorted() is stable, so equal q-values keep the server order
+    return [coding for quality, coding in sorted(ranked, key=lambda pair: -pair[0]) if quality > 0]
+
+def strong_etag(path: str, stat_result: os.stat_result) -> str:
+    match = CONTENT_HASHED_PATH.search(path)
+    if match:
+        return f'"{match.group("digest")[:32]}-{os.path.basename(path)}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison; W/ prefixes are ignored as RFC 9110 requires"""
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single byte range as (start, end inclusive), or None to send the whole
+    file. Raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        # Multipart ranges are optional for servers; the full body is a valid answer
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+class UploadFileResponse:
+    """File response with strong ETags, cache policy, sidecars, ranges and zero-copy sends"""
+
+    def __init__(self, path: str, stat_result: os.stat_result, relative_path: str, scope: Scope):
+        self.path = path
+        self.relative_path = relative_path
+        self.scope = scope
+        self.request_headers = Headers(scope=scope)
+        self.media_type = guess_type(path)[0] or "application/octet-stream"
+        self.stat_result = stat_result
+        self.etag = strong_etag(relative_path, stat_result)
+        self.encoding = None
+
+    def select_sidecar(self):
+        """Swap in a precompressed copy the client accepts"""
+        if not is_compressible(self.media_type):
+            return
+        suffixes = dict(SIDECARS)
+        # Best acceptable coding whose sidecar exists; q=0 means "not acceptable"
+        for encoding in rank_codings(self.request_headers.get("accept-encoding", ""), suffixes):
+            suffix = suffixes[encoding]
+            try:
+                sidecar_stat = os.stat(self.path + suffix)
+            except FileNotFoundError:
+                continue
+            # A stale sidecar (older than the file) is ignored
+            if sidecar_stat.st_mtime_ns >= self.stat_result.st_mtime_ns:
+                self.path += suffix
+                self.relative_path += suffix
+                self.stat_result = sidecar_stat
+                self.encoding = encoding
+                # Each representation has its own ETag
+                self.etag = self.etag[:-1] + f'-{encoding}"'
+                return
+
+    def base_headers(self) -> List[Tuple[str, str]]:
+        cache_control = IMMUTABLE_CACHE_CONTROL if CONTENT_HASHED_PATH.search(self.relative_path) else DEFAULT_CACHE_CONTROL
+        headers = [
+            ("etag", self.etag),
+            ("last-modified", formatdate(self.stat_result.st_mtime, usegmt=True)),
+            ("cache-control", cache_control),
+            ("accept-ranges", "bytes"),
+        ]
+        if is_compressible(self.media_type):
+            headers.append(("vary", "Accept-Encoding"))
+        return headers
+
+    def not_modified(self) -> bool:
+        if_none_match = self.request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.etag)
+        if_modified_since = parsedate(self.request_headers.get("if-modified-since", ""))
+        if if_modified_since is not None:
+            return if_modified_since >= parsedate(formatdate(self.stat_result.st_mtime, usegmt=True))
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.select_sidecar()
+        headers = self.base_headers()
+        if self.not_modified():
+            await self.send_headers(send, 304, headers)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        size = self.stat_result.st_size
+        byte_range = None
+        if_range = self.request_headers.get("if-range")
+        if if_range is None or if_range == self.etag:
+            try:
+                byte_range = parse_range(self.request_headers.get("range"), size)
+            except ValueError:
+                headers.append(("content-range", f"bytes */{size}"))
+                await self.send_headers(send, 416, headers)
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        status = 200
+        start, end = 0, size - 1
+        if byte_range is not None:
+            status = 206
+            start, end = byte_range
+            headers.append(("content-range", f"bytes {start}-{end}/{size}"))
+        count = end - start + 1
+        headers.append(("content-type", self.media_type))
+        if self.encoding:
+            headers.append(("content-encoding", self.encoding))
+
+        if ACCEL_REDIRECT_PREFIX and scope["method"] != "HEAD":
+            # nginx serves the body (and the range) itself from the internal location
+            headers = [(name, value) for name, value in headers if name != "content-range"]
+            headers.append(("x-accel-redirect", ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + self.relative_path))
+            await self.send_headers(send, 200, headers)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers.append(("content-length", str(count)))
+        await self.send_headers(send, status, headers)
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            # The server copies file -> socket in the kernel (sendfile)
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": start, "count": count})
+        else:
+            await self.send_chunks(send, start, count)
+
+    async def send_headers(self, send: Send, status: int, headers: List[Tuple[str, str]]):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+
+    async def send_chunks(self, send: Send, start: int, count: int):
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0 or count == 0:
+            await send({"type": "http.response.body", "body": b""})
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles for /uploads with cache-friendly responses"""
+
+    async def get_response(self, path: str, scope: Scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if stat_result and stat.S_ISREG(stat_result.st_mode):
+            return UploadFileResponse(full_path, stat_result, path.replace(os.sep, "/"), scope)
+        # Directories, misses and html mode keep the default behavior
+        return await super().get_response(path, scope)
+
+def precompress(directory: str, min_size: int = PRECOMPRESS_MIN_SIZE) -> int:
+    """Write .gz (and .br with brotli installed) sidecars for compressible files; returns how many"""
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith((".gz", ".br")):
+                continue
+            path = os.path.join(root, name)
+            media_type = guess_type(path)[0] or ""
+            if not is_compressible(media_type) or os.path.getsize(path) < min_size:
+                continue
+            with open(path, "rb") as source:
+                data = source.read()
+            sidecars = [(".gz", gzip.compress(data, 9, mtime=0))]
+            if brotli is not None:
+                sidecars.append((".br", brotli.compress(data, quality=11)))
+            for suffix, compressed in sidecars:
+                # Only worth serving when it is actually smaller
+                if len(compressed) < len(data):
+                    with open(path + suffix, "wb") as out:
+                        out.write(compressed)
+                    written += 1
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate precompressed sidecars for static uploads")
+    parser.add_argument("directory", nargs="?", default=os.getenv("UPLOAD_DIR", "uploads"))
+    parser.add_argument("--min-size", type=int, default=PRECOMPRESS_MIN_SIZE)
+    args = parser.parse_args()
+    print(f"Wrote {precompress(args.directory, args.min_size)} sidecars")
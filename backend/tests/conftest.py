@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend modules the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # One asyncio loop for the session: the async engine's pooled connections belong to it
+    return "asyncio"
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from typing import List, Optional
+
+from sqlalchemy import event
+
+# Maximum number of SQL statements per endpoint, independent of the page size.
+# Authenticated endpoints allow for the current-user lookup on a cold auth cache.
+ENDPOINT_QUERY_BUDGETS = {
+    ("GET", "/cars/"): 1,
+    ("POST", "/cars/search"): 1,
+    ("GET", "/cars/{car_id}"): 1,
+    ("GET", "/blogs/"): 1,
+    ("GET", "/blogs/featured"): 1,
+    ("GET", "/blogs/user"): 2,
+    ("GET", "/blogs/{blog_id}"): 3,
+    ("GET", "/listings/"): 2,
+    ("GET", "/listings/approved"): 1,
+    ("GET", "/listings/user"): 2,
+    ("GET", "/listings/{listing_id}"): 2,
+    ("GET", "/reviews/car/{car_id}"): 2,
+    ("GET", "/reviews/user"): 2,
+    ("GET", "/users/me/favorites"): 2,
+    ("GET", "/admin/blogs"): 2,
+    ("GET", "/admin/blogs/{blog_id}"): 4,
+    ("GET", "/admin/listings"): 2,
+}
+
+class QueryCounter:
+    """Record every statement the engine sends to the database while active"""
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from database import async_engine
+            engine = async_engine
+        # Events are registered on the sync engine that backs an AsyncEngine
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def __len__(self):
+        return len(self.statements)
+
+@contextmanager
+def assert_max_queries(limit: int, engine=None):
+    """Fail with the offending statements if the block runs more than limit queries"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    if len(counter) > limit:
+        statements = "\n\n".join(counter.statements)
+        raise AssertionError(f"{len(counter)} queries, expected at most {limit}:\n\n{statements}")
+
+async def check_endpoint(client, method: str, path: str, budget: Optional[int] = None, **path_params):
+    """
+    Call an endpoint through an async HTTP client (e.g. httpx.AsyncClient bound to
+    the app) and assert it stays within its entry in ENDPOINT_QUERY_BUDGETS.
+
+    Extra request options go in "request", e.g. request={"headers": auth_headers}.
+    """
+    request_options = path_params.pop("request", {})
+    if budget is None:
+        budget = ENDPOINT_QUERY_BUDGETS[(method, path)]
+    with assert_max_queries(budget):
+        response = await client.request(method, path.format(**path_params), **request_options)
+    assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text}"
+    return response
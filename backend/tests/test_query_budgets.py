@@ -0,0 +1,139 @@
+"""
+Every endpoint in query_budget.ENDPOINT_QUERY_BUDGETS stays within its query
+budget on a full page of rows, with cold caches.
+
+Needs a PostgreSQL database in DATABASE_URL; the rows created here are
+deleted afterwards, but point it at a scratch database anyway.
+"""
+import os
+import uuid
+
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+import httpx
+from sqlalchemy import delete
+
+import auth
+import models
+from database import SessionLocal
+from main import app
+from query_budget import ENDPOINT_QUERY_BUDGETS, check_endpoint
+from response_cache import MemoryBackend, response_cache
+
+pytestmark = pytest.mark.anyio
+
+# Rows per list endpoint; budgets must not depend on it
+PAGE = 20
+# JSON bodies of the non-GET endpoints
+REQUEST_BODIES = {("POST", "/cars/search"): {"brand": "Budget"}}
+
+def _car(tag: str, n: int) -> models.Car:
+    return models.Car(
+        brand="Budget", model=f"{tag}-{n}", category="Used Car", price=f"{n + 1} 000 000 ₸",
+        shortDescription="query budget test", image="car.jpg", gallery=["a.jpg", "b.jpg"], year=2020,
+        body_type="Седан", engine_type="Бензиновый", drive_unit="Передний привод", color="Белый",
+        mileage=1000 * n, transmission="Автомат", additional_features=["abs", "esp"],
+    )
+
+def _listing(tag: str, n: int, creator_id: int, moderator_id: int) -> models.Listing:
+    return models.Listing(
+        creator_id=creator_id, brand="Budget", model=f"{tag}-{n}", year=2019, price="$30,000",
+        category="Used Car", body_type="Седан", engine_type="Дизельный", drive_unit="Полный привод",
+        color="Черный", mileage=5000, transmission="Автомат", short_description="query budget test",
+        image="listing.jpg", gallery=["g.jpg"], additional_features=["nav"],
+        status="approved" if n % 2 else "pending", moderator_id=moderator_id if n % 2 else None,
+    )
+
+@pytest.fixture(scope="module")
+def seeded():
+    """A page of cars, listings, blogs with comments, reviews and favorites, plus a user and an admin"""
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    hashed_password = auth.get_password_hash("budget")
+    users = [
+        models.User(username=f"budget-{tag}-{n}", email=f"budget-{tag}-{n}@example.com",
+                    hashed_password=hashed_password, role="admin" if n == 0 else "user")
+        for n in range(PAGE + 1)
+    ]
+    db.add_all(users)
+    db.flush()
+    admin, user, reviewers = users[0], users[1], users[1:]
+
+    cars = [_car(tag, n) for n in range(PAGE)]
+    db.add_all(cars)
+    db.flush()
+    listings = [_listing(tag, n, user.id, admin.id) for n in range(PAGE)]
+    blogs = [
+        models.Blog(author_id=user.id, title=f"Budget {tag} {n}", shortDescription="s", fullContent="full",
+                    image="blog.jpg", readTime="5 минут чтения", status="approved", moderator_id=admin.id)
+        for n in range(PAGE)
+    ]
+    db.add_all(listings + blogs)
+    db.flush()
+    db.add_all(
+        models.Comment(blog_id=blog.id, user_id=reviewer.id, content="comment")
+        for blog in blogs for reviewer in reviewers[:3]
+    )
+    # A page of reviews on one car, and a page of reviews by one user
+    db.add_all(models.Review(car_id=cars[0].id, user_id=reviewer.id, rating=5, comment="ok") for reviewer in reviewers)
+    db.add_all(models.Review(car_id=car.id, user_id=user.id, rating=4, comment="ok") for car in cars[1:])
+    user.favorites.extend(cars)
+    db.commit()
+
+    ids = {
+        "admin": admin,
+        "user": user,
+        "car_id": cars[0].id,
+        "blog_id": blogs[0].id,
+        "listing_id": next(listing.id for listing in listings if listing.status == "approved"),
+    }
+    yield ids
+
+    user_ids = [u.id for u in users]
+    for statement in (
+        delete(models.favorites).where(models.favorites.c.user_id.in_(user_ids)),
+        delete(models.Review).where(models.Review.user_id.in_(user_ids)),
+        delete(models.Comment).where(models.Comment.user_id.in_(user_ids)),
+        delete(models.Blog).where(models.Blog.author_id.in_(user_ids)),
+        delete(models.Listing).where(models.Listing.creator_id.in_(user_ids)),
+        delete(models.Car).where(models.Car.id.in_([car.id for car in cars])),
+        delete(models.User).where(models.User.id.in_(user_ids)),
+    ):
+        db.execute(statement)
+    db.commit()
+    db.close()
+
+def _auth_headers(user: models.User) -> dict:
+    token = auth.create_access_token({"sub": user.username, "uid": user.id, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(scope="module")
+async def client():
+    await app.router.startup()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await app.router.shutdown()
+
+@pytest.fixture(autouse=True)
+def cold_caches(monkeypatch):
+    # Budgets are for the uncached path: no stored responses, no cached users
+    monkeypatch.setattr(response_cache, "backend", MemoryBackend())
+    auth.user_cache.clear()
+
+@pytest.mark.parametrize("method, path", sorted(ENDPOINT_QUERY_BUDGETS))
+async def test_endpoint_within_query_budget(client, seeded, method, path):
+    # The caller's own rows need the seeded user; everything else is readable by the admin
+    own = path.endswith("/user") or path.startswith("/users/me")
+    user = seeded["user"] if own else seeded["admin"]
+    request = {"headers": _auth_headers(user)}
+    if (method, path) in REQUEST_BODIES:
+        request["json"] = REQUEST_BODIES[(method, path)]
+    path_params = {name: value for name, value in seeded.items() if name.endswith("_id")}
+    response = await check_endpoint(client, method, path, request=request, **path_params)
+    body = response.json()
+    if isinstance(body, list):
+        # A budget checked on an empty page proves nothing
+        assert len(body) > 1, f"{method} {path} returned {len(body)} rows"
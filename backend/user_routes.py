@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 
 import schemas
 import models
 import auth
 from database import get_db
+from loaders import CAR_CARD_OPTIONS
+from pagination import Keyset, set_next_cursor
 
 router = APIRouter(
     prefix="/users",
@@ -14,18 +19,24 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.User])
 async def read_users(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_admin_user)
 ):
-    users = db.query(models.User).offset(skip).limit(limit).all()
+    keyset = Keyset(models.User.id, models.User.id)
+    result = await db.execute(keyset.apply(select(models.User), cursor=cursor, skip=skip, limit=limit))
+    
+    users, next_cursor = keyset.page(result.scalars().all(), limit)
+    set_next_cursor(response, next_cursor)
     return users
 
 @router.get("/{user_id}", response_model=schemas.User)
 async def read_user(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Regular users can only get their own user information
@@ -35,7 +46,7 @@ async def read_user(
             detail="Not enough permissions to access this user's data"
         )
     
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
@@ -44,7 +55,7 @@ async def read_user(
 async def update_user(
     user_id: int, 
     user: schemas.UserUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Regular users can only update their own information
@@ -54,7 +65,7 @@ async def update_user(
             detail="Not enough permissions to update this user"
         )
     
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -63,14 +74,15 @@ async def update_user(
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    auth.invalidate_user(user_id)
+    await db.refresh(db_user)
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
     # Only admins or the user themselves can delete an account
@@ -80,74 +92,96 @@ async def delete_user(
             detail="Not enough permissions to delete this user"
         )
     
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(db_user)
-    db.commit()
+    await db.delete(db_user)
+    await db.commit()
+    auth.invalidate_user(user_id)
     return None
 
 # Favorites endpoints
+async def insert_favorite(db: AsyncSession, user_id: int, car_id: int) -> bool:
+    """Add a favorite in one statement; returns False if it already existed"""
+    stmt = (
+        pg_insert(models.favorites)
+        .values(user_id=user_id, car_id=car_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "car_id"])
+        .returning(models.favorites.c.car_id)
+    )
+    try:
+        result = await db.execute(stmt)
+        inserted = result.first() is not None
+        await db.commit()
+    except IntegrityError:
+        # favorites.car_id references a car that does not exist
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Car not found")
+    return inserted
+
+async def delete_favorite(db: AsyncSession, user_id: int, car_id: int) -> bool:
+    """Remove a favorite in one statement; returns False if there was none"""
+    result = await db.execute(
+        delete(models.favorites)
+        .where(
+            models.favorites.c.user_id == user_id,
+            models.favorites.c.car_id == car_id
+        )
+        .returning(models.favorites.c.car_id)
+    )
+    deleted = result.first() is not None
+    await db.commit()
+    
+    if not deleted:
+        # Only the miss path pays for telling "no such car" apart from "not a favorite"
+        car = await db.execute(select(models.Car.id).where(models.Car.id == car_id))
+        if car.first() is None:
+            raise HTTPException(status_code=404, detail="Car not found")
+    return deleted
+
 @router.post("/favorites/{car_id}", status_code=status.HTTP_201_CREATED)
 async def add_favorite(
     car_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    # Check if car exists
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
-    if not car:
-        raise HTTPException(status_code=404, detail="Car not found")
-    
-    # Get user with relationships
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
-    
-    # Check if already in favorites
-    if car in user.favorites:
+    if not await insert_favorite(db, current_user.id, car_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Car already in favorites"
         )
     
-    # Add to favorites
-    user.favorites.append(car)
-    db.commit()
-    
     return {"message": "Car added to favorites"}
 
+@router.put("/favorites/{car_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def put_favorite(
+    car_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    # Idempotent: adding an existing favorite is a no-op
+    await insert_favorite(db, current_user.id, car_id)
+    return None
+
 @router.delete("/favorites/{car_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_favorite(
     car_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    # Check if car exists
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
-    if not car:
-        raise HTTPException(status_code=404, detail="Car not found")
-    
-    # Get user with relationships
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
-    
-    # Check if in favorites
-    if car not in user.favorites:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Car not in favorites"
-        )
-    
-    # Remove from favorites
-    user.favorites.remove(car)
-    db.commit()
-    
+    # Idempotent like PUT: removing a car that is not a favorite is a no-op
+    await delete_favorite(db, current_user.id, car_id)
     return None
 
-@router.get("/me/favorites", response_model=List[schemas.Car])
+@router.get("/me/favorites", response_model=List[schemas.CarCard])
 async def get_favorites(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    # Get user with favorites relationship
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
-    return user.favorites
\ No newline at end of file
+    # Get favorite cars of the user
+    result = await db.execute(
+        select(models.Car).options(*CAR_CARD_OPTIONS).join(models.favorites, models.favorites.c.car_id == models.Car.id)
+        .where(models.favorites.c.user_id == current_user.id)
+    )
+    return result.scalars().all()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import Integer, column, update, values
+
+import models
+from cache import TTLCache
+from database import AsyncSessionLocal
+
+# How often buffered views are written to the database, in seconds
+FLUSH_INTERVAL = float(os.getenv("BLOG_VIEWS_FLUSH_INTERVAL", "5"))
+# Repeat views of the same blog by the same client inside this window count once
+DEDUP_WINDOW = float(os.getenv("BLOG_VIEWS_DEDUP_WINDOW", "600"))
+
+class ViewCounter:
+    """
+    Write-behind accumulator for blog view counts.
+
+    Views are summed in memory per blog and written periodically as one
+    UPDATE ... SET views = views + delta statement for every touched blog,
+    instead of a read-modify-write transaction per page view.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, dedup_window: float = DEDUP_WINDOW):
+        self.flush_interval = flush_interval
+        self.pending = Counter()
+        self.recent_views = TTLCache(maxsize=100_000, ttl=dedup_window)
+        # Blog ids confirmed to exist, so repeat views skip the lookup
+        self.known_blogs = TTLCache(maxsize=10_000, ttl=3600)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def client_key(host: Optional[str], user_agent: Optional[str]) -> str:
+        raw = f"{host or ''}|{user_agent or ''}"
+        return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+    def record(self, blog_id: int, client_key: str) -> bool:
+        """Count a view unless this client already viewed the blog within the window"""
+        key = (blog_id, client_key)
+        if self.recent_views.get(key):
+            return False
+        self.recent_views.set(key, True)
+        self.pending[blog_id] += 1
+        return True
+
+    async def flush(self):
+        if not self.pending:
+            return
+        # Swap the buffer before awaiting so views recorded meanwhile go to the next batch
+        batch, self.pending = self.pending, Counter()
+
+        deltas = values(
+            column("id", Integer), column("delta", Integer), name="view_deltas"
+        ).data(list(batch.items()))
+        stmt = (
+            update(models.Blog)
+            .values(views=models.Blog.views + deltas.c.delta)
+            .where(models.Blog.id == deltas.c.id)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt)
+                await db.commit()
+        except Exception as e:
+            # Keep the counts for the next attempt
+            self.pending.update(batch)
+            print(f"Failed to flush blog views: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+view_counter = ViewCounter()